@@ -1,3 +1,6 @@
+from backend.crud.cover import store_cover, get_cover, release_covers
+from backend.crud.metadata_cache import get_book_metadata, get_cache_stats
 from backend.crud.book import get_books, create_book, update_book, delete_book, get_book
-from backend.crud.loan import get_loans, create_loan, update_loan, delete_loan
-from backend.crud.user import get_users, create_user, update_user, delete_user
\ No newline at end of file
+from backend.crud.job import create_refresh_metadata_job, get_job
+from backend.crud.loan import get_loans, get_loan_ledger, get_active_loans, attach_active_loans, get_book_loan_status, create_loan, update_loan, delete_loan
+from backend.crud.user import get_users, get_users_summary, create_user, update_user, delete_user
\ No newline at end of file
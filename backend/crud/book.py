@@ -1,19 +1,76 @@
-from sqlalchemy.orm import Session
-from typing import List, Dict, Any
-from backend.models.book import Book
+import logging
+import os
+from sqlalchemy.orm import Session, raiseload
+from typing import List, Dict, Any, Iterable, Iterator
+from backend.models.book import Book, books_fts
 from backend.models.loan import Loan
 from backend.schemas.book import BookCreate, BookUpdate, BookDelete
 from fastapi import HTTPException, status
-from backend.services.google_books import fetch_book_metadata
+from backend.crud.cover import release_covers
+from backend.crud.metadata_cache import get_book_metadata, get_book_metadata_many, normalize_isbn
 from datetime import datetime
-from sqlalchemy import or_, and_  # Aggiungi questa riga per importare gli operatori necessari
+from sqlalchemy import or_, and_, select, union, update, exists, func, literal_column  # Aggiungi questa riga per importare gli operatori necessari
+
+def active_loan_filter(now: datetime = None):
+    """Condizione SQL per i prestiti attivi: senza data di restituzione o con data futura."""
+    now = now or datetime.now()
+    return or_(Loan.return_date.is_(None), Loan.return_date > now)
+
+def visible_book_ids(user_id: int):
+    """
+    Select degli ID dei libri visibili a un utente: quelli di cui è proprietario
+    UNION quelli che ha attualmente in prestito.
+    """
+    owned = select(Book.id).where(Book.owner_id == user_id)
+    borrowed = select(Loan.book_id).where(Loan.user_id == user_id, active_loan_filter())
+    return union(owned, borrowed)
+
+logger = logging.getLogger(__name__)
+
+# Importazione multipla: libri per commit e ISBN richiesti in parallelo ai provider
+IMPORT_BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", "20"))
+IMPORT_FETCH_CONCURRENCY = int(os.environ.get("IMPORT_FETCH_CONCURRENCY", "4"))
+
+# Operazioni in batch: ID per statement, sotto il limite di parametri di
+# SQLite (999 nelle versioni precedenti alla 3.32)
+BULK_ID_CHUNK_SIZE = int(os.environ.get("BULK_ID_CHUNK_SIZE", "900"))
+
+# Campi modificabili con le operazioni in batch e righe per executemany
+BULK_UPDATE_FIELDS = ("title", "author", "description", "publisher", "publish_year")
+BULK_PATCH_CHUNK_SIZE = int(os.environ.get("BULK_PATCH_CHUNK_SIZE", "500"))
+
+# Le query che caricano oggetti destinati alle risposte usano raiseload("*"):
+# un accesso a una relazione non caricata esplicitamente (N+1) solleva
+# un'eccezione invece di eseguire una query per riga.
 
 def get_books(db: Session, skip: int = 0, limit: int = 10):
-    books = db.query(Book).offset(skip).limit(limit).all()
-    # Aggiungiamo un flag per indicare se il libro ha una copertina
-    for book in books:
-        setattr(book, "has_cover", book.cover_image is not None)
-    return books
+    return db.query(Book).options(raiseload("*")).offset(skip).limit(limit).all()
+
+def get_visible_books(db: Session, user_id: int, skip: int = 0, limit: int = 100, after_id: int = None):
+    """
+    Ottiene una pagina dei libri visibili all'utente, ordinati per ID.
+    
+    La paginazione avviene interamente in SQL: con after_id (keyset) il costo
+    della pagina non dipende da quante pagine la precedono.
+    
+    Args:
+        db: Session del database
+        user_id: ID dell'utente corrente
+        skip: Numero di libri da saltare (OFFSET)
+        limit: Numero massimo di libri da restituire
+        after_id: Se specificato, restituisce solo libri con ID maggiore
+        
+    Returns:
+        Tupla (libri della pagina, numero totale di libri visibili)
+    """
+    query = db.query(Book).options(raiseload("*")).filter(Book.id.in_(visible_book_ids(user_id)))
+    total = query.count()
+    
+    if after_id is not None:
+        query = query.filter(Book.id > after_id)
+    
+    books = query.order_by(Book.id).offset(skip).limit(limit).all()
+    return books, total
 
 def get_book(db: Session, book_id: int):
     """
@@ -26,10 +83,7 @@ def get_book(db: Session, book_id: int):
     Returns:
         Il libro richiesto o None se non trovato
     """
-    book = db.query(Book).filter(Book.id == book_id).first()
-    if book:
-        setattr(book, "has_cover", book.cover_image is not None)
-    return book
+    return db.query(Book).options(raiseload("*")).filter(Book.id == book_id).first()
 
 def create_book(db: Session, book: BookCreate):
     # Check per duplicati solo tra i libri dello stesso proprietario
@@ -50,19 +104,14 @@ def create_book(db: Session, book: BookCreate):
             detail="Hai già un libro con lo stesso ISBN o titolo nella tua libreria"
         )
     
-    # If ISBN is provided, try to fetch metadata from multiple APIs with fallback
+    # If ISBN is provided, try to fetch metadata (cache first, then multiple APIs)
     if book.isbn:
-        metadata = fetch_book_metadata(book.isbn)
+        metadata = get_book_metadata(db, book.isbn)
         if metadata:
-            # Update book data with metadata
+            # Update book data with metadata (la copertina arriva già come cover_hash)
             book_data = book.model_dump()
             book_data.update(metadata)
-            
-            # Verifica che l'immagine sia stata recuperata correttamente
-            has_cover = metadata.get('cover_image') is not None
-            print(f"Cover image retrieved: {has_cover}")
-            if has_cover:
-                print(f"Cover image size: {len(metadata['cover_image'])} bytes")
+            logger.debug(f"Cover image retrieved: {book_data.get('cover_hash') is not None}")
             
             # Verifica che i campi essenziali non siano vuoti
             if not book_data.get('title'):
@@ -73,7 +122,7 @@ def create_book(db: Session, book: BookCreate):
             db_book = Book(**book_data)
             
             # Verifica dopo la creazione dell'oggetto
-            print(f"Book object has cover: {db_book.cover_image is not None}")
+            logger.debug(f"Book object has cover: {db_book.has_cover}")
         else:
             # If no metadata found from any API, use the provided data
             # Aggiungi titolo e autore predefiniti se non disponibili
@@ -92,13 +141,110 @@ def create_book(db: Session, book: BookCreate):
     db.commit()
     db.refresh(db_book)
     
-    # Imposta il flag has_cover dopo il refresh del database
-    setattr(db_book, "has_cover", db_book.cover_image is not None)
-    
     return db_book
 
+def import_books(db: Session, owner_id: int, isbns: Iterable[str],
+                 batch_size: int = None, concurrency: int = None) -> Iterator[Dict[str, Any]]:
+    """
+    Importa una lista di ISBN nella libreria di un utente.
+    
+    Gli ISBN già presenti (nella libreria o ripetuti nella lista) vengono saltati
+    con una sola query; i metadati degli altri sono richiesti in parallelo
+    (passando dalla cache) a lotti di batch_size: ogni lotto viene prima
+    scaricato e poi inserito con un commit, così nessuna transazione di
+    scrittura resta aperta durante le richieste HTTP.
+    
+    Generatore che restituisce un risultato per ISBN appena è definitivo
+    (i libri creati dopo il commit del loro lotto) e infine un riepilogo:
+        {"type": "result", "isbn", "status": created|duplicate|failed, ...}
+        {"type": "summary", "total", "created", "duplicates", "failed"}
+    """
+    batch_size = batch_size or IMPORT_BATCH_SIZE
+    concurrency = concurrency or IMPORT_FETCH_CONCURRENCY
+    counts = {"total": 0, "created": 0, "duplicates": 0, "failed": 0}
+    
+    def result(isbn, status, **fields):
+        counts["created" if status == "created" else "duplicates" if status == "duplicate" else "failed"] += 1
+        return {"type": "result", "isbn": isbn, "status": status, **fields}
+    
+    # ISBN già presenti nella libreria del proprietario, normalizzati
+    existing = {
+        normalize_isbn(row.isbn) for row in
+        db.query(Book.isbn).filter(Book.owner_id == owner_id, Book.isbn.isnot(None))
+    }
+    
+    to_fetch = []
+    for isbn in isbns:
+        counts["total"] += 1
+        key = normalize_isbn(isbn)
+        if not key:
+            yield result(isbn, "failed", detail="ISBN non valido")
+        elif key in existing:
+            yield result(isbn, "duplicate", detail="ISBN già presente nella tua libreria")
+        else:
+            existing.add(key)
+            to_fetch.append(key)
+    
+    def book_data(isbn, metadata):
+        data = {"isbn": isbn, "owner_id": owner_id}
+        if metadata:
+            data.update(metadata)
+        # Titolo e autore predefiniti, come in create_book
+        if not data.get('title'):
+            data['title'] = "Titolo non disponibile" if metadata else "Titolo mancante"
+        if not data.get('author'):
+            data['author'] = "Autore sconosciuto"
+        return data
+    
+    def insert(rows):
+        # I risultati si leggono dopo il flush (ID assegnati) ma prima del commit,
+        # che scadrebbe gli oggetti costringendo a ricaricarli uno per uno
+        books = [Book(**data) for data in rows]
+        db.add_all(books)
+        db.flush()
+        created = [
+            dict(book_id=book.id, title=book.title, author=book.author, has_cover=book.has_cover)
+            for book in books
+        ]
+        db.commit()
+        return created
+    
+    for start in range(0, len(to_fetch), batch_size):
+        batch = to_fetch[start:start + batch_size]
+        
+        # Prima i metadati: le richieste HTTP avvengono senza scritture in corso
+        # e la cache viene salvata con un commit a sé, indipendente dai libri
+        try:
+            rows = [book_data(isbn, metadata) for isbn, metadata in
+                    get_book_metadata_many(db, batch, concurrency=concurrency)]
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            for isbn in batch:
+                yield result(isbn, "failed", detail=f"Database error: {str(e)}")
+            continue
+        
+        # Poi i libri del lotto, in una transazione breve
+        try:
+            created = insert(rows)
+        except Exception:
+            db.rollback()
+            # Riprova un libro alla volta: fallisce solo quello che causa l'errore
+            for data in rows:
+                try:
+                    yield result(data["isbn"], "created", **insert([data])[0])
+                except Exception as e:
+                    db.rollback()
+                    yield result(data["isbn"], "failed", detail=f"Database error: {str(e)}")
+            continue
+        
+        for data, fields in zip(rows, created):
+            yield result(data["isbn"], "created", **fields)
+    
+    yield {"type": "summary", **counts}
+
 def update_book(db: Session, book_id: int, book: BookUpdate):
-    db_book = db.query(Book).filter(Book.id == book_id).first()
+    db_book = db.query(Book).options(raiseload("*")).filter(Book.id == book_id).first()
     if not db_book:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Book not found")
     for key, value in book.model_dump().items():
@@ -108,7 +254,7 @@ def update_book(db: Session, book_id: int, book: BookUpdate):
     return db_book
 
 def delete_book(db: Session, book_id: int):
-    db_book = db.query(Book).filter(Book.id == book_id).first()
+    db_book = db.query(Book).options(raiseload("*")).filter(Book.id == book_id).first()
     if not db_book:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Book not found")
     
@@ -126,8 +272,10 @@ def delete_book(db: Session, book_id: int):
     # Prima elimina tutti i prestiti (restituiti) associati a questo libro
     db.query(Loan).filter(Loan.book_id == book_id).delete()
     
-    # Poi elimina il libro
+    # Poi elimina il libro e la sua copertina, se non condivisa con altri libri
     db.delete(db_book)
+    db.flush()
+    release_covers(db, [db_book.cover_hash])
     
     try:
         db.commit()
@@ -139,207 +287,133 @@ def delete_book(db: Session, book_id: int):
             detail=f"Database error: {str(e)}"
         )
 
-def refresh_missing_book_metadata(db: Session, owner_id: int = None):
+def books_to_refresh_query(db: Session, owner_id: int = None):
     """
-    Cerca libri con informazioni mancanti o di proprietà dell'utente specificato
-    e tenta di recuperarle nuovamente dalle API esterne.
+    Query dei libri di cui aggiornare i metadati.
     
     Args:
         db: Sessione del database
-        owner_id: Se specificato, aggiorna tutti i libri di proprietà dell'utente specificato
+        owner_id: Se specificato, tutti i libri di proprietà dell'utente;
+                  altrimenti solo i libri con informazioni mancanti
     """
-    # Costruisci la query di base
     query = db.query(Book)
     
     if owner_id:
         # Se è specificato un owner_id, aggiorna tutti i libri di quell'utente
-        query = query.filter(Book.owner_id == owner_id)
-    else:
-        # Altrimenti, cerca solo i libri con informazioni mancanti
-        query = query.filter(
-            (Book.title == "Titolo mancante") | 
-            (Book.author == "Autore sconosciuto")
-        )
+        return query.filter(Book.owner_id == owner_id)
     
-    # Esegui la query
-    books_to_update = query.all()
+    # Altrimenti, cerca solo i libri con informazioni mancanti
+    return query.filter(
+        (Book.title == "Titolo mancante") | 
+        (Book.author == "Autore sconosciuto")
+    )
+
+def apply_book_metadata(book: Book, metadata: Dict[str, Any], overwrite: bool = False):
+    """
+    Applica a un libro i metadati recuperati dai provider.
     
-    if not books_to_update:
-        return {
-            "status": "success", 
-            "message": "Nessun libro da aggiornare trovato", 
-            "updated": 0, 
-            "failed": 0,
-            "total": 0
-        }
+    Args:
+        book: Libro da aggiornare
+        metadata: Metadati restituiti da get_book_metadata (può essere None)
+        overwrite: Se True sovrascrive tutti i campi disponibili,
+                   altrimenti aggiorna solo quelli mancanti o generici
     
-    # Contatori per il report
-    total_books = len(books_to_update)
-    updated_books = 0
-    failed_books = 0
-    updated_book_details = []
-    failed_book_details = []
-    
-    # Prova a recuperare informazioni per ogni libro
-    for book in books_to_update:
-        if not book.isbn:
-            # Se non c'è ISBN, non possiamo recuperare nulla
-            failed_books += 1
-            failed_book_details.append({
-                "id": book.id,
-                "isbn": None,
-                "title": book.title,
-                "reason": "ISBN mancante"
-            })
-            continue
+    Returns:
+        Tupla (lista dei campi aggiornati, motivo del mancato aggiornamento o None)
+    """
+    if not metadata or not (metadata.get('title') or metadata.get('author')):
+        return [], "Metadati non trovati"
+    
+    updated_fields = []
+    
+    # Aggiorna i campi principali solo se mancanti o generici
+    if (book.title == "Titolo mancante" or overwrite) and metadata.get('title'):
+        book.title = metadata.get('title')
+        updated_fields.append("title")
         
-        # Tenta di recuperare i metadati usando le API
-        metadata = fetch_book_metadata(book.isbn)
+    if (book.author == "Autore sconosciuto" or overwrite) and metadata.get('author'):
+        book.author = metadata.get('author')
+        updated_fields.append("author")
         
-        if metadata and (metadata.get('title') or metadata.get('author')):
-            # Aggiorna i campi disponibili
-            updated_fields = []
-            
-            # Aggiorna i campi principali solo se mancanti o generici
-            if (book.title == "Titolo mancante" or owner_id) and metadata.get('title'):
-                book.title = metadata.get('title')
-                updated_fields.append("title")
-                
-            if (book.author == "Autore sconosciuto" or owner_id) and metadata.get('author'):
-                book.author = metadata.get('author')
-                updated_fields.append("author")
-                
-            # Aggiorna altri campi utili se disponibili
-            if (not book.description or owner_id) and metadata.get('description'):
-                book.description = metadata.get('description')
-                updated_fields.append("description")
-                
-            if (not book.publisher or owner_id) and metadata.get('publisher'):
-                book.publisher = metadata.get('publisher')
-                updated_fields.append("publisher")
-                
-            if (not book.publish_year or owner_id) and metadata.get('publish_year'):
-                book.publish_year = metadata.get('publish_year')
-                updated_fields.append("publish_year")
-                
-            # Aggiorna la copertina solo se era mancante
-            if not book.cover_image and metadata.get('cover_image'):
-                book.cover_image = metadata.get('cover_image')
-                updated_fields.append("cover_image")
-            
-            # Se abbiamo effettuato aggiornamenti
-            if updated_fields:
-                updated_books += 1
-                updated_book_details.append({
-                    "id": book.id,
-                    "isbn": book.isbn,
-                    "title": book.title,
-                    "updated_fields": updated_fields
-                })
-            else:
-                failed_books += 1
-                failed_book_details.append({
-                    "id": book.id,
-                    "isbn": book.isbn,
-                    "title": book.title,
-                    "reason": "Nessun nuovo dato disponibile"
-                })
-        else:
-            # I metadati non sono stati trovati
-            failed_books += 1
-            failed_book_details.append({
-                "id": book.id,
-                "isbn": book.isbn,
-                "title": book.title,
-                "reason": "Metadati non trovati"
-            })
-    
-    # Esegui il commit delle modifiche
-    try:
-        db.commit()
+    # Aggiorna altri campi utili se disponibili
+    if (not book.description or overwrite) and metadata.get('description'):
+        book.description = metadata.get('description')
+        updated_fields.append("description")
         
-        # Prepara il report finale
-        return {
-            "status": "success",
-            "message": f"Elaborazione completata: {updated_books} libri aggiornati, {failed_books} non aggiornati",
-            "total": total_books,
-            "updated": updated_books,
-            "failed": failed_books,
-            "updated_books": updated_book_details,
-            "failed_books": failed_book_details
-        }
-    except Exception as e:
-        db.rollback()
-        return {
-            "status": "error",
-            "message": f"Errore durante l'aggiornamento: {str(e)}",
-            "updated": 0,
-            "failed": total_books
-        }
+    if (not book.publisher or overwrite) and metadata.get('publisher'):
+        book.publisher = metadata.get('publisher')
+        updated_fields.append("publisher")
+        
+    if (not book.publish_year or overwrite) and metadata.get('publish_year'):
+        book.publish_year = metadata.get('publish_year')
+        updated_fields.append("publish_year")
+        
+    # Aggiorna la copertina solo se era mancante
+    if not book.cover_hash and metadata.get('cover_hash'):
+        book.cover_hash = metadata.get('cover_hash')
+        updated_fields.append("cover_image")
+    
+    if not updated_fields:
+        return [], "Nessun nuovo dato disponibile"
+    return updated_fields, None
+
+# Pesi bm25 per colonna di books_fts: title, author, isbn, publisher, description
+FTS_COLUMN_WEIGHTS = (10.0, 5.0, 5.0, 1.0, 1.0)
+
+def build_fts_query(query: str) -> str:
+    """
+    Converte il testo inserito dall'utente in una query FTS5.
+    
+    Le parti tra virgolette diventano ricerche per frase, le altre parole
+    ricerche per prefisso ("ros" trova "rosa"). Tutti i termini devono essere
+    presenti. Restituisce una stringa vuota se non ci sono termini utili.
+    """
+    terms = []
+    for i, part in enumerate(query.split('"')):
+        if i % 2 == 1:
+            # Parte tra virgolette: frase esatta
+            phrase = part.strip()
+            if phrase:
+                terms.append(f'"{phrase}"')
+        else:
+            for word in part.split():
+                word = word.strip("*")
+                if word:
+                    terms.append(f'"{word}"*')
+    return " ".join(terms)
 
 def search_books(db: Session, user_id: int, query: str = "", filter_by: str = "all", 
                 filter_author: str = "", filter_publisher: str = "", filter_year: str = ""):
     """
     Cerca libri in base a criteri specifici.
     
+    La ricerca testuale usa l'indice full-text books_fts: i risultati sono
+    ordinati per rilevanza (bm25) e ciascun libro ha un attributo rank
+    (più basso = più rilevante).
+    
     Args:
         db: Session del database
         user_id: ID dell'utente corrente
-        query: Testo da cercare in titolo, autore, ISBN, etc.
+        query: Testo da cercare in titolo, autore, ISBN, etc. Supporta
+               ricerche per prefisso e frasi tra virgolette
         filter_by: Filtro per stato (all, available, loaned)
         filter_author: Filtro per autore specifico
         filter_publisher: Filtro per editore specifico
         filter_year: Filtro per anno di pubblicazione
     """
-    # Base query per libri dell'utente (di proprietà o in prestito)
-    # Unisci i libri di proprietà dell'utente con quelli che ha preso in prestito
-    owned_books = db.query(Book).filter(Book.owner_id == user_id)
-    
-    borrowed_books = db.query(Book).join(
-        Loan, Book.id == Loan.book_id
-    ).filter(
-        Loan.user_id == user_id,
-        Book.owner_id != user_id,
-        or_(
-            Loan.return_date == None,
-            Loan.return_date > datetime.now()
-        )
-    )
-    
-    # Combina le due query
-    base_query = owned_books.union(borrowed_books)
+    # Prestiti attivi sul libro, per i filtri di stato
+    has_active_loan = exists().where(Loan.book_id == Book.id, active_loan_filter())
     
     # Applica filtro di stato
     if filter_by == "available":
         # Libri disponibili (di proprietà e non prestati)
-        available_books_ids = db.query(Book.id).outerjoin(
-            Loan, and_(
-                Book.id == Loan.book_id,
-                or_(
-                    Loan.return_date == None,
-                    Loan.return_date > datetime.now()
-                )
-            )
-        ).filter(
-            Book.owner_id == user_id,
-            Loan.id == None  # Nessun prestito attivo
-        ).subquery()
-        
-        base_query = db.query(Book).filter(Book.id.in_(available_books_ids))
-    
+        base_query = db.query(Book).options(raiseload("*")).filter(Book.owner_id == user_id, ~has_active_loan)
     elif filter_by == "loaned":
         # Libri attualmente in prestito (dell'utente)
-        loaned_books_ids = db.query(Book.id).join(
-            Loan, Book.id == Loan.book_id
-        ).filter(
-            Book.owner_id == user_id,
-            or_(
-                Loan.return_date == None,
-                Loan.return_date > datetime.now()
-            )
-        ).subquery()
-        
-        base_query = db.query(Book).filter(Book.id.in_(loaned_books_ids))
+        base_query = db.query(Book).options(raiseload("*")).filter(Book.owner_id == user_id, has_active_loan)
+    else:
+        # Libri dell'utente: di proprietà o presi in prestito
+        base_query = db.query(Book).options(raiseload("*")).filter(Book.id.in_(visible_book_ids(user_id)))
     
     # Dopo i filtri di stato, applica i filtri aggiuntivi
     if filter_author:
@@ -351,8 +425,11 @@ def search_books(db: Session, user_id: int, query: str = "", filter_by: str = "a
     if filter_year:
         base_query = base_query.filter(Book.publish_year == int(filter_year))
     
-    # Applica la ricerca testuale se specificata
-    if query:
+    if not query:
+        return base_query.order_by(Book.id).all()
+    
+    if db.get_bind().dialect.name != "sqlite":
+        # Senza FTS5 ripieghiamo su una ricerca per sottostringa
         search_term = f"%{query}%"
         base_query = base_query.filter(
             or_(
@@ -363,9 +440,27 @@ def search_books(db: Session, user_id: int, query: str = "", filter_by: str = "a
                 Book.description.ilike(search_term)
             )
         )
-    
-    # Esegui la query e ritorna i risultati
-    return base_query.all()
+        return base_query.order_by(Book.id).all()
+    
+    fts_query = build_fts_query(query)
+    if not fts_query:
+        return base_query.order_by(Book.id).all()
+    
+    # Applica la ricerca full-text e ordina per rilevanza
+    matches = select(
+        books_fts.c.rowid.label("book_id"),
+        func.bm25(literal_column("books_fts"), *FTS_COLUMN_WEIGHTS).label("rank")
+    ).where(books_fts.c.books_fts.match(fts_query)).subquery()
+    
+    rows = base_query.join(matches, Book.id == matches.c.book_id).add_columns(
+        matches.c.rank
+    ).order_by(matches.c.rank, Book.id).all()
+    
+    books = []
+    for book, rank in rows:
+        setattr(book, "rank", rank)
+        books.append(book)
+    return books
 
 def bulk_update_books(db: Session, book_ids: List[int], updates: Dict[str, Any], user_id: int):
     """
@@ -387,8 +482,7 @@ def bulk_update_books(db: Session, book_ids: List[int], updates: Dict[str, Any],
     failed_book_ids = []
     
     # Verifica che ci siano campi validi da aggiornare
-    valid_fields = ["title", "author", "description", "publisher", "publish_year"]
-    update_fields = {k: v for k, v in updates.items() if k in valid_fields}
+    update_fields = {k: v for k, v in updates.items() if k in BULK_UPDATE_FIELDS}
     
     if not update_fields:
         return {
@@ -427,7 +521,7 @@ def bulk_update_books(db: Session, book_ids: List[int], updates: Dict[str, Any],
             except Exception as e:
                 failed_books += 1
                 failed_book_ids.append(book.id)
-                print(f"Errore nell'aggiornamento del libro {book.id}: {str(e)}")
+                logger.error(f"Errore nell'aggiornamento del libro {book.id}: {str(e)}")
         
         # Commit delle modifiche
         db.commit()
@@ -450,10 +544,82 @@ def bulk_update_books(db: Session, book_ids: List[int], updates: Dict[str, Any],
             "failed": total_books
         }
 
+def patch_books(db: Session, changes: Dict[int, Dict[str, Any]], user_id: int):
+    """
+    Applica modifiche diverse per ogni libro (solo i campi cambiati).
+    
+    I libri sono verificati con una query per blocco di ID; le modifiche sono
+    raggruppate per insieme di campi e applicate con UPDATE executemany a
+    blocchi di BULK_PATCH_CHUNK_SIZE righe, tutto in un'unica transazione.
+    
+    Args:
+        db: Session del database
+        changes: Dizionario {book_id: {campo: nuovo valore}}
+        user_id: ID dell'utente che richiede l'aggiornamento
+    
+    Returns:
+        Dict: Risultato con l'esito di ogni libro in results
+    """
+    book_ids = list(changes)
+    
+    try:
+        owners = {}
+        for start in range(0, len(book_ids), BULK_ID_CHUNK_SIZE):
+            chunk = book_ids[start:start + BULK_ID_CHUNK_SIZE]
+            owners.update(db.query(Book.id, Book.owner_id).filter(Book.id.in_(chunk)).all())
+        
+        results = []
+        groups = {}
+        for book_id, fields in changes.items():
+            fields = {k: v for k, v in fields.items() if k in BULK_UPDATE_FIELDS}
+            if book_id not in owners:
+                outcome = "not_found"
+            elif owners[book_id] != user_id:
+                outcome = "not_owned"
+            elif not fields:
+                outcome = "unchanged"
+            else:
+                outcome = "updated"
+                groups.setdefault(tuple(sorted(fields)), []).append({"id": book_id, **fields})
+            results.append({"id": book_id, "status": outcome, "fields": sorted(fields)})
+        
+        # Un UPDATE executemany per ogni insieme di campi modificati
+        for rows in groups.values():
+            for start in range(0, len(rows), BULK_PATCH_CHUNK_SIZE):
+                db.execute(update(Book), rows[start:start + BULK_PATCH_CHUNK_SIZE])
+        
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        return {
+            "status": "error",
+            "message": f"Errore durante l'aggiornamento: {str(e)}",
+            "total": len(book_ids),
+            "updated": 0,
+            "failed": len(book_ids),
+            "results": []
+        }
+    
+    updated_books = sum(1 for result in results if result["status"] == "updated")
+    return {
+        "status": "success",
+        "message": f"Aggiornamento completato: {updated_books} libri aggiornati",
+        "total": len(book_ids),
+        "updated": updated_books,
+        "failed": sum(1 for result in results if result["status"] in ("not_found", "not_owned")),
+        "results": results
+    }
+
 def bulk_delete_books(db: Session, book_ids: List[int], user_id: int):
     """
     Elimina in batch più libri.
     
+    Le operazioni sono per insiemi di ID (a blocchi di BULK_ID_CHUNK_SIZE):
+    una query classifica i libri richiesti (inesistenti, di altri utenti, in
+    prestito o eliminabili), poi i libri eliminabili vengono cancellati
+    insieme al loro storico prestiti, come in delete_book. Tutto avviene in
+    un'unica transazione.
+    
     Args:
         db: Session del database
         book_ids: Lista degli ID dei libri da eliminare
@@ -462,68 +628,55 @@ def bulk_delete_books(db: Session, book_ids: List[int], user_id: int):
     Returns:
         Dict: Risultato dell'operazione
     """
-    # Contatori per il report
     total_books = len(book_ids)
-    deleted_books = 0
-    failed_books = 0
-    failed_book_ids = []
-    not_owned_books = 0
-    not_owned_book_ids = []
-    loaned_books = 0
-    loaned_book_ids = []
+    # ID univoci, nell'ordine della richiesta
+    requested_ids = list(dict.fromkeys(book_ids))
     
     try:
-        # Per ogni libro, verifica proprietà e prestiti attivi prima di cancellare
-        for book_id in book_ids:
-            try:
-                # Recupera il libro
-                book = db.query(Book).filter(Book.id == book_id).first()
-                
-                # Se il libro non esiste, conteggialo come fallito
-                if not book:
-                    failed_books += 1
-                    failed_book_ids.append(book_id)
-                    continue
-                
-                # Verifica che l'utente sia il proprietario
-                if book.owner_id != user_id:
-                    not_owned_books += 1
-                    not_owned_book_ids.append(book_id)
-                    continue
-                
-                # Verifica che non ci siano prestiti attivi
-                active_loans = db.query(Loan).filter(
-                    Loan.book_id == book_id,
-                    (Loan.return_date.is_(None) | (Loan.return_date > datetime.now()))
-                ).count()
-                
-                if active_loans > 0:
-                    loaned_books += 1
-                    loaned_book_ids.append(book_id)
-                    continue
-                
-                # Elimina il libro
-                db.delete(book)
-                deleted_books += 1
-                
-            except Exception as e:
-                failed_books += 1
+        # Classifica tutti i libri richiesti
+        has_active_loan = select(Loan.id).where(Loan.book_id == Book.id, active_loan_filter()).exists()
+        found = {}
+        for start in range(0, len(requested_ids), BULK_ID_CHUNK_SIZE):
+            rows = db.query(
+                Book.id, Book.owner_id, Book.cover_hash, has_active_loan.label("loaned")
+            ).filter(Book.id.in_(requested_ids[start:start + BULK_ID_CHUNK_SIZE]))
+            found.update((row.id, row) for row in rows)
+        
+        failed_book_ids = []
+        not_owned_book_ids = []
+        loaned_book_ids = []
+        deletable_ids = []
+        for book_id in requested_ids:
+            book = found.get(book_id)
+            if book is None:
                 failed_book_ids.append(book_id)
-                print(f"Errore nell'eliminazione del libro {book_id}: {str(e)}")
+            elif book.owner_id != user_id:
+                not_owned_book_ids.append(book_id)
+            elif book.loaned:
+                loaned_book_ids.append(book_id)
+            else:
+                deletable_ids.append(book_id)
+        
+        # Elimina storico prestiti, libri e copertine rimaste senza libri
+        for start in range(0, len(deletable_ids), BULK_ID_CHUNK_SIZE):
+            chunk = deletable_ids[start:start + BULK_ID_CHUNK_SIZE]
+            db.query(Loan).filter(Loan.book_id.in_(chunk)).delete(synchronize_session=False)
+            db.query(Book).filter(Book.id.in_(chunk)).delete(synchronize_session=False)
+            release_covers(db, {found[book_id].cover_hash for book_id in chunk})
         
-        # Commit delle modifiche
         db.commit()
         
+        deleted_books = len(deletable_ids)
         return {
             "status": "success",
             "message": f"Eliminazione completata: {deleted_books} libri eliminati",
             "total": total_books,
             "deleted": deleted_books,
-            "failed": failed_books,
+            "failed": len(failed_book_ids),
             "failed_book_ids": failed_book_ids,
-            "not_owned": not_owned_books,
+            "not_owned": len(not_owned_book_ids),
             "not_owned_book_ids": not_owned_book_ids,
-            "loaned": loaned_books,
+            "loaned": len(loaned_book_ids),
             "loaned_book_ids": loaned_book_ids
         }
         
@@ -0,0 +1,194 @@
+import hashlib
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from backend.models.book import Book
+from backend.models.cover import Cover, CoverVariant
+from backend.models.metadata_cache import MetadataCacheEntry
+from backend.services.images import (
+    COVER_FORMATS, SOURCE_VARIANT, available_cover_variants, render_cover_variant
+)
+
+def compute_cover_hash(data: bytes) -> str:
+    """Calcola l'hash SHA-256 (esadecimale) usato come chiave della copertina."""
+    return hashlib.sha256(data).hexdigest()
+
+def store_cover(db: Session, data: bytes, media_type: str = "image/jpeg") -> str:
+    """
+    Salva una copertina nello store indirizzato per contenuto.
+
+    Copertine identiche vengono memorizzate una sola volta: se l'hash esiste già
+    non viene scritto nulla. Per le copertine nuove vengono generate anche le
+    varianti (thumb, WebP). Il commit è a carico del chiamante.
+
+    Args:
+        db: Session del database
+        data: Byte dell'immagine già compressa
+        media_type: Tipo MIME dell'immagine
+
+    Returns:
+        L'hash della copertina, da assegnare a Book.cover_hash
+    """
+    cover_hash = compute_cover_hash(data)
+    exists = db.query(Cover.hash).filter(Cover.hash == cover_hash).first()
+    if not exists:
+        db.add(Cover(hash=cover_hash, data=data, size=len(data), media_type=media_type))
+        for size, image_format in available_cover_variants():
+            variant = _build_variant(cover_hash, data, size, image_format)
+            if variant is not None:
+                db.add(variant)
+        # Flush immediato: due libri con la stessa copertina nella stessa transazione
+        # non devono generare due INSERT con la stessa chiave
+        db.flush()
+    return cover_hash
+
+def _build_variant(cover_hash: str, data: bytes, size: str, image_format: str) -> Optional[CoverVariant]:
+    rendered = render_cover_variant(data, size, image_format)
+    if rendered is None:
+        return None
+    return CoverVariant(
+        cover_hash=cover_hash, size=size, format=image_format,
+        data=rendered, length=len(rendered), media_type=COVER_FORMATS[image_format],
+    )
+
+def get_cover(db: Session, cover_hash: str) -> Optional[Cover]:
+    """Ottiene una copertina tramite hash."""
+    return db.query(Cover).filter(Cover.hash == cover_hash).first()
+
+def cover_etag(cover_hash: str, size: str, image_format: str) -> str:
+    """
+    ETag forte di una variante: il contenuto dipende solo dall'hash della
+    copertina e dalla variante richiesta, quindi non serve leggere i byte.
+    """
+    if (size, image_format) == SOURCE_VARIANT:
+        return f'"{cover_hash}"'
+    return f'"{cover_hash}-{size}.{image_format}"'
+
+def served_cover_etag(cover: Union[Cover, CoverVariant]) -> str:
+    """
+    ETag della rappresentazione effettivamente servita: se la variante non è
+    disponibile get_cover_variant restituisce l'originale, che ha il suo ETag.
+    """
+    if isinstance(cover, CoverVariant):
+        return cover_etag(cover.cover_hash, cover.size, cover.format)
+    return cover_etag(cover.hash, *SOURCE_VARIANT)
+
+def stored_cover_etag(db: Session, cover_hash: str, size: str, image_format: str) -> Optional[str]:
+    """
+    ETag della copertina che get_cover_variant servirebbe, se noto senza
+    leggere né generare l'immagine (per rispondere 304 alle richieste
+    condizionali); None se la variante va ancora generata.
+    """
+    if (size, image_format) == SOURCE_VARIANT or (size, image_format) not in available_cover_variants():
+        return cover_etag(cover_hash, *SOURCE_VARIANT)
+    stored = db.query(CoverVariant.cover_hash).filter(
+        CoverVariant.cover_hash == cover_hash,
+        CoverVariant.size == size,
+        CoverVariant.format == image_format,
+    ).first()
+    return cover_etag(cover_hash, size, image_format) if stored else None
+
+def get_cover_variant(db: Session, cover_hash: str, size: str, image_format: str) -> Optional[Union[Cover, CoverVariant]]:
+    """
+    Ottiene una variante della copertina (entrambi i modelli hanno data e media_type).
+    
+    Le varianti mancanti (copertine salvate prima delle varianti o formati
+    non supportati al momento del salvataggio) vengono generate al primo
+    accesso e salvate con _save_variant, senza fare il commit della sessione
+    del chiamante; se non è possibile generarle si restituisce l'originale
+    (vedi served_cover_etag).
+    """
+    if (size, image_format) == SOURCE_VARIANT:
+        return get_cover(db, cover_hash)
+    
+    variant = db.get(CoverVariant, (cover_hash, size, image_format))
+    if variant is not None:
+        return variant
+    
+    cover = get_cover(db, cover_hash)
+    if cover is None or (size, image_format) not in available_cover_variants():
+        return cover
+    
+    variant = _build_variant(cover_hash, cover.data, size, image_format)
+    if variant is None:
+        return cover
+    _save_variant(db, variant)
+    return variant
+
+def _save_variant(db: Session, variant: CoverVariant):
+    """
+    Salva una variante generata durante una lettura in una transazione a sé,
+    breve e separata da quella (di sola lettura) del chiamante.
+    """
+    try:
+        with Session(db.get_bind(), expire_on_commit=False) as write_db:
+            write_db.add(variant)
+            write_db.commit()
+    except IntegrityError:
+        # Generata nel frattempo da un'altra richiesta
+        pass
+
+def get_book_cover_variants(db: Session, book_ids: List[int], size: str, image_format: str) -> Dict[int, Tuple[str, Union[Cover, CoverVariant]]]:
+    """
+    Ottiene con una sola query la variante della copertina di più libri.
+    
+    Returns:
+        Dizionario book_id -> (cover_hash, copertina); i libri senza copertina
+        non sono presenti. Più libri possono condividere la stessa copertina.
+    """
+    if not book_ids:
+        return {}
+    
+    if (size, image_format) == SOURCE_VARIANT:
+        rows = db.query(Book.id, Book.cover_hash, Cover).join(
+            Cover, Cover.hash == Book.cover_hash
+        ).filter(Book.id.in_(book_ids)).all()
+    else:
+        rows = db.query(Book.id, Book.cover_hash, CoverVariant).outerjoin(
+            CoverVariant,
+            (CoverVariant.cover_hash == Book.cover_hash)
+            & (CoverVariant.size == size)
+            & (CoverVariant.format == image_format)
+        ).filter(Book.id.in_(book_ids), Book.cover_hash.isnot(None)).all()
+    
+    result = {}
+    generated = {}
+    for book_id, cover_hash, cover in rows:
+        if cover is None:
+            # Variante mai generata: come get_cover_variant, una volta sola per hash
+            if cover_hash not in generated:
+                generated[cover_hash] = get_cover_variant(db, cover_hash, size, image_format)
+            cover = generated[cover_hash]
+        if cover is not None:
+            result[book_id] = (cover_hash, cover)
+    return result
+
+def release_covers(db: Session, cover_hashes: Iterable[Optional[str]]) -> int:
+    """
+    Elimina le copertine indicate se nessun libro (né la cache dei metadati)
+    le referenzia più.
+
+    Da chiamare dopo aver sostituito o eliminato copertine di libri.
+    Il commit è a carico del chiamante.
+
+    Returns:
+        Numero di copertine eliminate
+    """
+    hashes = {h for h in cover_hashes if h}
+    if not hashes:
+        return 0
+
+    still_used = {
+        row.cover_hash for row in
+        db.query(Book.cover_hash).filter(Book.cover_hash.in_(hashes)).distinct()
+    }
+    still_used.update(
+        row.cover_hash for row in
+        db.query(MetadataCacheEntry.cover_hash).filter(MetadataCacheEntry.cover_hash.in_(hashes)).distinct()
+    )
+    orphaned = hashes - still_used
+    if not orphaned:
+        return 0
+
+    db.query(CoverVariant).filter(CoverVariant.cover_hash.in_(orphaned)).delete(synchronize_session=False)
+    return db.query(Cover).filter(Cover.hash.in_(orphaned)).delete(synchronize_session=False)
@@ -0,0 +1,64 @@
+from datetime import datetime
+from sqlalchemy import insert
+from sqlalchemy.orm import Session, selectinload
+from fastapi import HTTPException, status
+from backend.models.book import Book
+from backend.models.job import Job, JobItem
+from backend.crud.book import books_to_refresh_query
+
+REFRESH_METADATA_JOB = "refresh_metadata"
+
+def create_refresh_metadata_job(db: Session, user_id: int, owner_id: int = None) -> Job:
+    """
+    Crea un job di aggiornamento metadati con un elemento per ogni libro da elaborare.
+    
+    L'elenco dei libri viene fissato alla creazione, così un job interrotto
+    da un riavvio riprende esattamente dai libri ancora in sospeso.
+    
+    Args:
+        db: Sessione del database
+        user_id: Utente che avvia il job
+        owner_id: Se specificato, aggiorna tutti i libri di questo utente;
+                  altrimenti solo i libri con informazioni mancanti
+    """
+    book_ids = [row.id for row in books_to_refresh_query(db, owner_id).with_entities(Book.id).order_by(Book.id)]
+    now = datetime.utcnow()
+    
+    job = Job(
+        type=REFRESH_METADATA_JOB,
+        status="queued" if book_ids else "completed",
+        user_id=user_id,
+        owner_id=owner_id,
+        total=len(book_ids),
+        message=None if book_ids else "Nessun libro da aggiornare trovato",
+        created_at=now,
+        updated_at=now,
+        finished_at=None if book_ids else now,
+    )
+    db.add(job)
+    db.flush()
+    
+    if book_ids:
+        db.execute(insert(JobItem), [
+            {"job_id": job.id, "book_id": book_id, "status": "pending"} for book_id in book_ids
+        ])
+    
+    db.commit()
+    db.refresh(job)
+    return job
+
+def get_job(db: Session, job_id: int, user_id: int = None, is_admin: bool = False) -> Job:
+    """
+    Ottiene un job verificando che appartenga all'utente (gli admin vedono tutti i job).
+    """
+    # JobDetail serializza gli esiti: caricati subito con una sola query
+    job = db.query(Job).options(selectinload(Job.items)).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job non trovato")
+    if user_id is not None and job.user_id != user_id and not is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Non sei autorizzato a vedere questo job")
+    return job
+
+def get_unfinished_job_ids(db: Session):
+    """ID dei job ancora da completare, in ordine di creazione."""
+    return [row.id for row in db.query(Job.id).filter(Job.status.in_(["queued", "running"])).order_by(Job.id)]
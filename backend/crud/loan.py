@@ -1,13 +1,146 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, case, or_, select
+from sqlalchemy.orm import Session, aliased, raiseload
+from backend.crud.book import active_loan_filter
 from backend.models.loan import Loan
 from backend.models.book import Book
 from backend.models.user import User
 from backend.schemas.loan import LoanCreate, LoanUpdate, LoanDelete
 from fastapi import HTTPException, status
-from datetime import datetime, timedelta, timezone
+from datetime import date, datetime, timedelta, timezone
+
+# Durata di un prestito senza data di restituzione indicata: oltre questo
+# periodo un prestito senza return_date è considerato in ritardo
+LOAN_DURATION_DAYS = 30
+
+def overdue_loan_filter(now: datetime = None):
+    """Condizione SQL per i prestiti in ritardo: senza data di restituzione e iniziati da più di LOAN_DURATION_DAYS."""
+    now = now or datetime.now()
+    return and_(Loan.return_date.is_(None), Loan.loan_date < now - timedelta(days=LOAN_DURATION_DAYS))
 
 def get_loans(db: Session, skip: int = 0, limit: int = 10):
-    return db.query(Loan).offset(skip).limit(limit).all()
+    return db.query(Loan).options(raiseload("*")).offset(skip).limit(limit).all()
+
+def get_active_loans(db: Session, book_ids) -> dict:
+    """
+    Prestiti in corso dei libri indicati, con il nome di chi li ha in prestito.
+
+    Una sola query (indice ix_loans_book_id_return_date) per qualsiasi numero
+    di libri. Se un libro avesse più prestiti attivi vale il più recente.
+
+    Returns:
+        Dizionario {book_id: dati per schemas.ActiveLoan}
+    """
+    book_ids = list(book_ids)
+    if not book_ids:
+        return {}
+
+    rows = db.query(
+        Loan.id, Loan.book_id, Loan.user_id, Loan.loan_date, Loan.return_date,
+        User.name.label("borrower_name"),
+    ).outerjoin(User, User.id == Loan.user_id).filter(
+        Loan.book_id.in_(book_ids), active_loan_filter()
+    ).order_by(Loan.id).all()
+
+    # In ordine di ID: il prestito più recente sovrascrive i precedenti
+    return {row.book_id: row._asdict() for row in rows}
+
+def attach_active_loans(db: Session, books):
+    """Valorizza book.active_loan per una lista di libri (o un singolo libro)."""
+    if books is None:
+        return books
+    targets = books if isinstance(books, list) else [books]
+    active_loans = get_active_loans(db, {book.id for book in targets})
+    for book in targets:
+        book.active_loan = active_loans.get(book.id)
+    return books
+
+def get_book_loan_status(db: Session, book_id: int):
+    """Stato di prestito di un singolo libro (disponibile o prestito in corso)."""
+    if not db.query(Book.id).filter(Book.id == book_id).first():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Book not found")
+    active_loan = get_active_loans(db, [book_id]).get(book_id)
+    return {"book_id": book_id, "available": active_loan is None, "active_loan": active_loan}
+
+def get_loan_ledger(
+    db: Session,
+    user_id: int,
+    role: str = "all",
+    status: str = "all",
+    date_from: date = None,
+    date_to: date = None,
+    before_id: int = None,
+    limit: int = 50,
+):
+    """
+    Ottiene una pagina dei prestiti collegati a un utente, già uniti a libro,
+    proprietario e destinatario.
+
+    I prestiti sono ordinati dal più recente (ID decrescente). Con before_id
+    (l'ID dell'ultimo prestito ricevuto) la pagina successiva parte da lì,
+    quindi il costo di una pagina dipende solo dalla sua dimensione.
+
+    Args:
+        db: Session del database
+        user_id: ID dell'utente corrente
+        role: "lender" (libri dell'utente prestati ad altri), "borrower"
+              (libri presi in prestito dall'utente) o "all"
+        status: "active" (in corso), "returned" (restituiti) o "all"
+        date_from: Data minima del prestito (inclusa)
+        date_to: Data massima del prestito (inclusa)
+        before_id: Se specificato, solo prestiti con ID minore
+        limit: Numero massimo di prestiti da restituire
+
+    Returns:
+        Lista di dizionari con i campi di schemas.LoanLedgerEntry
+    """
+    owner = aliased(User)
+    borrower = aliased(User)
+    is_lender = Book.owner_id == user_id
+    # Filtri espressi su loans, così SQLite parte dagli indici di loans
+    # (book_id / user_id) invece di scandire la tabella
+    owned_book_ids = select(Book.id).where(Book.owner_id == user_id)
+    active = active_loan_filter()
+
+    query = db.query(
+        Loan.id, Loan.book_id, Loan.user_id, Loan.loan_date, Loan.return_date,
+        Book.title, Book.author, Book.owner_id,
+        owner.name.label("owner_name"), borrower.name.label("borrower_name"),
+        case((is_lender, "lender"), else_="borrower").label("role"),
+        case((active, "active"), else_="returned").label("status"),
+    ).join(Book, Book.id == Loan.book_id).outerjoin(
+        owner, owner.id == Book.owner_id
+    ).join(borrower, borrower.id == Loan.user_id)
+
+    if role == "lender":
+        query = query.filter(Loan.book_id.in_(owned_book_ids))
+    elif role == "borrower":
+        # Un prestito di un proprio libro a se stessi conta come "lender"
+        query = query.filter(Loan.user_id == user_id, Book.owner_id.is_distinct_from(user_id))
+    else:
+        query = query.filter(or_(Loan.book_id.in_(owned_book_ids), Loan.user_id == user_id))
+
+    if status == "active":
+        query = query.filter(active)
+    elif status == "returned":
+        query = query.filter(~active)
+
+    if date_from is not None:
+        query = query.filter(Loan.loan_date >= datetime.combine(date_from, datetime.min.time()))
+    if date_to is not None:
+        query = query.filter(Loan.loan_date < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    if before_id is not None:
+        query = query.filter(Loan.id < before_id)
+
+    rows = query.order_by(Loan.id.desc()).limit(limit).all()
+    return [
+        {
+            **row._asdict(),
+            "book_title": row.title,
+            "book_author": row.author,
+            "counterparty_name": row.borrower_name if row.role == "lender" else row.owner_name,
+        }
+        for row in rows
+    ]
 
 def create_loan(db: Session, loan: LoanCreate):
     # Check if the book exists
@@ -31,7 +164,7 @@ def create_loan(db: Session, loan: LoanCreate):
 
     # Set default return date and loan date if not provided
     loan_date = loan.loan_date if loan.loan_date else datetime.now(timezone.utc)
-    return_date = loan.return_date if loan.return_date else datetime.now(timezone.utc) + timedelta(days=30)
+    return_date = loan.return_date if loan.return_date else datetime.now(timezone.utc) + timedelta(days=LOAN_DURATION_DAYS)
 
     db_loan = Loan(book_id=loan.book_id, user_id=loan.user_id, loan_date=loan_date, return_date=return_date)
     db.add(db_loan)
@@ -40,7 +173,7 @@ def create_loan(db: Session, loan: LoanCreate):
     return db_loan
 
 def update_loan(db: Session, loan_id: int, loan: LoanUpdate):
-    db_loan = db.query(Loan).filter(Loan.id == loan_id).first()
+    db_loan = db.query(Loan).options(raiseload("*")).filter(Loan.id == loan_id).first()
     if not db_loan:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Loan not found")
     
@@ -60,7 +193,7 @@ def update_loan(db: Session, loan_id: int, loan: LoanUpdate):
     return db_loan
 
 def delete_loan(db: Session, loan_id: int):
-    db_loan = db.query(Loan).filter(Loan.id == loan_id).first()
+    db_loan = db.query(Loan).options(raiseload("*")).filter(Loan.id == loan_id).first()
     if not db_loan:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Loan not found")
     db.delete(db_loan)
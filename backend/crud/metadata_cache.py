@@ -0,0 +1,200 @@
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from backend.models.metadata_cache import MetadataCacheEntry
+from backend.crud.cover import store_cover, release_covers
+from backend.services.google_books import PROVIDER_ERROR, fetch_book_metadata_with_provider, fetch_many_book_metadata
+
+# Configurazione della cache
+CACHE_TTL = timedelta(days=float(os.environ.get("METADATA_CACHE_TTL_DAYS", "30")))
+NEGATIVE_CACHE_TTL = timedelta(hours=float(os.environ.get("METADATA_CACHE_NEGATIVE_TTL_HOURS", "24")))
+CACHE_MAX_ENTRIES = int(os.environ.get("METADATA_CACHE_MAX_ENTRIES", "50000"))
+
+METADATA_FIELDS = ("title", "author", "description", "publisher", "publish_year")
+
+# Contatori del processo corrente
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "negative_hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+
+def _count(name: str, amount: int = 1):
+    with _stats_lock:
+        _stats[name] += amount
+
+def normalize_isbn(isbn: str) -> str:
+    """Normalizza un ISBN rimuovendo spazi e trattini."""
+    return re.sub(r"[\s-]", "", isbn or "").upper()
+
+def _is_fresh(entry: MetadataCacheEntry, now: datetime) -> bool:
+    ttl = CACHE_TTL if entry.found else NEGATIVE_CACHE_TTL
+    return entry.fetched_at + ttl > now
+
+def _entry_to_metadata(entry: MetadataCacheEntry, isbn: str) -> Optional[dict]:
+    if not entry.found:
+        return None
+    metadata = {field: getattr(entry, field) for field in METADATA_FIELDS}
+    metadata["isbn"] = isbn
+    metadata["cover_hash"] = entry.cover_hash
+    return metadata
+
+def get_cached_metadata(db: Session, isbn: str) -> Tuple[bool, Optional[dict]]:
+    """
+    Cerca i metadati di un ISBN nella cache.
+
+    Returns:
+        Tupla (hit, metadati). Con hit=True e metadati None l'ISBN è in cache
+        come risultato negativo: i provider non lo conoscono.
+    """
+    entry = db.get(MetadataCacheEntry, normalize_isbn(isbn))
+    now = datetime.utcnow()
+
+    if entry is None:
+        _count("misses")
+        return False, None
+    if not _is_fresh(entry, now):
+        _count("expired")
+        _count("misses")
+        return False, None
+
+    entry.last_accessed = now
+    _count("hits" if entry.found else "negative_hits")
+    return True, _entry_to_metadata(entry, isbn)
+
+def store_metadata(db: Session, isbn: str, metadata: Optional[dict], provider: str = None, evict: bool = True) -> Optional[dict]:
+    """
+    Salva in cache i metadati di un ISBN (o un risultato negativo se None).
+
+    Il risultato negativo viene salvato solo se tutti i provider hanno
+    risposto che l'ISBN non esiste: dopo un errore (provider PROVIDER_ERROR)
+    non si salva nulla, così la richiesta successiva riprova.
+
+    L'eventuale copertina viene salvata nello store delle copertine.
+    Con evict=False non applica il limite di dimensione della cache (chi
+    salva più voci chiama evict_metadata_cache una volta sola alla fine).
+    Il commit è a carico del chiamante.
+
+    Returns:
+        I metadati normalizzati, con cover_hash al posto dei byte della copertina
+    """
+    if metadata is None and provider == PROVIDER_ERROR:
+        return None
+
+    key = normalize_isbn(isbn)
+    now = datetime.utcnow()
+
+    # Prima la copertina: store_cover esegue un flush della sessione
+    cover_image = metadata.get("cover_image") if metadata else None
+    cover_hash = store_cover(db, cover_image) if cover_image else None
+
+    entry = db.get(MetadataCacheEntry, key)
+    old_cover_hash = entry.cover_hash if entry else None
+    if entry is None:
+        entry = MetadataCacheEntry(isbn=key)
+        db.add(entry)
+
+    entry.found = metadata is not None
+    for field in METADATA_FIELDS:
+        setattr(entry, field, metadata.get(field) if metadata else None)
+    entry.cover_hash = cover_hash
+    entry.provider = provider
+    entry.fetched_at = now
+    entry.last_accessed = now
+    db.flush()
+
+    if old_cover_hash != entry.cover_hash:
+        release_covers(db, [old_cover_hash])
+    if evict:
+        evict_metadata_cache(db)
+
+    return _entry_to_metadata(entry, isbn)
+
+def evict_metadata_cache(db: Session, max_entries: int = None) -> int:
+    """
+    Elimina le voci usate meno di recente oltre la dimensione massima della cache.
+
+    Returns:
+        Numero di voci eliminate
+    """
+    max_entries = CACHE_MAX_ENTRIES if max_entries is None else max_entries
+    total = db.query(func.count(MetadataCacheEntry.isbn)).scalar()
+    excess = total - max_entries
+    if excess <= 0:
+        return 0
+
+    victims = db.query(MetadataCacheEntry.isbn, MetadataCacheEntry.cover_hash).order_by(
+        MetadataCacheEntry.last_accessed
+    ).limit(excess).all()
+
+    db.query(MetadataCacheEntry).filter(
+        MetadataCacheEntry.isbn.in_([victim.isbn for victim in victims])
+    ).delete(synchronize_session=False)
+    release_covers(db, [victim.cover_hash for victim in victims])
+
+    _count("evictions", len(victims))
+    return len(victims)
+
+def get_book_metadata(db: Session, isbn: str) -> Optional[dict]:
+    """
+    Ottiene i metadati di un ISBN passando dalla cache.
+
+    Sostituisce fetch_book_metadata per il codice che ha una sessione del
+    database: in caso di miss interroga i provider e salva il risultato,
+    anche se negativo. La copertina è restituita come cover_hash.
+    """
+    if not isbn:
+        return None
+
+    hit, metadata = get_cached_metadata(db, isbn)
+    if hit:
+        return metadata
+
+    metadata, provider = fetch_book_metadata_with_provider(isbn)
+    return store_metadata(db, isbn, metadata, provider)
+
+def get_book_metadata_many(db: Session, isbns: Iterable[str], concurrency: int = 4) -> List[Tuple[str, Optional[dict]]]:
+    """
+    Versione a lotti di get_book_metadata.
+
+    Gli ISBN non in cache sono richiesti ai provider in parallelo senza
+    scrivere nulla nella sessione: con SQLite il lock di scrittura verrebbe
+    tenuto per tutta la durata delle richieste HTTP. Solo a lotto completo i
+    risultati vengono salvati in cache, nella sessione del chiamante, che
+    deve fare il commit subito dopo (la transazione resta breve).
+
+    Returns:
+        Lista di tuple (isbn, metadati): prima gli ISBN in cache, poi gli
+        altri nell'ordine di completamento
+    """
+    results, misses = [], []
+    # L'aggiornamento di last_accessed non deve arrivare al database prima della scrittura finale
+    with db.no_autoflush:
+        for isbn in dict.fromkeys(isbn for isbn in isbns if isbn):
+            hit, metadata = get_cached_metadata(db, isbn)
+            if hit:
+                results.append((isbn, metadata))
+            else:
+                misses.append(isbn)
+
+    fetched = list(fetch_many_book_metadata(misses, concurrency=concurrency))
+
+    for isbn, metadata, provider in fetched:
+        results.append((isbn, store_metadata(db, isbn, metadata, provider, evict=False)))
+    if fetched:
+        evict_metadata_cache(db)
+    return results
+
+def get_cache_stats(db: Session) -> dict:
+    """Statistiche della cache: contatori del processo e numero di voci salvate."""
+    with _stats_lock:
+        stats = dict(_stats)
+
+    lookups = stats["hits"] + stats["negative_hits"] + stats["misses"]
+    stats["hit_rate"] = (stats["hits"] + stats["negative_hits"]) / lookups if lookups else 0.0
+    stats["entries"] = db.query(func.count(MetadataCacheEntry.isbn)).scalar()
+    stats["negative_entries"] = db.query(func.count(MetadataCacheEntry.isbn)).filter(
+        MetadataCacheEntry.found.is_(False)
+    ).scalar()
+    return stats
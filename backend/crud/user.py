@@ -1,19 +1,96 @@
-from sqlalchemy.orm import Session
+import hashlib
+import os
+import time
+from sqlalchemy import and_, case, func
+from sqlalchemy.orm import Session, raiseload
+from sqlalchemy.orm.session import make_transient_to_detached
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
 from datetime import datetime
 from jose import JWTError, jwt
 
 from backend.models.user import User
 from backend.models.loan import Loan
+from backend.models.book import Book
+from backend.crud.book import active_loan_filter
+from backend.crud.loan import overdue_loan_filter
 from backend.schemas.user import UserCreate, UserUpdate, UserDelete
-from backend.security import get_password_hash, verify_password, decode_token, SECRET_KEY, ALGORITHM
+from backend.security import get_password_hash, verify_password, verify_password_async, decode_token, SECRET_KEY, ALGORITHM
 from backend.database import get_db
+from backend.cache import TTLCache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
+# Cache degli utenti autenticati, indicizzata per hash del token: evita di
+# decodificare il JWT e di interrogare il database ad ogni richiesta
+principal_cache = TTLCache(
+    max_entries=int(os.environ.get("PRINCIPAL_CACHE_MAX_ENTRIES", "1024")),
+    ttl=float(os.environ.get("PRINCIPAL_CACHE_TTL_SECONDS", "60")),
+)
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+def _detached_copy(user: User) -> User:
+    """Copia dell'utente non legata a nessuna sessione, da riattaccare con db.merge(load=False)."""
+    copy = User(**{column.key: getattr(user, column.key) for column in User.__table__.columns})
+    make_transient_to_detached(copy)
+    return copy
+
+def get_principal_cache_stats() -> dict:
+    """Statistiche della cache degli utenti autenticati (hit rate, voci, scadenze)."""
+    return principal_cache.stats()
+
+def invalidate_principal(user_id: int):
+    """Rimuove dalla cache tutti i token di un utente (da chiamare quando l'utente cambia)."""
+    principal_cache.invalidate_where(lambda entry: entry[0].id == user_id)
+
 def get_users(db: Session, skip: int = 0, limit: int = 10):
-    return db.query(User).offset(skip).limit(limit).all()
+    return db.query(User).options(raiseload("*")).offset(skip).limit(limit).all()
+
+# Separatore dei titoli in group_concat (non compare nei titoli)
+_TITLE_SEPARATOR = "\x1f"
+
+def get_users_summary(db: Session, after_id: int = None, limit: int = 50):
+    """
+    Ottiene una pagina di utenti con il riepilogo dei loro prestiti.
+
+    Conteggi e titoli sono calcolati in un'unica query con GROUP BY sugli
+    utenti della pagina (prestiti letti tramite ix_loans_user_id_return_date).
+
+    Args:
+        db: Session del database
+        after_id: Se specificato, solo utenti con ID maggiore
+        limit: Numero massimo di utenti da restituire
+
+    Returns:
+        Lista di dizionari con i campi di schemas.UserSummary
+    """
+    # Con l'outer join un utente senza prestiti ha una riga di Loan tutta NULL,
+    # che soddisferebbe "return_date IS NULL": va esclusa esplicitamente
+    active = and_(Loan.id.isnot(None), active_loan_filter())
+    overdue = overdue_loan_filter()
+
+    query = db.query(
+        User.id, User.name, User.email, User.role, User.is_active, User.last_login,
+        func.count(Loan.id).label("total_loans"),
+        func.coalesce(func.sum(case((active, 1), else_=0)), 0).label("active_loans"),
+        func.coalesce(func.sum(case((and_(active, overdue), 1), else_=0)), 0).label("overdue_loans"),
+        func.group_concat(case((active, Book.title)), _TITLE_SEPARATOR).label("titles"),
+    ).outerjoin(Loan, Loan.user_id == User.id).outerjoin(Book, Book.id == Loan.book_id)
+
+    if after_id is not None:
+        query = query.filter(User.id > after_id)
+
+    rows = query.group_by(User.id).order_by(User.id).limit(limit).all()
+    summaries = []
+    for row in rows:
+        summary = row._asdict()
+        titles = summary.pop("titles")
+        summary["active_loan_titles"] = titles.split(_TITLE_SEPARATOR) if titles else []
+        summaries.append(summary)
+    return summaries
 
 def get_user(db: Session, user_id: int):
     """Ottiene un utente tramite ID."""
@@ -23,10 +100,16 @@ def get_user_by_email(db: Session, email: str):
     """Ottiene un utente tramite email."""
     return db.query(User).filter(User.email == email).first()
 
-def create_user(db: Session, user: UserCreate):
-    """Crea un nuovo utente."""
+def create_user(db: Session, user: UserCreate, hashed_password: str = None):
+    """
+    Crea un nuovo utente.
+    
+    hashed_password permette di passare un hash già calcolato (es. con
+    get_password_hash_async) invece di calcolarlo qui.
+    """
     # Hashing della password se fornita
-    hashed_password = get_password_hash(user.password) if user.password else None
+    if hashed_password is None and user.password:
+        hashed_password = get_password_hash(user.password)
     
     # Crea l'oggetto utente
     db_user = User(
@@ -64,6 +147,7 @@ def update_user(db: Session, user_id: int, user: UserUpdate):
         
     db.commit()
     db.refresh(db_user)
+    invalidate_principal(user_id)
     return db_user
 
 def delete_user(db: Session, user_id: int):
@@ -83,6 +167,7 @@ def delete_user(db: Session, user_id: int):
     
     db.delete(db_user)
     db.commit()
+    invalidate_principal(user_id)
     return UserDelete(message="Utente eliminato con successo", user=db_user)
 
 def authenticate_user(db: Session, email: str, password: str):
@@ -96,21 +181,50 @@ def authenticate_user(db: Session, email: str, password: str):
         return False
     return user
 
+async def authenticate_user_async(db: Session, email: str, password: str):
+    """
+    Come authenticate_user, per gli endpoint async: la query gira nel
+    threadpool e bcrypt nel pool di hashing, senza bloccare l'event loop.
+    """
+    user = await run_in_threadpool(get_user_by_email, db, email)
+    if not user or not user.hashed_password:
+        return False
+    if not await verify_password_async(password, user.hashed_password):
+        return False
+    return user
+
 def update_last_login(db: Session, user_id: int):
-    """Aggiorna il timestamp dell'ultimo accesso."""
+    """Aggiorna il timestamp dell'ultimo accesso e restituisce l'utente aggiornato."""
     db_user = get_user(db, user_id)
     if db_user:
         db_user.last_login = datetime.utcnow()
         db.commit()
+        db.refresh(db_user)
+        invalidate_principal(user_id)
+    return db_user
 
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """Ottiene l'utente corrente dal token JWT."""
+    """
+    Ottiene l'utente corrente dal token JWT.
+    
+    I token già verificati sono in cache per PRINCIPAL_CACHE_TTL_SECONDS:
+    l'utente in cache viene riattaccato alla sessione senza query.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Credenziali non valide",
         headers={"WWW-Authenticate": "Bearer"},
     )
     
+    key = _token_key(token)
+    cached = principal_cache.get(key)
+    if cached is not None:
+        user, expires_at = cached
+        if expires_at is None or expires_at > time.time():
+            return db.merge(user, load=False)
+        principal_cache.invalidate(key)
+        raise credentials_exception
+    
     try:
         # Decodifica il token
         payload = decode_token(token)
@@ -129,5 +243,6 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     user = get_user(db, user_id)
     if user is None:
         raise credentials_exception
-        
-    return user
\ No newline at end of file
+    
+    principal_cache.set(key, (_detached_copy(user), payload.get("exp")))
+    return user
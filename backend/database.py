@@ -1,10 +1,91 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./books.db"
+SQLALCHEMY_DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///./books.db")
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+# Pool di connessioni (database su file o server)
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+
+# PRAGMA applicati ad ogni nuova connessione SQLite. Con WAL i lettori non
+# vengono bloccati dalle scritture (es. un'importazione in corso) e
+# synchronous=NORMAL è sicuro contro la corruzione del database.
+SQLITE_PRAGMAS = {
+    "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    # Valori negativi sono in KiB: -65536 = 64 MiB di cache per connessione
+    "cache_size": int(os.environ.get("SQLITE_CACHE_SIZE", "-65536")),
+    "temp_store": os.environ.get("SQLITE_TEMP_STORE", "MEMORY"),
+    "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+}
+
+# PRAGMA che non hanno senso per un database in memoria
+FILE_ONLY_PRAGMAS = ("journal_mode", "mmap_size")
+
+def build_engine(database_url: str):
+    """
+    Crea l'engine dell'applicazione a partire dall'URL del database.
+
+    - SQLite in memoria: StaticPool, un'unica connessione condivisa
+      (ogni nuova connessione vedrebbe un database vuoto)
+    - SQLite su file: QueuePool con i PRAGMA di SQLITE_PRAGMAS
+    - Altri database: QueuePool con verifica delle connessioni
+    """
+    url = make_url(database_url)
+
+    if url.get_backend_name() != "sqlite":
+        return create_engine(
+            database_url,
+            poolclass=QueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_pre_ping=True,
+        )
+
+    in_memory = url.database in (None, "", ":memory:")
+    if in_memory:
+        engine = create_engine(
+            database_url,
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+    else:
+        engine = create_engine(
+            database_url,
+            connect_args={
+                "check_same_thread": False,
+                "timeout": SQLITE_PRAGMAS["busy_timeout"] / 1000,
+            },
+            poolclass=QueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+
+    pragmas = {
+        name: value for name, value in SQLITE_PRAGMAS.items()
+        if not (in_memory and name in FILE_ONLY_PRAGMAS)
+    }
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    return engine
+
+engine = build_engine(SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -17,5 +98,8 @@ def get_db():
 
 # Import models
 from backend.models.book import Book
+from backend.models.cover import Cover, CoverVariant
 from backend.models.user import User
 from backend.models.loan import Loan
+from backend.models.job import Job, JobItem
+from backend.models.metadata_cache import MetadataCacheEntry
@@ -0,0 +1,273 @@
+# backend/metrics.py
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+# Bucket (secondi) per le latenze e per il numero di query per richiesta
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250, 500, 1000)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Contatore monotono con etichette, esposto in formato Prometheus."""
+
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+class Histogram:
+    """Istogramma con bucket fissi ed etichette, esposto in formato Prometheus."""
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Misura la durata del blocco with."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = {key: {**series, "buckets": list(series["buckets"])} for key, series in self._values.items()}
+        for key, series in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series["buckets"]):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [("le", _format_value(bound))])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(series['sum'])}"
+            yield f"{self.name}_count{labels} {series['count']}"
+
+class Registry:
+    """Insieme delle metriche e dei collector esposti da /metrics."""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        """
+        Registra una funzione che restituisce metriche calcolate al momento
+        della lettura, come lista di tuple (nome, tipo, descrizione, {etichette: valore}).
+        """
+        with self._lock:
+            self._collectors.append(collector)
+        return collector
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        for collector in collectors:
+            for name, metric_type, documentation, values in collector():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in values.items():
+                    lines.append(f"{name}{_format_labels([k for k, _ in labels], [v for _, v in labels])} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "http_requests_total", "Richieste HTTP per route e codice di stato",
+    ("method", "route", "status"),
+))
+HTTP_REQUEST_DURATION = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Latenza delle richieste HTTP per route",
+    ("method", "route"),
+))
+HTTP_REQUEST_DB_QUERIES = REGISTRY.register(Histogram(
+    "http_request_db_queries", "Query SQL eseguite per richiesta",
+    ("method", "route"), buckets=QUERY_COUNT_BUCKETS,
+))
+HTTP_REQUEST_DB_DURATION = REGISTRY.register(Histogram(
+    "http_request_db_duration_seconds", "Tempo passato nel database per richiesta",
+    ("method", "route"),
+))
+DB_QUERIES = REGISTRY.register(Counter(
+    "db_queries_total", "Query SQL eseguite (incluse quelle dei job in background)",
+))
+DB_QUERY_DURATION = REGISTRY.register(Histogram(
+    "db_query_duration_seconds", "Durata delle singole query SQL",
+))
+METADATA_PROVIDER_DURATION = REGISTRY.register(Histogram(
+    "metadata_provider_duration_seconds", "Durata delle chiamate ai provider di metadati",
+    ("provider", "outcome"),
+))
+IMAGE_PROCESSING_DURATION = REGISTRY.register(Histogram(
+    "image_processing_duration_seconds", "Durata delle elaborazioni Pillow (ridimensionamento e compressione)",
+    ("operation",),
+))
+
+# Statistiche della richiesta HTTP in corso (query e tempo nel database).
+# Il dizionario è condiviso con i thread del threadpool, che copiano il contesto.
+_request_stats = contextvars.ContextVar("request_stats", default=None)
+
+def instrument_engine(engine):
+    """Conta query e tempo nel database, globalmente e per la richiesta in corso."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_times", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start_times = conn.info.get("query_start_times")
+        if not start_times:
+            return
+        elapsed = time.perf_counter() - start_times.pop()
+        DB_QUERIES.inc()
+        DB_QUERY_DURATION.observe(elapsed)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats["queries"] += 1
+            stats["db_seconds"] += elapsed
+
+    return engine
+
+def _route_template(scope):
+    """
+    Path della route che ha gestito la richiesta (es. /books/{book_id}), per
+    non creare una serie per ogni ID.
+
+    FastAPI salva la route nello scope; con i router inclusi il suo path può
+    essere relativo al prefisso, che si ricava dalla parte del path della
+    richiesta non coperta dalla route.
+    """
+    route = scope.get("route")
+    route_path = getattr(route, "path", None)
+    path_regex = getattr(route, "path_regex", None)
+    if not route_path:
+        return "unmatched"
+    path = scope["path"]
+    if path_regex is not None:
+        for i, char in enumerate(path):
+            if char == "/" and path_regex.match(path[i:]):
+                return path[:i] + route_path
+    return route_path
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI che registra latenza, codice di stato, query SQL e tempo
+    nel database di ogni richiesta HTTP, per route.
+
+    La durata comprende l'invio dell'intero corpo della risposta (anche per le
+    risposte in streaming).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = {"queries": 0, "db_seconds": 0.0}
+        token = _request_stats.set(stats)
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_stats.reset(token)
+            labels = {"method": scope["method"], "route": _route_template(scope)}
+            HTTP_REQUESTS.inc(status=str(status_code), **labels)
+            HTTP_REQUEST_DURATION.observe(elapsed, **labels)
+            HTTP_REQUEST_DB_QUERIES.observe(stats["queries"], **labels)
+            HTTP_REQUEST_DB_DURATION.observe(stats["db_seconds"], **labels)
+
+def register_cache_stats(cache_name, stats):
+    """Espone le statistiche di una cache (TTLCache.stats) con l'etichetta cache."""
+    label = (("cache", cache_name),)
+
+    def collect():
+        values = stats()
+        return [
+            ("cache_hits_total", "counter", "Letture trovate in cache", {label: values["hits"]}),
+            ("cache_misses_total", "counter", "Letture non trovate in cache", {label: values["misses"]}),
+            ("cache_evictions_total", "counter", "Voci eliminate per fare spazio", {label: values["evictions"]}),
+            ("cache_entries", "gauge", "Voci presenti in cache", {label: values["entries"]}),
+        ]
+
+    return REGISTRY.register_collector(collect)
+
+def render_metrics() -> str:
+    """Tutte le metriche in formato testo Prometheus."""
+    return REGISTRY.render()
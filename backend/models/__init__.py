@@ -1,4 +1,7 @@
 from backend.database import Base
 from backend.models.book import Book
+from backend.models.cover import Cover, CoverVariant
+from backend.models.job import Job, JobItem
 from backend.models.loan import Loan
+from backend.models.metadata_cache import MetadataCacheEntry
 from backend.models.user import User
\ No newline at end of file
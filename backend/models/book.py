@@ -1,19 +1,41 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, LargeBinary
+from sqlalchemy import Column, Integer, String, ForeignKey, Index, table, column, text
 from sqlalchemy.orm import relationship
 from backend.database import Base
 
 class Book(Base):
     __tablename__ = "books"
+    __table_args__ = (
+        # Controllo dei duplicati per proprietario (create_book, importazione multipla)
+        Index("ix_books_owner_id_isbn", "owner_id", "isbn",
+              sqlite_where=text("isbn IS NOT NULL"), postgresql_where=text("isbn IS NOT NULL")),
+        Index("ix_books_owner_id_title", "owner_id", "title"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
     author = Column(String, index=True)
-    description = Column(String, index=True)
+    description = Column(String)  # Cercata tramite books_fts, un indice B-tree non serve
     isbn = Column(String, index=True, nullable=True)
     publisher = Column(String, nullable=True)
     publish_year = Column(Integer, nullable=True)
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=True)
-    cover_image = Column(LargeBinary, nullable=True)  # Aggiungiamo il campo per la copertina
+    # Le immagini stanno nella tabella covers: qui solo l'hash, così le liste non caricano mai i byte
+    cover_hash = Column(String(64), ForeignKey("covers.hash"), nullable=True, index=True)
     
     loans = relationship("Loan", back_populates="book")
-    owner = relationship("User", back_populates="owned_books")
\ No newline at end of file
+    owner = relationship("User", back_populates="owned_books")
+
+    # Prestito in corso (non una colonna): valorizzato per le risposte da
+    # crud.loan.attach_active_loans con una sola query per tutta la pagina
+    active_loan = None
+
+    @property
+    def has_cover(self):
+        """Indica se il libro ha una copertina associata."""
+        return self.cover_hash is not None
+
+
+# Indice full-text FTS5 sui libri (solo SQLite), mantenuto da trigger creati nella
+# migrazione 0003_books_fts. Il rowid coincide con Book.id; la colonna omonima
+# della tabella serve per l'operatore MATCH.
+books_fts = table("books_fts", column("rowid"), column("books_fts"))
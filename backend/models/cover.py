@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, String, LargeBinary, ForeignKey
+from backend.database import Base
+
+class Cover(Base):
+    """Copertina memorizzata una sola volta e indirizzata tramite SHA-256 del contenuto."""
+    __tablename__ = "covers"
+
+    hash = Column(String(64), primary_key=True)  # SHA-256 esadecimale dei byte dell'immagine
+    data = Column(LargeBinary, nullable=False)
+    size = Column(Integer, nullable=False)
+    media_type = Column(String, nullable=False, default="image/jpeg")
+
+class CoverVariant(Base):
+    """Copertina ridimensionata e/o ricodificata (es. thumb in WebP), generata dalla copertina originale."""
+    __tablename__ = "cover_variants"
+
+    cover_hash = Column(String(64), ForeignKey("covers.hash"), primary_key=True)
+    size = Column(String, primary_key=True)  # thumb, detail
+    format = Column(String, primary_key=True)  # jpeg, webp
+    data = Column(LargeBinary, nullable=False)
+    length = Column(Integer, nullable=False)
+    media_type = Column(String, nullable=False)
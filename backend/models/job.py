@@ -0,0 +1,38 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, JSON
+from sqlalchemy.orm import relationship
+from backend.database import Base
+
+class Job(Base):
+    """Operazione lunga eseguita in background (es. aggiornamento metadati)."""
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    type = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="queued", index=True)  # queued, running, completed, failed
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)  # Utente che ha avviato il job
+    owner_id = Column(Integer, nullable=True)  # Libri dell'utente da aggiornare; None = solo libri con dati mancanti
+    total = Column(Integer, nullable=False, default=0)
+    processed = Column(Integer, nullable=False, default=0)
+    updated = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    message = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+
+    items = relationship("JobItem", back_populates="job", order_by="JobItem.id")
+
+class JobItem(Base):
+    """Esito dell'elaborazione di un singolo libro all'interno di un job."""
+    __tablename__ = "job_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, ForeignKey("jobs.id"), nullable=False, index=True)
+    book_id = Column(Integer, nullable=False)
+    isbn = Column(String, nullable=True)  # Titolo e ISBN al momento dell'elaborazione, per il report
+    title = Column(String, nullable=True)
+    status = Column(String, nullable=False, default="pending")  # pending, updated, failed
+    updated_fields = Column(JSON, nullable=True)
+    reason = Column(String, nullable=True)
+
+    job = relationship("Job", back_populates="items")
@@ -1,9 +1,14 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from backend.database import Base
 
 class Loan(Base):
     __tablename__ = "loans"
+    __table_args__ = (
+        # Prestiti attivi di un libro / di un utente (return_date IS NULL OR > now)
+        Index("ix_loans_book_id_return_date", "book_id", "return_date"),
+        Index("ix_loans_user_id_return_date", "user_id", "return_date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     book_id = Column(Integer, ForeignKey("books.id"), nullable=False)
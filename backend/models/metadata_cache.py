@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
+from backend.database import Base
+
+class MetadataCacheEntry(Base):
+    """Metadati normalizzati di un ISBN recuperati dai provider esterni."""
+    __tablename__ = "metadata_cache"
+
+    isbn = Column(String, primary_key=True)  # ISBN normalizzato (senza trattini e spazi)
+    found = Column(Boolean, nullable=False, default=True)  # False: risultato negativo in cache
+    title = Column(String, nullable=True)
+    author = Column(String, nullable=True)
+    description = Column(String, nullable=True)
+    publisher = Column(String, nullable=True)
+    publish_year = Column(Integer, nullable=True)
+    cover_hash = Column(String(64), ForeignKey("covers.hash"), nullable=True)
+    provider = Column(String, nullable=True)
+    fetched_at = Column(DateTime, nullable=False)
+    last_accessed = Column(DateTime, nullable=False, index=True)  # Per l'eviction LRU
@@ -0,0 +1,121 @@
+# backend/query_budget.py
+import contextvars
+import logging
+import os
+import threading
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Modalità di debug/test delle query: con QUERY_DEBUG ogni richiesta HTTP
+# registra le proprie query e segnala quelle ripetute (tipico N+1); con
+# QUERY_BUDGET > 0 una richiesta che supera il budget fallisce.
+QUERY_BUDGET = int(os.environ.get("QUERY_BUDGET", "0"))
+QUERY_DEBUG = os.environ.get("QUERY_DEBUG", "").lower() in ("1", "true", "yes") or QUERY_BUDGET > 0
+# Numero di esecuzioni dello stesso statement oltre il quale viene segnalato
+QUERY_REPEAT_THRESHOLD = int(os.environ.get("QUERY_REPEAT_THRESHOLD", "3"))
+
+# Moduli ignorati nel cercare il punto del codice che ha eseguito la query
+_IGNORED_PATHS = (os.sep + "sqlalchemy" + os.sep, os.sep + "starlette" + os.sep, os.sep + "anyio" + os.sep, __file__)
+
+class QueryBudgetExceeded(RuntimeError):
+    """Sollevata quando un blocco esegue più query del budget consentito."""
+
+def _call_site():
+    """Primo frame dell'applicazione (non di SQLAlchemy) nello stack corrente."""
+    for frame in reversed(traceback.extract_stack()[:-2]):
+        if not any(part in frame.filename for part in _IGNORED_PATHS):
+            return f"{frame.filename}:{frame.lineno} in {frame.name}"
+    return "sconosciuto"
+
+class QueryTracker:
+    """Statement eseguiti in un blocco, con i punti del codice da cui partono."""
+
+    def __init__(self, budget=None, label=""):
+        self.budget = budget
+        self.label = label
+        self.count = 0
+        self.statements = Counter()
+        self.call_sites = {}
+        self._lock = threading.Lock()
+
+    def record(self, statement):
+        with self._lock:
+            self.count += 1
+            self.statements[statement] += 1
+            repeats = self.statements[statement]
+            # Il call site si cattura solo per gli statement ripetuti: estrarre
+            # lo stack ad ogni query costerebbe troppo
+            if repeats >= 2:
+                self.call_sites.setdefault(statement, Counter())[_call_site()] += 1
+            count = self.count
+        if self.budget and count > self.budget:
+            raise QueryBudgetExceeded(
+                f"{self.label or 'Blocco'}: {count} query, budget {self.budget}\n{self.report()}"
+            )
+
+    def repeated(self, threshold=QUERY_REPEAT_THRESHOLD):
+        """Statement eseguiti almeno threshold volte, dal più ripetuto."""
+        with self._lock:
+            return [(statement, count) for statement, count in self.statements.most_common() if count >= threshold]
+
+    def report(self, threshold=QUERY_REPEAT_THRESHOLD):
+        lines = []
+        for statement, count in self.repeated(threshold):
+            lines.append(f"  {count}x {' '.join(statement.split())[:200]}")
+            for site, site_count in self.call_sites.get(statement, Counter()).most_common(3):
+                lines.append(f"      {site_count}x da {site}")
+        return "\n".join(lines)
+
+_tracker = contextvars.ContextVar("query_tracker", default=None)
+
+def instrument_engine(engine):
+    """Registra le query dell'engine nel QueryTracker attivo, se presente."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _track_query(conn, cursor, statement, parameters, context, executemany):
+        tracker = _tracker.get()
+        if tracker is not None:
+            tracker.record(statement)
+
+    return engine
+
+@contextmanager
+def query_budget(max_queries=None, label=""):
+    """
+    Conta le query eseguite nel blocco with (anche dai thread del threadpool
+    avviati al suo interno) e segnala nel log gli statement ripetuti.
+
+    Se max_queries è indicato, la query che lo supera solleva
+    QueryBudgetExceeded; da usare nei test e negli script di verifica:
+
+        with query_budget(5, "GET /books/"):
+            client.get("/books/", headers=headers)
+    """
+    tracker = QueryTracker(budget=max_queries, label=label)
+    token = _tracker.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _tracker.reset(token)
+        report = tracker.report()
+        if report:
+            logger.warning(f"{label or 'Blocco'}: statement ripetuti ({tracker.count} query in totale)\n{report}")
+
+class QueryBudgetMiddleware:
+    """Middleware ASGI che applica query_budget(QUERY_BUDGET) ad ogni richiesta HTTP."""
+
+    def __init__(self, app, budget=QUERY_BUDGET):
+        self.app = app
+        self.budget = budget or None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with query_budget(self.budget, f"{scope['method']} {scope['path']}"):
+            await self.app(scope, receive, send)
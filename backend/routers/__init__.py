@@ -1,4 +1,6 @@
 from backend.routers.books import router as books_router
 from backend.routers.loans import router as loans_router
 from backend.routers.users import router as users_router
-from backend.routers.auth import router as auth_router
\ No newline at end of file
+from backend.routers.auth import router as auth_router
+from backend.routers.jobs import router as jobs_router
+from backend.routers.export import router as export_router
\ No newline at end of file
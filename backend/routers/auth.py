@@ -2,13 +2,14 @@ from datetime import datetime, timedelta
 from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 
 from backend import crud, models, schemas
 from backend.database import get_db
 from backend.security import (
-    get_password_hash, verify_password, create_access_token,
+    get_password_hash, get_password_hash_async, verify_password, create_access_token,
     ACCESS_TOKEN_EXPIRE_MINUTES, Token, TokenData
 )
 
@@ -21,9 +22,12 @@ async def login_for_access_token(
 ):
     """
     Endpoint per ottenere un token JWT tramite email e password.
+    
+    Le query girano nel threadpool e bcrypt nel pool di hashing: un picco
+    di login non blocca l'event loop per le altre richieste.
     """
     # Autentica l'utente
-    user = crud.user.authenticate_user(db, form_data.username, form_data.password)
+    user = await crud.user.authenticate_user_async(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -32,7 +36,7 @@ async def login_for_access_token(
         )
     
     # Aggiorna il timestamp dell'ultimo accesso
-    crud.user.update_last_login(db, user.id)
+    user = await run_in_threadpool(crud.user.update_last_login, db, user.id)
     
     # Crea il token di accesso
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -54,19 +58,27 @@ async def register_user(user: schemas.UserCreate, db: Session = Depends(get_db))
     Registra un nuovo utente.
     """
     # Verifica se l'email è già registrata
-    db_user = crud.user.get_user_by_email(db, email=user.email)
+    db_user = await run_in_threadpool(crud.user.get_user_by_email, db, user.email)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email già registrata"
         )
     
-    # Crea il nuovo utente
-    return crud.user.create_user(db=db, user=user)
+    # Crea il nuovo utente, con l'hash calcolato fuori dall'event loop
+    hashed_password = await get_password_hash_async(user.password) if user.password else None
+    return await run_in_threadpool(crud.user.create_user, db, user, hashed_password)
 
 @router.get("/me", response_model=schemas.User)
 async def read_users_me(current_user: models.User = Depends(crud.user.get_current_user)):
     """
     Restituisce i dati dell'utente attualmente autenticato.
     """
-    return current_user
\ No newline at end of file
+    return current_user
+
+@router.get("/principal-cache/stats")
+async def read_principal_cache_stats(current_user: models.User = Depends(crud.user.get_current_user)):
+    """
+    Statistiche della cache degli utenti autenticati.
+    """
+    return crud.user.get_principal_cache_stats()
@@ -1,19 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, Response, status, File, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status, File, UploadFile
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from backend import crud, models, schemas
-from backend.database import get_db
+from backend.database import get_db, SessionLocal
+from backend.services.images import COVER_SIZES, build_sprite
+from backend.services.jobs import enqueue_job
 from sqlalchemy import or_
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Literal, Optional
 from datetime import datetime
 from PIL import Image
 import io
+import json
+import struct
 
 router = APIRouter()
 
 @router.get("/", response_model=list[schemas.Book])
 def read_books(
+    response: Response,
     skip: int = 0, 
     limit: int = 100, 
+    after_id: Optional[int] = None,
     current_user: models.User = Depends(crud.user.get_current_user), 
     db: Session = Depends(get_db)
 ):
@@ -21,57 +28,20 @@ def read_books(
     Ottiene la lista dei libri visibili all'utente autenticato:
     - Libri di proprietà dell'utente
     - Libri presi in prestito dall'utente
-    """
-    # Query per recuperare i libri che appartengono all'utente o che ha in prestito
-    user_id = current_user.id
-     
-    # Debug
-    print(f"Fetching books for user ID: {user_id}")
-    
-    # 1. Libri di proprietà dell'utente (query esplicita)
-    owned_books = db.query(models.Book).filter(models.Book.owner_id == user_id).all()
-    print(f"Found {len(owned_books)} owned books")
-    
-    # 2. Libri presi in prestito (prestiti attivi) con query più robusta
-    now = datetime.now()
-    active_loans = db.query(models.Loan).filter(
-        models.Loan.user_id == user_id,
-        or_(
-            models.Loan.return_date.is_(None),  # Prestiti senza data di restituzione
-            models.Loan.return_date > now     # Prestiti con data futura
-        )
-    ).all()
-    
-    print(f"Found {len(active_loans)} active loans")
-    
-    # Recupera gli ID dei libri presi in prestito
-    borrowed_book_ids = [loan.book_id for loan in active_loans]
-    
-    # Recupera i libri corrispondenti (solo se ci sono prestiti)
-    borrowed_books = []
-    if borrowed_book_ids:
-        borrowed_books = db.query(models.Book).filter(models.Book.id.in_(borrowed_book_ids)).all()
-    
-    print(f"Found {len(borrowed_books)} borrowed books")
-    
-    # Unisci i due set di libri (proprietà + prestiti)
-    # Usiamo un dizionario per evitare duplicati
-    all_visible_books_dict = {book.id: book for book in owned_books}
-    for book in borrowed_books:
-        if book.id not in all_visible_books_dict:
-            all_visible_books_dict[book.id] = book
     
-    all_visible_books = list(all_visible_books_dict.values())
-    print(f"Total visible books: {len(all_visible_books)}")
+    I libri sono ordinati per ID. Per scorrere collezioni grandi usare after_id
+    (l'ID dell'ultimo libro ricevuto) invece di skip. Il numero totale di libri
+    visibili è restituito nell'header X-Total-Count.
+    """
+    books, total = crud.book.get_visible_books(
+        db, current_user.id, skip=skip, limit=limit, after_id=after_id
+    )
     
-    # Imposta il flag has_cover per ciascun libro
-    for book in all_visible_books:
-        setattr(book, "has_cover", book.cover_image is not None)
+    response.headers["X-Total-Count"] = str(total)
+    if books and len(books) == limit:
+        response.headers["X-Next-After-Id"] = str(books[-1].id)
     
-    # Implementa paginazione
-    start = skip
-    end = skip + limit if limit and skip + limit < len(all_visible_books) else len(all_visible_books)
-    return all_visible_books[start:end]
+    return crud.loan.attach_active_loans(db, books)
 
 @router.post("/", response_model=schemas.Book)
 def create_book(book: schemas.BookCreate, current_user: models.User = Depends(crud.user.get_current_user), db: Session = Depends(get_db)):
@@ -89,21 +59,140 @@ def create_book(book: schemas.BookCreate, current_user: models.User = Depends(cr
     # Continua con la logica esistente
     return crud.book.create_book(db=db, book=updated_book)
 
+@router.post("/import")
+def import_books(payload: schemas.BookImport, current_user: models.User = Depends(crud.user.get_current_user)):
+    """
+    Importa una lista di ISBN nella libreria dell'utente autenticato.
+    
+    La risposta è uno stream NDJSON: una riga per ISBN man mano che viene
+    elaborato ({"type": "result", "isbn", "status": created|duplicate|failed, ...})
+    e una riga finale di riepilogo ({"type": "summary", ...}).
+    """
+    owner_id = current_user.id
+    
+    def generate():
+        # Sessione propria: lo stream continua dopo la chiusura di quella della richiesta
+        db = SessionLocal()
+        try:
+            for result in crud.book.import_books(db, owner_id, payload.isbns):
+                yield json.dumps(result) + "\n"
+        finally:
+            db.close()
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
 @router.delete("/{book_id}", response_model=schemas.BookDelete)
 def delete_book(book_id: int, db: Session = Depends(get_db)):
     deleted_book = crud.book.delete_book(db=db, book_id=book_id)
     return schemas.BookDelete(message="Book deleted successfully", book=deleted_book["book"])
 
 @router.get("/{book_id}/cover", response_class=Response)
-def get_book_cover(book_id: int, db: Session = Depends(get_db)):
-    """Ottieni la copertina del libro"""
-    db_book = db.query(models.Book).filter(models.Book.id == book_id).first()
+def get_book_cover(
+    book_id: int,
+    request: Request,
+    size: Literal["thumb", "detail"] = "detail",
+    format: Literal["jpeg", "webp"] = "jpeg",
+    v: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Ottieni la copertina del libro nella dimensione e nel formato richiesti.
+    
+    La risposta ha un ETag forte e supporta If-None-Match (304). Se v coincide
+    con il cover_hash del libro l'URL identifica un contenuto che non cambia
+    più e la risposta è cacheabile come immutable; senza v il client deve
+    rivalidare ad ogni uso.
+    """
+    db_book = db.query(models.Book.cover_hash).filter(models.Book.id == book_id).first()
     if not db_book:
         raise HTTPException(status_code=404, detail="Libro non trovato")
-    if not db_book.cover_image:
+    if not db_book.cover_hash:
+        raise HTTPException(status_code=404, detail="Nessuna copertina disponibile")
+    
+    cache_control = "public, max-age=31536000, immutable" if v == db_book.cover_hash else "no-cache"
+    if_none_match = request.headers.get("if-none-match")
+    
+    def not_modified(etag):
+        return bool(if_none_match) and (
+            if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
+        )
+    
+    # Richiesta condizionale: se la variante è già salvata non serve leggere l'immagine
+    etag = crud.cover.stored_cover_etag(db, db_book.cover_hash, size, format)
+    if etag and not_modified(etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+    
+    cover = crud.cover.get_cover_variant(db, db_book.cover_hash, size, format)
+    if not cover:
         raise HTTPException(status_code=404, detail="Nessuna copertina disponibile")
     
-    return Response(content=db_book.cover_image, media_type="image/jpeg")
+    # ETag e Content-Type della rappresentazione servita (l'originale se la variante non è disponibile)
+    headers = {"ETag": crud.cover.served_cover_etag(cover), "Cache-Control": cache_control}
+    if not_modified(headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cover.data, media_type=cover.media_type, headers=headers)
+
+def _encode_cover_bundle(index: Dict[str, Any], blobs: List[bytes]) -> bytes:
+    """Bundle binario: lunghezza dell'indice (4 byte big-endian), indice JSON, immagini concatenate."""
+    header = json.dumps(index).encode("utf-8")
+    return struct.pack(">I", len(header)) + header + b"".join(blobs)
+
+@router.post("/covers:batch", response_class=Response)
+def get_book_covers_batch(request: schemas.CoverBatch, db: Session = Depends(get_db)):
+    """
+    Ottieni le copertine di più libri con una sola richiesta.
+    
+    La risposta (application/x-cover-bundle) è composta da 4 byte con la
+    lunghezza dell'indice JSON, l'indice e le immagini concatenate.
+    
+    - mode=bundle: l'indice elenca per libro cover_hash, etag, media_type,
+      offset e length dell'immagine, relativi all'inizio delle immagini.
+      Copertine condivise tra più libri sono incluse una sola volta.
+    - mode=sprite: le immagini sono composte in un unico sprite JPEG e
+      l'indice riporta per libro la posizione (x, y, width, height).
+    
+    I libri senza copertina sono elencati in "missing".
+    """
+    covers = crud.cover.get_book_cover_variants(db, request.ids, request.size, request.format)
+    missing = [book_id for book_id in request.ids if book_id not in covers]
+    
+    if request.mode == "sprite":
+        images = [(book_id, covers[book_id][1].data) for book_id in request.ids if book_id in covers]
+        sprite, (width, height), placements = build_sprite(images, COVER_SIZES[request.size])
+        index = {
+            "mode": "sprite",
+            "sprite": {"media_type": "image/jpeg", "width": width, "height": height, "length": len(sprite)},
+            "covers": [
+                {"book_id": book_id, "cover_hash": covers[book_id][0], "x": x, "y": y, "width": w, "height": h}
+                for book_id, x, y, w, h in placements
+            ],
+            "missing": missing,
+        }
+        return Response(content=_encode_cover_bundle(index, [sprite]), media_type="application/x-cover-bundle")
+    
+    blobs = []
+    offsets = {}
+    entries = []
+    position = 0
+    for book_id in request.ids:
+        if book_id not in covers:
+            continue
+        cover_hash, cover = covers[book_id]
+        if cover_hash not in offsets:
+            offsets[cover_hash] = position
+            blobs.append(cover.data)
+            position += len(cover.data)
+        entries.append({
+            "book_id": book_id,
+            "cover_hash": cover_hash,
+            "etag": crud.cover.served_cover_etag(cover),
+            "media_type": cover.media_type,
+            "offset": offsets[cover_hash],
+            "length": len(cover.data),
+        })
+    
+    index = {"mode": "bundle", "covers": entries, "missing": missing}
+    return Response(content=_encode_cover_bundle(index, blobs), media_type="application/x-cover-bundle")
 
 @router.post("/{book_id}/cover", status_code=200)
 def upload_book_cover(
@@ -148,8 +237,11 @@ def upload_book_cover(
             img.save(buffer, format="JPEG", quality=quality, optimize=True)
             compressed_image = buffer.getvalue()
             
-            # Aggiorna la copertina nel database
-            book.cover_image = compressed_image
+            # Aggiorna la copertina nel database, eliminando la precedente se non più usata
+            old_cover_hash = book.cover_hash
+            book.cover_hash = crud.cover.store_cover(db, compressed_image)
+            db.flush()
+            crud.cover.release_covers(db, [old_cover_hash])
             db.commit()
             
             return {"message": "Copertina caricata con successo"}
@@ -161,27 +253,33 @@ def upload_book_cover(
 @router.get("/{book_id}", response_model=schemas.Book)
 def read_book(book_id: int, db: Session = Depends(get_db)):
     """Ottieni un singolo libro tramite ID"""
-    db_book = db.query(models.Book).filter(models.Book.id == book_id).first()
+    db_book = crud.book.get_book(db, book_id)
     if not db_book:
         raise HTTPException(status_code=404, detail="Libro non trovato")
     
-    # Imposta il flag has_cover
-    setattr(db_book, "has_cover", db_book.cover_image is not None)
-    
-    return db_book
+    return crud.loan.attach_active_loans(db, db_book)
+
+@router.get("/{book_id}/loan-status", response_model=schemas.BookLoanStatus)
+def read_book_loan_status(book_id: int, db: Session = Depends(get_db)):
+    """Stato di prestito di un libro, per aggiornarlo senza ricaricare il libro."""
+    return crud.loan.get_book_loan_status(db, book_id)
 
 @router.put("/{book_id}", response_model=schemas.Book)
 def update_book(book_id: int, book: schemas.BookUpdate, db: Session = Depends(get_db)):
-    return crud.book.update_book(db=db, book_id=book_id, book=book)
+    db_book = crud.book.update_book(db=db, book_id=book_id, book=book)
+    return crud.loan.attach_active_loans(db, db_book)
 
-@router.post("/refresh-metadata", status_code=200)
+@router.post("/refresh-metadata", response_model=schemas.Job, status_code=202)
 def refresh_book_metadata(
     current_user: models.User = Depends(crud.user.get_current_user),
     only_missing: bool = False,
     db: Session = Depends(get_db)
 ):
     """
-    Endpoint per aggiornare i metadati dei libri.
+    Avvia in background l'aggiornamento dei metadati dei libri.
+    
+    Restituisce subito il job creato: il progresso e gli esiti per libro
+    si ottengono da GET /jobs/{job_id}.
     
     Args:
         only_missing: Se True, aggiorna solo i libri con informazioni mancanti,
@@ -190,9 +288,18 @@ def refresh_book_metadata(
     # Se only_missing è True, non passiamo l'owner_id per filtrare solo libri con info mancanti
     owner_id = None if only_missing else current_user.id
     
-    # Esegui l'aggiornamento dei metadati
-    result = crud.book.refresh_missing_book_metadata(db, owner_id=owner_id)
-    return result
+    job = crud.job.create_refresh_metadata_job(db, user_id=current_user.id, owner_id=owner_id)
+    if job.status == "queued":
+        enqueue_job(job.id)
+    return job
+
+@router.get("/metadata-cache/stats", status_code=200)
+def read_metadata_cache_stats(
+    current_user: models.User = Depends(crud.user.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Statistiche della cache dei metadati ISBN (hit, miss, voci salvate)."""
+    return crud.metadata_cache.get_cache_stats(db)
 
 @router.get("/search/", response_model=list[schemas.Book])
 def search_books(
@@ -225,11 +332,7 @@ def search_books(
         filter_year=filter_year
     )
     
-    # Aggiungi flag per la copertina
-    for book in books:
-        setattr(book, "has_cover", book.cover_image is not None)
-    
-    return books
+    return crud.loan.attach_active_loans(db, books)
 
 @router.post("/bulk-update", status_code=200)
 def bulk_update_books(
@@ -257,6 +360,26 @@ def bulk_update_books(
     result = crud.book.bulk_update_books(db, book_ids, updates, current_user.id)
     return result
 
+@router.patch("/bulk", status_code=200)
+def patch_books(
+    patch: schemas.BookPatch,
+    current_user: models.User = Depends(crud.user.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Aggiorna più libri con modifiche diverse per ognuno.
+    
+    Il corpo contiene changes: {book_id: {campo: valore}} con solo i campi
+    cambiati (title, author, description, publisher, publish_year). La
+    risposta riporta l'esito di ogni libro: updated, unchanged, not_found
+    o not_owned.
+    """
+    changes = {
+        book_id: fields.model_dump(exclude_unset=True)
+        for book_id, fields in patch.changes.items()
+    }
+    return crud.book.patch_books(db, changes, current_user.id)
+
 @router.post("/bulk-delete", status_code=200)
 def bulk_delete_books(
     delete_data: dict,
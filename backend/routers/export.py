@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from datetime import datetime
+from backend import crud, models
+from backend.database import SessionLocal
+from backend.services.export import stream_export_zip
+
+router = APIRouter()
+
+@router.get("/", response_class=StreamingResponse)
+def export_data(owned_only: bool = False, current_user: models.User = Depends(crud.user.get_current_user)):
+    """
+    Esporta i dati della biblioteca in un archivio ZIP, generato in streaming.
+    
+    L'archivio contiene libri.csv, utenti.csv, prestiti.csv, le copertine
+    (covers/) e un README. Con owned_only=True include solo i libri di
+    proprietà dell'utente e i relativi prestiti, altrimenti tutti i libri
+    visibili all'utente.
+    """
+    user_id = current_user.id
+    
+    def generate():
+        # Sessione propria: lo stream continua dopo la chiusura di quella della richiesta
+        db = SessionLocal()
+        try:
+            yield from stream_export_zip(db, user_id, owned_only=owned_only)
+        finally:
+            db.close()
+    
+    filename = f"{'miei_libri' if owned_only else 'biblioteca'}_export_{datetime.now():%Y%m%d}.zip"
+    return StreamingResponse(
+        generate(),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from backend import crud, models, schemas
+from backend.database import get_db
+
+router = APIRouter()
+
+@router.get("/{job_id}", response_model=schemas.JobDetail)
+def read_job(
+    job_id: int,
+    current_user: models.User = Depends(crud.user.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Restituisce lo stato di un job in background: contatori di progresso
+    ed esito per ciascun libro elaborato.
+    """
+    return crud.job.get_job(db, job_id, user_id=current_user.id, is_admin=current_user.role == "admin")
@@ -1,5 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
+from typing import Literal, Optional
+from datetime import date
 from backend import crud, models, schemas
 from backend.database import get_db
 
@@ -10,6 +12,37 @@ def read_loans(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
     loans = crud.loan.get_loans(db, skip=skip, limit=limit)
     return loans
 
+@router.get("/ledger", response_model=list[schemas.LoanLedgerEntry])
+def read_loan_ledger(
+    response: Response,
+    role: Literal["all", "lender", "borrower"] = "all",
+    status: Literal["all", "active", "returned"] = "all",
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    before_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=500),
+    current_user: models.User = Depends(crud.user.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Registro dei prestiti dell'utente autenticato, con titolo del libro e
+    nome dell'altro utente già risolti.
+
+    - role: lender (miei libri prestati), borrower (libri presi in prestito) o all
+    - status: active (in corso), returned (restituiti) o all
+    - date_from / date_to: intervallo della data di prestito
+
+    I prestiti sono ordinati dal più recente. Per la pagina successiva passare
+    come before_id il valore dell'header X-Next-Before-Id.
+    """
+    entries = crud.loan.get_loan_ledger(
+        db, current_user.id, role=role, status=status,
+        date_from=date_from, date_to=date_to, before_id=before_id, limit=limit
+    )
+    if len(entries) == limit:
+        response.headers["X-Next-Before-Id"] = str(entries[-1]["id"])
+    return entries
+
 @router.post("/", response_model=schemas.Loan)
 def create_loan(loan: schemas.LoanCreate, db: Session = Depends(get_db)):
     return crud.loan.create_loan(db=db, loan=loan)
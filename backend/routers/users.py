@@ -1,5 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
+from typing import Optional
 from backend import crud, models, schemas
 from backend.database import get_db
 
@@ -10,6 +11,26 @@ def read_users(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
     users = crud.user.get_users(db, skip=skip, limit=limit)
     return users
 
+@router.get("/summary", response_model=list[schemas.UserSummary])
+def read_users_summary(
+    response: Response,
+    after_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=500),
+    current_user: models.User = Depends(crud.user.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Utenti con il numero di prestiti attivi, in ritardo e totali e i titoli
+    dei libri che hanno attualmente in prestito.
+
+    Gli utenti sono ordinati per ID; per la pagina successiva passare come
+    after_id il valore dell'header X-Next-After-Id.
+    """
+    summaries = crud.user.get_users_summary(db, after_id=after_id, limit=limit)
+    if len(summaries) == limit:
+        response.headers["X-Next-After-Id"] = str(summaries[-1]["id"])
+    return summaries
+
 @router.post("/", response_model=schemas.User)
 def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     return crud.user.create_user(db=db, user=user)
@@ -1,3 +1,4 @@
-from backend.schemas.book import Book, BookCreate, BookUpdate, BookDelete
-from backend.schemas.loan import Loan, LoanCreate, LoanUpdate, LoanDelete
-from backend.schemas.user import User, UserCreate, UserUpdate, UserDelete, Token
\ No newline at end of file
+from backend.schemas.book import Book, BookCreate, BookUpdate, BookDelete, BookImport, CoverBatch, ActiveLoan, BookLoanStatus, BookPatch
+from backend.schemas.loan import Loan, LoanCreate, LoanUpdate, LoanDelete, LoanLedgerEntry
+from backend.schemas.job import Job, JobDetail, JobItem
+from backend.schemas.user import User, UserCreate, UserUpdate, UserDelete, UserSummary, Token
\ No newline at end of file
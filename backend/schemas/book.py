@@ -1,4 +1,6 @@
-from pydantic import BaseModel
+from datetime import datetime
+from typing import Literal
+from pydantic import BaseModel, Field, field_validator
 
 class BookBase(BaseModel):
     title: str | None = None
@@ -16,13 +18,59 @@ class BookCreate(BookBase):
 class BookUpdate(BookBase):
     pass
 
+class ActiveLoan(BaseModel):
+    """Prestito in corso di un libro, incluso nelle risposte dei libri."""
+    id: int
+    user_id: int
+    borrower_name: str | None = None
+    loan_date: datetime
+    return_date: datetime | None = None  # Restituzione prevista
+
 class Book(BookBase):
     id: int
     has_cover: bool = False  # Flag per indicare se il libro ha una copertina
+    cover_hash: str | None = None  # Versione della copertina, da passare come ?v= all'URL della copertina
+    rank: float | None = None  # Rilevanza nella ricerca full-text (più basso = più rilevante)
+    active_loan: ActiveLoan | None = None  # None se il libro è disponibile
 
     class Config:
         from_attributes = True
 
 class BookDelete(BaseModel):
     message: str
-    book: Book
\ No newline at end of file
+    book: Book
+class BookPatchFields(BaseModel):
+    """Campi modificati di un libro: solo quelli presenti vengono aggiornati."""
+    title: str | None = None
+    author: str | None = None
+    description: str | None = None
+    publisher: str | None = None
+    publish_year: int | None = None
+
+    @field_validator("title", "author")
+    @classmethod
+    def not_null(cls, value):
+        # Omessi restano invariati, ma non si possono cancellare
+        if value is None:
+            raise ValueError("Il campo non può essere nullo")
+        return value
+
+    class Config:
+        extra = "forbid"
+
+class BookPatch(BaseModel):
+    changes: dict[int, BookPatchFields] = Field(min_length=1, max_length=5000)
+
+class BookLoanStatus(BaseModel):
+    book_id: int
+    available: bool
+    active_loan: ActiveLoan | None = None
+
+class BookImport(BaseModel):
+    isbns: list[str] = Field(min_length=1, max_length=2000)
+
+class CoverBatch(BaseModel):
+    ids: list[int] = Field(min_length=1, max_length=200)
+    size: Literal["thumb", "detail"] = "thumb"
+    format: Literal["jpeg", "webp"] = "jpeg"
+    mode: Literal["bundle", "sprite"] = "bundle"
@@ -0,0 +1,35 @@
+from pydantic import BaseModel
+from datetime import datetime
+
+class JobItem(BaseModel):
+    """Esito dell'elaborazione di un singolo libro."""
+    book_id: int
+    isbn: str | None = None
+    title: str | None = None
+    status: str
+    updated_fields: list[str] | None = None
+    reason: str | None = None
+
+    class Config:
+        from_attributes = True
+
+class Job(BaseModel):
+    """Stato e progresso di un job in background."""
+    id: int
+    type: str
+    status: str
+    total: int
+    processed: int
+    updated: int
+    failed: int
+    message: str | None = None
+    created_at: datetime
+    updated_at: datetime
+    finished_at: datetime | None = None
+
+    class Config:
+        from_attributes = True
+
+class JobDetail(Job):
+    """Job con gli esiti per libro."""
+    items: list[JobItem] = []
@@ -1,3 +1,4 @@
+from typing import Literal
 from pydantic import BaseModel, Field
 from datetime import datetime, timedelta, timezone
 
@@ -21,4 +22,19 @@ class Loan(LoanBase):
 
 class LoanDelete(BaseModel):
     message: str
-    loan: Loan
\ No newline at end of file
+    loan: Loan
+
+class LoanLedgerEntry(BaseModel):
+    id: int
+    book_id: int
+    user_id: int
+    loan_date: datetime
+    return_date: datetime | None = None
+    book_title: str | None = None
+    book_author: str | None = None
+    owner_id: int | None = None
+    owner_name: str | None = None
+    borrower_name: str | None = None
+    counterparty_name: str | None = None  # L'altro utente del prestito rispetto a chi chiede
+    role: Literal["lender", "borrower"]
+    status: Literal["active", "returned"]
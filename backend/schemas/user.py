@@ -34,6 +34,19 @@ class User(UserBase):
     class Config:
         from_attributes = True
 
+class UserSummary(BaseModel):
+    """Utente con il riepilogo dei suoi prestiti (pagina di gestione utenti)."""
+    id: int
+    name: str
+    email: str
+    role: str | None = "user"
+    is_active: bool | None = True
+    last_login: Optional[datetime] = None
+    total_loans: int = 0
+    active_loans: int = 0
+    overdue_loans: int = 0  # Prestiti attivi senza data di restituzione oltre la durata standard
+    active_loan_titles: list[str] = []
+
 class UserDelete(BaseModel):
     message: str
     user: User
@@ -1,3 +1,6 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 
@@ -12,7 +15,18 @@ SECRET_KEY = "09d25e094faa6ca2556c818166b7a9563b93f7099f6f0f4caa6cf63b88e8d3e7"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 1 giorno
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Costo di bcrypt (2^rounds iterazioni): ogni punto in più raddoppia il tempo di hashing
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+
+# Hashing delle password in un pool dedicato e limitato, fuori dall'event loop:
+# bcrypt rilascia il GIL, quindi i thread lavorano davvero in parallelo
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Operazioni di hashing ammesse in coda o in esecuzione; le altre attendono senza bloccare il loop
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get("PASSWORD_HASH_MAX_PENDING", str(PASSWORD_HASH_WORKERS * 8)))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_hash_slots = asyncio.Semaphore(PASSWORD_HASH_MAX_PENDING)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
 # Modelli per l'autenticazione
@@ -33,6 +47,18 @@ def get_password_hash(password):
     """Genera hash della password."""
     return pwd_context.hash(password)
 
+async def _run_hashing(fn, *args):
+    async with _hash_slots:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, fn, *args)
+
+async def verify_password_async(plain_password, hashed_password):
+    """Come verify_password, ma eseguita nel pool di hashing senza bloccare l'event loop."""
+    return await _run_hashing(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    """Come get_password_hash, ma eseguita nel pool di hashing senza bloccare l'event loop."""
+    return await _run_hashing(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Crea un nuovo token JWT."""
     to_encode = data.copy()
@@ -42,7 +68,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         
-    to_encode.update({"exp": expire})
+    # iat distingue i token emessi per lo stesso utente
+    to_encode.update({"exp": expire, "iat": datetime.utcnow()})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -0,0 +1,166 @@
+# backend/services/export.py
+import csv
+import io
+import zipfile
+from datetime import datetime
+from typing import Iterator
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session, aliased
+
+from backend.crud.book import visible_book_ids
+from backend.models.book import Book
+from backend.models.cover import Cover
+from backend.models.loan import Loan
+from backend.models.user import User
+
+# Righe lette dal database per volta e byte accumulati prima di inviarli al client
+EXPORT_YIELD_PER = 500
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+BOOK_COLUMNS = ["id", "title", "author", "description", "isbn", "publisher", "publish_year",
+                "owner_id", "has_cover", "owner_name", "cover_path"]
+USER_COLUMNS = ["id", "name", "email", "role", "last_login", "is_active", "created_at"]
+LOAN_COLUMNS = ["id", "book_id", "user_id", "loan_date", "return_date", "book_title", "user_name"]
+
+class _ZipStream(io.RawIOBase):
+    """
+    Destinazione non posizionabile per zipfile: accumula i byte scritti
+    finché il generatore non li preleva con drain().
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._size += len(data)
+        return len(data)
+
+    def pending(self):
+        return self._size
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        self._size = 0
+        return data
+
+def _cover_path(book_id):
+    return f"covers/book_{book_id}.jpg"
+
+def _format_date(value, missing=""):
+    return value.strftime("%Y-%m-%d") if value else missing
+
+def _book_ids_query(user_id: int, owned_only: bool):
+    """Select degli ID dei libri da esportare."""
+    if owned_only:
+        return select(Book.id).where(Book.owner_id == user_id)
+    return visible_book_ids(user_id)
+
+def _write_csv(zip_file, stream, name, columns, rows):
+    """Scrive un CSV nello ZIP riga per riga, restituendo i byte pronti man mano."""
+    with zip_file.open(name, "w") as entry:
+        text = io.TextIOWrapper(entry, encoding="utf-8", newline="")
+        writer = csv.writer(text)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(row)
+            if stream.pending() >= EXPORT_CHUNK_SIZE:
+                text.flush()
+                yield stream.drain()
+        text.flush()
+        text.detach()
+
+def _book_rows(db: Session, book_ids):
+    owner = aliased(User)
+    query = db.query(
+        Book.id, Book.title, Book.author, Book.description, Book.isbn, Book.publisher,
+        Book.publish_year, Book.owner_id, Book.cover_hash, owner.name,
+    ).outerjoin(owner, owner.id == Book.owner_id).filter(Book.id.in_(book_ids)).order_by(Book.id)
+
+    for row in query.yield_per(EXPORT_YIELD_PER):
+        has_cover = row.cover_hash is not None
+        yield [
+            row.id, row.title, row.author, row.description, row.isbn, row.publisher, row.publish_year,
+            row.owner_id, "Sì" if has_cover else "No",
+            row.name or ("Sconosciuto" if row.owner_id else "Nessuno"),
+            _cover_path(row.id) if has_cover else "Nessuna copertina",
+        ]
+
+def _user_rows(db: Session):
+    query = db.query(
+        User.id, User.name, User.email, User.role, User.last_login, User.is_active, User.created_at
+    ).order_by(User.id)
+    for row in query.yield_per(EXPORT_YIELD_PER):
+        yield list(row)
+
+def _loan_rows(db: Session, book_ids):
+    borrower = aliased(User)
+    query = db.query(
+        Loan.id, Loan.book_id, Loan.user_id, Loan.loan_date, Loan.return_date, Book.title, borrower.name,
+    ).outerjoin(Book, Book.id == Loan.book_id).outerjoin(
+        borrower, borrower.id == Loan.user_id
+    ).filter(Loan.book_id.in_(book_ids)).order_by(Loan.id)
+
+    for row in query.yield_per(EXPORT_YIELD_PER):
+        yield [
+            row.id, row.book_id, row.user_id,
+            _format_date(row.loan_date), _format_date(row.return_date, "Non restituito"),
+            row.title or "Libro sconosciuto", row.name or "Utente sconosciuto",
+        ]
+
+def _readme(owned_only: bool):
+    tipo_export = "dei tuoi libri" if owned_only else "della biblioteca completa"
+    return f"""# Export Biblioteca
+Questo archivio contiene i dati esportati {tipo_export}.
+
+## File inclusi:
+- libri.csv: L'elenco {'dei tuoi libri' if owned_only else 'completo dei libri nella biblioteca'}
+- utenti.csv: L'elenco degli utenti registrati
+- prestiti.csv: Lo storico dei prestiti {'relativi ai tuoi libri' if owned_only else 'dei libri esportati'}
+- covers/: Cartella contenente le copertine dei libri (quando disponibili)
+
+Esportato il: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+"""
+
+def stream_export_zip(db: Session, user_id: int, owned_only: bool = False) -> Iterator[bytes]:
+    """
+    Genera l'archivio ZIP dell'esportazione a pezzi, direttamente dal database.
+
+    Le righe sono lette a blocchi (yield_per) e scritte nei CSV una alla volta;
+    le copertine sono copiate dallo store così come sono salvate (senza
+    ricompressione). La memoria usata non dipende dalla dimensione della
+    biblioteca.
+
+    Args:
+        db: Session del database (usata solo da questo generatore)
+        user_id: Utente che esporta
+        owned_only: Se True, solo i libri di proprietà dell'utente e i loro prestiti
+    """
+    book_ids = _book_ids_query(user_id, owned_only)
+    stream = _ZipStream()
+
+    with zipfile.ZipFile(stream, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        yield from _write_csv(zip_file, stream, "libri.csv", BOOK_COLUMNS, _book_rows(db, book_ids))
+        yield from _write_csv(zip_file, stream, "utenti.csv", USER_COLUMNS, _user_rows(db))
+        yield from _write_csv(zip_file, stream, "prestiti.csv", LOAN_COLUMNS, _loan_rows(db, book_ids))
+
+        # Le copertine sono già JPEG compressi: vengono salvate senza deflate
+        covers = db.query(Book.id, Cover.data).join(Cover, Cover.hash == Book.cover_hash).filter(
+            Book.id.in_(book_ids)
+        ).order_by(Book.id)
+        for book_id, data in covers.yield_per(50):
+            info = zipfile.ZipInfo(_cover_path(book_id), date_time=datetime.now().timetuple()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            zip_file.writestr(info, data)
+            if stream.pending() >= EXPORT_CHUNK_SIZE:
+                yield stream.drain()
+
+        zip_file.writestr("README.txt", _readme(owned_only))
+
+    yield stream.drain()
@@ -1,19 +1,153 @@
 # backend/services/google_books.py
-import requests
+import asyncio
+import concurrent.futures
 import io
-from PIL import Image
-import time
 import logging
+import os
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+import httpx
+from PIL import Image
+
+from backend.metrics import IMAGE_PROCESSING_DURATION, METADATA_PROVIDER_DURATION
+from backend.services import openlibrary_dump
 
 # Configurazione logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def download_and_compress_image(url, max_size=(300, 300), quality=75):
-    """Scarica, ridimensiona e comprimi l'immagine"""
+# Indirizzi dei provider di metadati (configurabili per i test e i benchmark,
+# vedi benchmarks/stub_providers.py)
+GOOGLE_BOOKS_API_URL = os.environ.get("GOOGLE_BOOKS_API_URL", "https://www.googleapis.com").rstrip("/")
+OPEN_LIBRARY_URL = os.environ.get("OPEN_LIBRARY_URL", "https://openlibrary.org").rstrip("/")
+
+# Connessioni HTTP condivise tra tutte le richieste di metadati
+MAX_CONNECTIONS = int(os.environ.get("METADATA_HTTP_MAX_CONNECTIONS", "10"))
+REQUEST_TIMEOUT = float(os.environ.get("METADATA_HTTP_TIMEOUT", "10"))
+
+# Intervallo minimo (secondi) tra due richieste allo stesso host, al posto delle pause fisse
+HOST_MIN_INTERVALS = {
+    "www.googleapis.com": 0.1,
+    "openlibrary.org": 1.0,
+    "covers.openlibrary.org": 0.2,
+}
+DEFAULT_MIN_INTERVAL = 0.0
+
+# Provider restituito da _fetch_book_metadata quando nessun provider ha trovato
+# l'ISBN ma almeno uno ha fallito: l'esito è sconosciuto e non va messo in cache
+PROVIDER_ERROR = "error"
+
+class ProviderError(Exception):
+    """Errore transitorio di un provider (timeout, connessione, risposta 5xx o 429)."""
+
+def _check_response(response, provider):
+    """
+    True se la risposta è valida, False se il provider non ha il libro;
+    solleva ProviderError per gli errori transitori.
+    """
+    if response.status_code == 429 or response.status_code >= 500:
+        raise ProviderError(f"{provider}: status code {response.status_code}")
+    if response.status_code != 200:
+        logger.warning(f"{provider} API error: status code {response.status_code}")
+        return False
+    return True
+
+class HostRateLimiter:
+    """Distanzia le richieste verso lo stesso host secondo HOST_MIN_INTERVALS."""
+
+    def __init__(self, intervals, default_interval=0.0):
+        self.intervals = intervals
+        self.default_interval = default_interval
+        self._next_slot = {}
+        self._locks = {}
+
+    async def wait(self, host):
+        interval = self.intervals.get(host, self.default_interval)
+        if interval <= 0:
+            return
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+# Event loop dedicato in un thread di background: ospita il client HTTP condiviso
+# (keep-alive) e permette di usare il fetcher anche dal codice sincrono.
+_loop = None
+_loop_lock = threading.Lock()
+_client = None
+_rate_limiter = None
+
+def _get_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=_loop.run_forever, name="metadata-fetcher", daemon=True)
+            thread.start()
+        return _loop
+
+def _get_client():
+    """Client HTTP condiviso; da usare solo all'interno del loop del fetcher."""
+    global _client, _rate_limiter
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=REQUEST_TIMEOUT,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS),
+        )
+        _rate_limiter = HostRateLimiter(HOST_MIN_INTERVALS, DEFAULT_MIN_INTERVAL)
+    return _client
+
+def submit(coro):
+    """Esegue una coroutine nel loop del fetcher e restituisce un concurrent.futures.Future."""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop())
+
+def run_sync(coro):
+    """Esegue una coroutine nel loop del fetcher attendendo il risultato."""
+    return submit(coro).result()
+
+async def _get(url, timeout=None):
+    client = _get_client()
+    await _rate_limiter.wait(urlsplit(url).hostname)
+    return await client.get(url, timeout=timeout or REQUEST_TIMEOUT)
+
+def compress_image(data, max_size=(300, 300), quality=75):
+    """Ridimensiona e comprimi un'immagine in JPEG"""
+    with IMAGE_PROCESSING_DURATION.time(operation="compress_cover"):
+        return _compress_image(data, max_size, quality)
+
+def _compress_image(data, max_size, quality):
+    img = Image.open(io.BytesIO(data))
+
+    # Converti in RGB se necessario
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+
+    # Stampa dimensione originale
+    logger.info(f"Original image size: {img.size}")
+
+    # Ridimensiona mantenendo proporzioni
+    img.thumbnail(max_size)
+    logger.info(f"Resized to: {img.size}")
+
+    # Comprimi l'immagine
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=quality, optimize=True)
+    result = buffer.getvalue()
+    logger.info(f"Compressed image size: {len(result)} bytes")
+
+    return result
+
+async def _download_and_compress_image(url, max_size=(300, 300), quality=75):
     try:
         logger.info(f"Downloading image from: {url}")
-        response = requests.get(url, timeout=10)
+        response = await _timed_provider("cover_download", _get(url), lambda r: r.status_code == 200)
         if response.status_code != 200:
             logger.warning(f"Failed to download image: status code {response.status_code}")
             return None
@@ -23,65 +157,165 @@ def download_and_compress_image(url, max_size=(300, 300), quality=75):
             logger.warning(f"Response is not an image: {content_type}")
             return None
             
-        img = Image.open(io.BytesIO(response.content))
-        
-        # Converti in RGB se necessario
-        if img.mode != "RGB":
-            img = img.convert("RGB")
-        
-        # Stampa dimensione originale
-        logger.info(f"Original image size: {img.size}")
-        
-        # Ridimensiona mantenendo proporzioni
-        img.thumbnail(max_size)
-        logger.info(f"Resized to: {img.size}")
-        
-        # Comprimi l'immagine
-        buffer = io.BytesIO()
-        img.save(buffer, format="JPEG", quality=quality, optimize=True)
-        result = buffer.getvalue()
-        logger.info(f"Compressed image size: {len(result)} bytes")
-        
-        return result
+        # La compressione è CPU-bound: non blocchiamo il loop del fetcher
+        return await asyncio.to_thread(compress_image, response.content, max_size, quality)
     except Exception as e:
         logger.error(f"Error processing image: {str(e)}")
-        import traceback
-        traceback.print_exc()
         return None
 
-def fetch_book_metadata(isbn):
-    """Fetch book metadata using multiple APIs with fallback mechanism."""
+def download_and_compress_image(url, max_size=(300, 300), quality=75):
+    """Scarica, ridimensiona e comprimi l'immagine"""
+    return run_sync(_download_and_compress_image(url, max_size, quality))
+
+# Scelta tra risultati parziali (senza titolo o autore), come nella catena
+# sequenziale originale: il risultato di Open Library, anche parziale, prevale
+# su quello parziale di Google Books; il dump locale viene per ultimo.
+# Tra risultati completi vince invece il primo che arriva.
+PARTIAL_PRIORITY = ("open_library", "google_books", "open_library_dump")
+
+def _is_complete(metadata):
+    return bool(metadata and metadata.get('title') and metadata.get('author'))
+
+async def _timed_provider(provider, coro, is_found=bool):
+    """
+    Attende la chiamata a un provider registrandone la durata per esito:
+    found, not_found, error o cancelled (un altro provider ha già risposto).
+    """
+    start = time.perf_counter()
+    outcome = "cancelled"
+    try:
+        result = await coro
+        outcome = "found" if is_found(result) else "not_found"
+        return result
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        METADATA_PROVIDER_DURATION.observe(time.perf_counter() - start, provider=provider, outcome=outcome)
+
+async def _fetch_from_dump(isbn):
+    return openlibrary_dump.lookup(isbn)
+
+async def _fetch_book_metadata(isbn):
+    # Prima l'indice locale del dump di Open Library, se configurato: i
+    # provider HTTP vengono interrogati solo se non ha un risultato completo
+    local = None
+    if openlibrary_dump.is_enabled():
+        local = await _timed_provider("open_library_dump", _fetch_from_dump(isbn))
+        if _is_complete(local):
+            return await _with_cover(local), "open_library_dump"
+
+    providers = [
+        ("google_books", _timed_provider("google_books", _fetch_from_google_books(isbn))),
+        ("open_library", _timed_provider("open_library", _fetch_from_open_library(isbn))),
+    ]
+    tasks = {asyncio.ensure_future(coro): name for name, coro in providers}
+    pending = set(tasks)
+    winner, provider = None, None
+
+    # Interroga i provider in parallelo: vince il primo risultato completo
+    try:
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task, name in tasks.items():
+                if task in done and _is_complete(_task_result(task)):
+                    winner, provider = task.result(), name
+                    break
+    finally:
+        for task in pending:
+            task.cancel()
+
+    # Nessun risultato completo: usa il primo parziale secondo PARTIAL_PRIORITY
+    if winner is None:
+        results = {name: _task_result(task) for task, name in tasks.items()}
+        results["open_library_dump"] = local
+        partials = [(results[name], name) for name in PARTIAL_PRIORITY if results.get(name)]
+        if not partials:
+            # "Non trovato" solo se tutti i provider lo hanno confermato
+            failed = [name for task, name in tasks.items() if _task_failed(task)]
+            if failed:
+                logger.warning(f"Metadata for ISBN {isbn} unknown: {', '.join(failed)} failed")
+                return None, PROVIDER_ERROR
+            return None, None
+        winner, provider = partials[0]
+
+    return await _with_cover(winner), provider
+
+def _task_failed(task):
+    return task.done() and not task.cancelled() and task.exception() is not None
+
+def _task_result(task):
+    """Risultato di un provider concluso, None se annullato o fallito."""
+    if not task.done() or task.cancelled() or task.exception() is not None:
+        return None
+    return task.result()
+
+async def _with_cover(metadata):
+    """Scarica la copertina del risultato scelto (l'unica scaricata)."""
+    cover_url = metadata.pop('cover_url', None)
+    metadata['cover_image'] = await _download_and_compress_image(cover_url) if cover_url else None
+    return metadata
+
+async def fetch_book_metadata_async(isbn):
+    """Versione asincrona di fetch_book_metadata, utilizzabile da qualsiasi event loop."""
     if not isbn:
         return None
     
     logger.info(f"Fetching metadata for ISBN: {isbn}")
-    
-    # Prima prova con Google Books API
-    google_metadata = fetch_from_google_books(isbn)
-    if google_metadata and google_metadata.get('title') and google_metadata.get('author'):
-        logger.info("Metadata successfully retrieved from Google Books API")
-        return google_metadata
-    else:
-        logger.info("Google Books API returned incomplete data, trying Open Library API...")
-    
-    # Se Google Books fallisce, prova con Open Library API
-    open_library_metadata = fetch_from_open_library(isbn)
-    if open_library_metadata:
-        logger.info("Metadata successfully retrieved from Open Library API")
-        return open_library_metadata
-    
-    # Se entrambi falliscono, ritorna quanto ottenuto da Google o None
-    return google_metadata
+    metadata, _ = await asyncio.wrap_future(submit(_fetch_book_metadata(isbn)))
+    return metadata
+
+def fetch_book_metadata_with_provider(isbn):
+    """
+    Come fetch_book_metadata, ma restituisce la tupla (metadati, nome del provider).
+
+    (None, None) se tutti i provider hanno risposto che l'ISBN non esiste,
+    (None, PROVIDER_ERROR) se non è stato trovato ma almeno un provider ha fallito.
+    """
+    if not isbn:
+        return None, None
+
+    logger.info(f"Fetching metadata for ISBN: {isbn}")
+    return run_sync(_fetch_book_metadata(isbn))
+
+def fetch_book_metadata(isbn):
+    """Fetch book metadata using multiple APIs concurrently (first complete result wins)."""
+    metadata, _ = fetch_book_metadata_with_provider(isbn)
+    return metadata
+
+def fetch_many_book_metadata(isbns, concurrency=4):
+    """
+    Recupera i metadati di più ISBN in parallelo, con al massimo `concurrency`
+    ISBN in elaborazione contemporaneamente.
+
+    Generatore che restituisce tuple (isbn, metadati, provider) nell'ordine
+    di completamento.
+    """
+    queue = [isbn for isbn in isbns if isbn]
+    queue.reverse()
+    in_flight = {}
+
+    while queue or in_flight:
+        while queue and len(in_flight) < concurrency:
+            isbn = queue.pop()
+            logger.info(f"Fetching metadata for ISBN: {isbn}")
+            in_flight[submit(_fetch_book_metadata(isbn))] = isbn
+
+        done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            isbn = in_flight.pop(future)
+            metadata, provider = future.result()
+            yield isbn, metadata, provider
+
+async def _fetch_from_google_books(isbn):
+    url = f"{GOOGLE_BOOKS_API_URL}/books/v1/volumes?q=isbn:{isbn}"
 
-def fetch_from_google_books(isbn):
-    """Fetch book metadata specifically from Google Books API."""
-    url = f"https://www.googleapis.com/books/v1/volumes?q=isbn:{isbn}"
-    
     try:
-        response = requests.get(url, timeout=10)
-        
-        if response.status_code != 200:
-            logger.warning(f"Google Books API error: status code {response.status_code}")
+        response = await _get(url)
+
+        if not _check_response(response, "Google Books"):
             return None
         
         data = response.json()
@@ -101,15 +335,15 @@ def fetch_from_google_books(isbn):
             except ValueError:
                 pass
         
-        # Ottieni la copertina e comprimila
-        cover_image = None
+        # URL della copertina: viene scaricata solo se questo risultato viene scelto
+        cover_url = None
         if "imageLinks" in volume_info:
-            logger.info("Cover image links found in Google Books API response")
             img_url = volume_info["imageLinks"].get("thumbnail") or volume_info["imageLinks"].get("smallThumbnail")
             if img_url:
                 logger.info(f"Found image URL from Google Books: {img_url}")
-                img_url = img_url.replace("http://", "https://")
-                cover_image = download_and_compress_image(img_url)
+                # Google restituisce link http: si passa a https, salvo che il
+                # provider configurato non sia esso stesso in http (stub locale)
+                cover_url = img_url.replace("http://", "https://") if GOOGLE_BOOKS_API_URL.startswith("https://") else img_url
         
         # Prepare metadata dictionary
         metadata = {
@@ -119,27 +353,35 @@ def fetch_from_google_books(isbn):
             "isbn": isbn,
             "publisher": volume_info.get("publisher", ""),
             "publish_year": publish_year,
-            "cover_image": cover_image
+            "cover_url": cover_url
         }
         
         return metadata
+    except ProviderError:
+        raise
     except Exception as e:
         logger.error(f"Error fetching from Google Books API: {str(e)}")
+        raise ProviderError(f"Google Books: {e}") from e
+
+def fetch_from_google_books(isbn):
+    """Fetch book metadata specifically from Google Books API."""
+    try:
+        metadata = run_sync(_fetch_from_google_books(isbn))
+    except ProviderError:
         return None
+    if metadata:
+        cover_url = metadata.pop('cover_url', None)
+        metadata['cover_image'] = download_and_compress_image(cover_url) if cover_url else None
+    return metadata
 
-def fetch_from_open_library(isbn):
-    """Fetch book metadata from Open Library API."""
-    # Attendi un attimo per non sovraccaricare le API
-    time.sleep(1)
-    
+async def _fetch_from_open_library(isbn):
     # Prima ottieni i metadati generali
-    url = f"https://openlibrary.org/api/books?bibkeys=ISBN:{isbn}&format=json&jscmd=data"
-    
+    url = f"{OPEN_LIBRARY_URL}/api/books?bibkeys=ISBN:{isbn}&format=json&jscmd=data"
+
     try:
-        response = requests.get(url, timeout=15)
-        
-        if response.status_code != 200:
-            logger.warning(f"Open Library API error: status code {response.status_code}")
+        response = await _get(url, timeout=15)
+
+        if not _check_response(response, "Open Library"):
             return None
         
         data = response.json()
@@ -171,29 +413,26 @@ def fetch_from_open_library(isbn):
         if "publish_date" in book_data:
             pub_date = book_data["publish_date"]
             # Estrai l'anno dalla stringa della data
-            import re
             year_match = re.search(r'\d{4}', pub_date)
             if year_match:
                 publish_year = int(year_match.group())
         
-        # Ottieni la copertina
-        cover_image = None
+        # URL della copertina: prova la versione medium, altrimenti small o large
+        cover_url = None
         if "cover" in book_data:
             cover_urls = book_data["cover"]
-            # Prova a ottenere la versione medium, altrimenti small o large
-            img_url = cover_urls.get("medium") or cover_urls.get("small") or cover_urls.get("large")
-            if img_url:
-                logger.info(f"Found image URL from Open Library: {img_url}")
-                cover_image = download_and_compress_image(img_url)
+            cover_url = cover_urls.get("medium") or cover_urls.get("small") or cover_urls.get("large")
+            if cover_url:
+                logger.info(f"Found image URL from Open Library: {cover_url}")
         
         # Ottieni descrizione (richiede una seconda chiamata API)
         description = ""
         if "identifiers" in book_data and "openlibrary" in book_data["identifiers"]:
             ol_id = book_data["identifiers"]["openlibrary"][0]
             # Richiedi i dettagli del libro per ottenere la descrizione
-            details_url = f"https://openlibrary.org/books/{ol_id}.json"
+            details_url = f"{OPEN_LIBRARY_URL}/books/{ol_id}.json"
             try:
-                details_response = requests.get(details_url, timeout=10)
+                details_response = await _get(details_url)
                 if details_response.status_code == 200:
                     details_data = details_response.json()
                     if "description" in details_data:
@@ -212,11 +451,23 @@ def fetch_from_open_library(isbn):
             "isbn": isbn,
             "publisher": publisher,
             "publish_year": publish_year,
-            "cover_image": cover_image
+            "cover_url": cover_url
         }
         
         return metadata
+    except ProviderError:
+        raise
     except Exception as e:
         logger.error(f"Error fetching from Open Library API: {str(e)}")
-        return None
+        raise ProviderError(f"Open Library: {e}") from e
 
+def fetch_from_open_library(isbn):
+    """Fetch book metadata from Open Library API."""
+    try:
+        metadata = run_sync(_fetch_from_open_library(isbn))
+    except ProviderError:
+        return None
+    if metadata:
+        cover_url = metadata.pop('cover_url', None)
+        metadata['cover_image'] = download_and_compress_image(cover_url) if cover_url else None
+    return metadata
@@ -0,0 +1,98 @@
+# backend/services/images.py
+import io
+import logging
+
+from PIL import Image, features
+
+from backend.metrics import IMAGE_PROCESSING_DURATION
+
+logger = logging.getLogger(__name__)
+
+# Dimensioni massime delle varianti delle copertine: thumb per la griglia,
+# detail per la pagina del libro (coincide con l'immagine salvata in covers)
+COVER_SIZES = {
+    "thumb": (160, 240),
+    "detail": (300, 300),
+}
+COVER_FORMATS = {
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+}
+# La copertina salvata in covers è già la variante detail in JPEG
+SOURCE_VARIANT = ("detail", "jpeg")
+
+WEBP_SUPPORTED = features.check("webp")
+
+def render_image(data, max_size, image_format="jpeg", quality=75):
+    """Ridimensiona un'immagine mantenendo le proporzioni e la codifica nel formato richiesto."""
+    with IMAGE_PROCESSING_DURATION.time(operation=f"render_{image_format}"):
+        img = Image.open(io.BytesIO(data))
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        img.thumbnail(max_size)
+
+        buffer = io.BytesIO()
+        if image_format == "webp":
+            img.save(buffer, format="WEBP", quality=quality, method=4)
+        else:
+            img.save(buffer, format="JPEG", quality=quality, optimize=True)
+        return buffer.getvalue()
+
+def available_cover_variants():
+    """Coppie (size, format) generabili, esclusa la copertina sorgente."""
+    return [
+        (size, image_format)
+        for size in COVER_SIZES
+        for image_format in COVER_FORMATS
+        if (size, image_format) != SOURCE_VARIANT
+        and (image_format != "webp" or WEBP_SUPPORTED)
+    ]
+
+def render_cover_variant(data, size, image_format):
+    """Genera una variante della copertina, o None se l'immagine non è leggibile."""
+    try:
+        return render_image(data, COVER_SIZES[size], image_format)
+    except Exception as e:
+        logger.warning(f"Cannot render cover variant {size}/{image_format}: {str(e)}")
+        return None
+
+def build_sprite(images, cell_size, columns=10, quality=75):
+    """
+    Compone più immagini in un unico sprite JPEG a griglia.
+
+    Args:
+        images: Lista di (chiave, byte dell'immagine)
+        cell_size: Dimensione (larghezza, altezza) di ogni cella
+        columns: Celle per riga
+
+    Returns:
+        Tupla (byte dello sprite, dimensione dello sprite, posizioni) dove
+        posizioni è una lista di (chiave, x, y, larghezza, altezza)
+    """
+    with IMAGE_PROCESSING_DURATION.time(operation="sprite"):
+        return _build_sprite(images, cell_size, columns, quality)
+
+def _build_sprite(images, cell_size, columns, quality):
+    cell_width, cell_height = cell_size
+    columns = max(1, min(columns, len(images)))
+    rows = max(1, -(-len(images) // columns))
+    sprite = Image.new("RGB", (columns * cell_width, rows * cell_height), "white")
+
+    placements = []
+    for index, (key, data) in enumerate(images):
+        try:
+            img = Image.open(io.BytesIO(data))
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+            img.thumbnail(cell_size)
+        except Exception as e:
+            logger.warning(f"Cannot add image {key} to sprite: {str(e)}")
+            continue
+        x = (index % columns) * cell_width
+        y = (index // columns) * cell_height
+        sprite.paste(img, (x, y))
+        placements.append((key, x, y, img.width, img.height))
+
+    buffer = io.BytesIO()
+    sprite.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue(), sprite.size, placements
@@ -0,0 +1,113 @@
+# backend/services/jobs.py
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from backend.database import SessionLocal
+from backend.models.book import Book
+from backend.models.job import Job, JobItem
+from backend.crud.book import apply_book_metadata
+from backend.crud.job import get_unfinished_job_ids
+from backend.crud.metadata_cache import get_book_metadata_many
+
+logger = logging.getLogger(__name__)
+
+# Job eseguiti contemporaneamente, ISBN richiesti in parallelo per job e libri per commit
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_FETCH_CONCURRENCY = int(os.environ.get("JOB_FETCH_CONCURRENCY", "4"))
+JOB_BATCH_SIZE = int(os.environ.get("JOB_BATCH_SIZE", "20"))
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job-worker")
+
+def enqueue_job(job_id):
+    """Mette in coda un job per l'esecuzione in background."""
+    return _executor.submit(run_refresh_metadata_job, job_id)
+
+def resume_jobs():
+    """Rimette in coda i job interrotti (es. da un riavvio del server)."""
+    db = SessionLocal()
+    try:
+        job_ids = get_unfinished_job_ids(db)
+    finally:
+        db.close()
+
+    for job_id in job_ids:
+        logger.info(f"Resuming job {job_id}")
+        enqueue_job(job_id)
+    return job_ids
+
+def _process_batch(db, job, items):
+    """Aggiorna i libri di un lotto di elementi del job. Non esegue il commit."""
+    books = {book.id: book for book in db.query(Book).filter(Book.id.in_([item.book_id for item in items]))}
+    overwrite = job.owner_id is not None
+
+    isbns = [books[item.book_id].isbn for item in items if item.book_id in books]
+    metadata_by_isbn = dict(get_book_metadata_many(db, isbns, concurrency=JOB_FETCH_CONCURRENCY))
+
+    for item in items:
+        book = books.get(item.book_id)
+        if book is None:
+            item.status, item.reason = "failed", "Libro non trovato"
+        elif not book.isbn:
+            # Se non c'è ISBN, non possiamo recuperare nulla
+            item.status, item.reason = "failed", "ISBN mancante"
+        else:
+            updated_fields, reason = apply_book_metadata(book, metadata_by_isbn.get(book.isbn), overwrite)
+            item.updated_fields = updated_fields or None
+            item.status, item.reason = ("updated", None) if updated_fields else ("failed", reason)
+
+        if book is not None:
+            item.isbn, item.title = book.isbn, book.title
+
+        job.processed += 1
+        if item.status == "updated":
+            job.updated += 1
+        else:
+            job.failed += 1
+
+def run_refresh_metadata_job(job_id):
+    """
+    Esegue (o riprende) un job di aggiornamento metadati.
+
+    Gli elementi in sospeso sono elaborati a lotti di JOB_BATCH_SIZE, con un
+    commit per lotto: il progresso è subito visibile e la transazione di
+    scrittura resta breve.
+    """
+    db = SessionLocal()
+    try:
+        job = db.query(Job).filter(Job.id == job_id).first()
+        if job is None or job.status not in ("queued", "running"):
+            return
+
+        job.status = "running"
+        job.updated_at = datetime.utcnow()
+        db.commit()
+
+        while True:
+            items = db.query(JobItem).filter(
+                JobItem.job_id == job_id,
+                JobItem.status == "pending"
+            ).order_by(JobItem.id).limit(JOB_BATCH_SIZE).all()
+            if not items:
+                break
+
+            _process_batch(db, job, items)
+            job.updated_at = datetime.utcnow()
+            db.commit()
+
+        job.status = "completed"
+        job.message = f"Elaborazione completata: {job.updated} libri aggiornati, {job.failed} non aggiornati"
+        job.finished_at = job.updated_at = datetime.utcnow()
+        db.commit()
+    except Exception as e:
+        logger.error(f"Job {job_id} failed: {str(e)}")
+        db.rollback()
+        job = db.query(Job).filter(Job.id == job_id).first()
+        if job is not None:
+            job.status = "failed"
+            job.message = f"Errore durante l'aggiornamento: {str(e)}"
+            job.finished_at = job.updated_at = datetime.utcnow()
+            db.commit()
+    finally:
+        db.close()
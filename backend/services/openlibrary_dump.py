@@ -0,0 +1,362 @@
+# backend/services/openlibrary_dump.py
+import gzip
+import heapq
+import json
+import logging
+import mmap
+import os
+import re
+import shutil
+import sqlite3
+import struct
+import tempfile
+import threading
+from typing import Iterable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Indice ISBN-13 costruito dal dump di Open Library (build_openlibrary_index.py).
+# Se il file non è configurato il provider locale è disattivato.
+OPEN_LIBRARY_DUMP_INDEX = os.environ.get("OPEN_LIBRARY_DUMP_INDEX", "")
+# Con 0 le copertine dei libri trovati nell'indice non vengono scaricate:
+# l'importazione non fa nessuna richiesta di rete
+OPEN_LIBRARY_DUMP_COVERS = os.environ.get("OPEN_LIBRARY_DUMP_COVERS", "1").lower() not in ("0", "false", "no")
+OPEN_LIBRARY_COVERS_URL = os.environ.get("OPEN_LIBRARY_COVERS_URL", "https://covers.openlibrary.org").rstrip("/")
+# Voci ordinate in memoria per volta durante la costruzione dell'indice
+BUILD_SORT_CHUNK = int(os.environ.get("OPEN_LIBRARY_DUMP_SORT_CHUNK", "1000000"))
+
+# Formato del file:
+#   intestazione  magic, numero di voci
+#   voci          ISBN-13 in ASCII, offset e lunghezza del record; ordinate
+#                 per ISBN, a larghezza fissa per la ricerca binaria
+#   record        JSON compatto dei metadati, referenziati dalle voci
+# Gli interi sono big-endian: l'ordine dei byte di una voce coincide con
+# l'ordine (ISBN, offset), usato anche nel merge della costruzione.
+MAGIC = b"OLISBN01"
+HEADER = struct.Struct(">8sQ")
+ENTRY = struct.Struct(">13sQI")
+
+_ISBN10 = re.compile(r"^\d{9}[\dX]$")
+_ISBN13 = re.compile(r"^\d{13}$")
+_YEAR = re.compile(r"\d{4}")
+
+def _isbn13_check_digit(first12: str) -> str:
+    total = sum(int(digit) * (1 if i % 2 == 0 else 3) for i, digit in enumerate(first12))
+    return str((10 - total % 10) % 10)
+
+def to_isbn13(isbn: str) -> Optional[str]:
+    """ISBN-13 corrispondente a un ISBN-10 o ISBN-13 (con o senza trattini), o None se non valido."""
+    isbn = re.sub(r"[\s-]", "", isbn or "").upper()
+    if _ISBN13.match(isbn):
+        return isbn
+    if _ISBN10.match(isbn):
+        return "978" + isbn[:9] + _isbn13_check_digit("978" + isbn[:9])
+    return None
+
+def cover_url(cover_id) -> Optional[str]:
+    if not cover_id or not OPEN_LIBRARY_DUMP_COVERS:
+        return None
+    return f"{OPEN_LIBRARY_COVERS_URL}/b/id/{cover_id}-M.jpg"
+
+class OpenLibraryDumpIndex:
+    """
+    Indice ISBN-13 → metadati in sola lettura, mappato in memoria.
+
+    La ricerca è binaria sulle voci a larghezza fissa: nessuna struttura
+    viene caricata all'apertura e le pagine lette restano nella cache del
+    sistema operativo, condivisa tra i processi.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"{path}: indice vuoto")
+        magic, self.count = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path}: non è un indice del dump di Open Library")
+        self._records_offset = HEADER.size + self.count * ENTRY.size
+
+    def __len__(self):
+        return self.count
+
+    def _find(self, key: bytes) -> Optional[int]:
+        lo, hi = 0, self.count
+        buffer = self._mmap
+        while lo < hi:
+            mid = (lo + hi) // 2
+            position = HEADER.size + mid * ENTRY.size
+            current = buffer[position:position + 13]
+            if current < key:
+                lo = mid + 1
+            elif current > key:
+                hi = mid
+            else:
+                return position
+        return None
+
+    def get_record(self, isbn: str) -> Optional[dict]:
+        """Record grezzo salvato per l'ISBN, o None se non presente."""
+        isbn13 = to_isbn13(isbn)
+        if isbn13 is None:
+            return None
+        position = self._find(isbn13.encode("ascii"))
+        if position is None:
+            return None
+        _, offset, length = ENTRY.unpack_from(self._mmap, position)
+        start = self._records_offset + offset
+        return json.loads(self._mmap[start:start + length])
+
+    def get(self, isbn: str) -> Optional[dict]:
+        """Metadati dell'ISBN nello stesso formato dei provider HTTP, o None."""
+        record = self.get_record(isbn)
+        if record is None:
+            return None
+        return {
+            "title": record.get("title", ""),
+            "author": record.get("author", ""),
+            "description": record.get("description", ""),
+            "isbn": isbn,
+            "publisher": record.get("publisher", ""),
+            "publish_year": record.get("publish_year"),
+            "cover_url": cover_url(record.get("cover_id")),
+        }
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+_index = None
+_index_lock = threading.Lock()
+_index_failed = False
+
+def get_index() -> Optional[OpenLibraryDumpIndex]:
+    """Indice configurato in OPEN_LIBRARY_DUMP_INDEX, aperto alla prima richiesta."""
+    global _index, _index_failed
+    if _index is not None or _index_failed or not OPEN_LIBRARY_DUMP_INDEX:
+        return _index
+    with _index_lock:
+        if _index is None and not _index_failed:
+            try:
+                _index = OpenLibraryDumpIndex(OPEN_LIBRARY_DUMP_INDEX)
+                logger.info(f"Indice del dump di Open Library: {len(_index)} ISBN da {OPEN_LIBRARY_DUMP_INDEX}")
+            except (OSError, ValueError) as e:
+                # Non si riprova ad ogni ISBN: si usano solo i provider HTTP
+                _index_failed = True
+                logger.error(f"Indice del dump di Open Library non disponibile: {str(e)}")
+    return _index
+
+def is_enabled() -> bool:
+    return get_index() is not None
+
+def lookup(isbn: str) -> Optional[dict]:
+    """Metadati dell'ISBN dall'indice locale, o None se assente o non configurato."""
+    index = get_index()
+    return index.get(isbn) if index is not None else None
+
+# --- Costruzione dell'indice ---
+
+def _open_dump(path: str):
+    return gzip.open(path, "rt", encoding="utf-8") if path.endswith(".gz") else open(path, encoding="utf-8")
+
+def iter_dump(path: str) -> Iterator[dict]:
+    """
+    Record di un file di dump di Open Library, letti in streaming.
+
+    Accetta sia i dump ufficiali (TSV con il JSON nell'ultima colonna) sia
+    file JSONL, compressi con gzip o no. Le righe non valide vengono saltate.
+    """
+    with _open_dump(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if not line.startswith("{"):
+                line = line.rsplit("\t", 1)[-1]
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict):
+                yield record
+
+def _text(value) -> str:
+    """Campo testuale di Open Library, che può essere una stringa o {"type", "value"}."""
+    if isinstance(value, dict):
+        value = value.get("value")
+    return value.strip() if isinstance(value, str) else ""
+
+def _keys(items, nested=None) -> list:
+    keys = []
+    for item in items or []:
+        if nested and isinstance(item, dict):
+            item = item.get(nested)
+        if isinstance(item, dict) and isinstance(item.get("key"), str):
+            keys.append(item["key"])
+    return keys
+
+class _Lookups:
+    """Autori e opere dei dump ausiliari, in un database SQLite temporaneo."""
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE authors (key TEXT PRIMARY KEY, name TEXT)")
+        self.conn.execute("CREATE TABLE works (key TEXT PRIMARY KEY, description TEXT, author_keys TEXT)")
+
+    def _load(self, sql, rows, batch_size=10000):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == batch_size:
+                self.conn.executemany(sql, batch)
+                batch = []
+        if batch:
+            self.conn.executemany(sql, batch)
+        self.conn.commit()
+
+    def load_authors(self, path: str):
+        self._load("INSERT OR REPLACE INTO authors VALUES (?, ?)", (
+            (record["key"], _text(record.get("name")))
+            for record in iter_dump(path) if isinstance(record.get("key"), str) and record.get("name")
+        ))
+
+    def load_works(self, path: str):
+        self._load("INSERT OR REPLACE INTO works VALUES (?, ?, ?)", (
+            (record["key"], _text(record.get("description")), json.dumps(_keys(record.get("authors"), "author")))
+            for record in iter_dump(path) if isinstance(record.get("key"), str)
+        ))
+
+    def author_names(self, keys) -> list:
+        names = []
+        for key in keys:
+            row = self.conn.execute("SELECT name FROM authors WHERE key = ?", (key,)).fetchone()
+            if row and row[0]:
+                names.append(row[0])
+        return names
+
+    def work(self, key):
+        row = self.conn.execute("SELECT description, author_keys FROM works WHERE key = ?", (key,)).fetchone()
+        return (row[0], json.loads(row[1])) if row else ("", [])
+
+    def close(self):
+        self.conn.close()
+
+def _edition_record(edition: dict, lookups: _Lookups) -> dict:
+    """Record compatto dei metadati di un'edizione, completato con opera e autori."""
+    work_keys = _keys(edition.get("works"))
+    work_description, work_author_keys = lookups.work(work_keys[0]) if work_keys else ("", [])
+
+    authors = lookups.author_names(_keys(edition.get("authors")) or work_author_keys)
+    author = ", ".join(authors) or _text(edition.get("by_statement")).rstrip(".")
+
+    publishers = edition.get("publishers") or []
+    year = _YEAR.search(_text(edition.get("publish_date")))
+    covers = [cover for cover in edition.get("covers") or [] if isinstance(cover, int) and cover > 0]
+
+    record = {
+        "title": _text(edition.get("title")),
+        "author": author,
+        "description": _text(edition.get("description")) or work_description or "",
+        "publisher": _text(publishers[0]) if publishers else "",
+        "publish_year": int(year.group()) if year else None,
+        "cover_id": covers[0] if covers else None,
+    }
+    return {field: value for field, value in record.items() if value}
+
+def _edition_isbns(edition: dict) -> set:
+    isbns = set()
+    for isbn in (edition.get("isbn_13") or []) + (edition.get("isbn_10") or []):
+        isbn13 = to_isbn13(isbn) if isinstance(isbn, str) else None
+        if isbn13:
+            isbns.add(isbn13)
+    return isbns
+
+def _write_run(entries: list, directory: str) -> str:
+    entries.sort()
+    fd, path = tempfile.mkstemp(prefix="run-", dir=directory)
+    with os.fdopen(fd, "wb") as f:
+        f.writelines(entries)
+    return path
+
+def _read_run(path: str) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        while True:
+            entry = f.read(ENTRY.size)
+            if len(entry) < ENTRY.size:
+                return
+            yield entry
+
+def build_index(editions: Iterable[str], output: str, works: Iterable[str] = (), authors: Iterable[str] = ()) -> dict:
+    """
+    Costruisce l'indice ISBN-13 da uno o più dump delle edizioni.
+
+    I dump di autori e opere (facoltativi) forniscono i nomi degli autori e
+    le descrizioni mancanti nelle edizioni; vengono caricati in un database
+    temporaneo su disco. Le edizioni sono lette in una sola passata: i record
+    vanno su un file temporaneo e le voci sono ordinate a blocchi di
+    BUILD_SORT_CHUNK e unite con un merge, quindi la memoria usata non dipende
+    dalla dimensione del dump. Per un ISBN presente in più edizioni vale la
+    prima letta.
+
+    Returns:
+        Statistiche della costruzione (edizioni lette, ISBN indicizzati, duplicati)
+    """
+    stats = {"editions": 0, "isbns": 0, "duplicates": 0}
+    workdir = tempfile.mkdtemp(prefix="olindex-", dir=os.path.dirname(os.path.abspath(output)))
+    lookups = _Lookups(os.path.join(workdir, "lookups.db"))
+    try:
+        for path in authors:
+            logger.info(f"Caricamento autori da {path}")
+            lookups.load_authors(path)
+        for path in works:
+            logger.info(f"Caricamento opere da {path}")
+            lookups.load_works(path)
+
+        runs, entries, offset = [], [], 0
+        records_path = os.path.join(workdir, "records")
+        with open(records_path, "wb") as records:
+            for path in editions:
+                logger.info(f"Lettura edizioni da {path}")
+                for edition in iter_dump(path):
+                    isbns = _edition_isbns(edition)
+                    if not isbns:
+                        continue
+                    stats["editions"] += 1
+                    data = json.dumps(_edition_record(edition, lookups), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+                    records.write(data)
+                    for isbn in isbns:
+                        entries.append(ENTRY.pack(isbn.encode("ascii"), offset, len(data)))
+                    offset += len(data)
+                    if len(entries) >= BUILD_SORT_CHUNK:
+                        runs.append(_write_run(entries, workdir))
+                        entries = []
+        if entries:
+            runs.append(_write_run(entries, workdir))
+
+        # Merge dei blocchi ordinati; l'intestazione si scrive alla fine, quando
+        # il numero di voci (senza duplicati) è noto
+        tmp_output = output + ".tmp"
+        with open(tmp_output, "wb") as out:
+            out.write(HEADER.pack(MAGIC, 0))
+            previous = None
+            for entry in heapq.merge(*(_read_run(run) for run in runs)):
+                isbn = entry[:13]
+                if isbn == previous:
+                    stats["duplicates"] += 1
+                    continue
+                previous = isbn
+                out.write(entry)
+                stats["isbns"] += 1
+            with open(records_path, "rb") as records:
+                shutil.copyfileobj(records, out, 1024 * 1024)
+            out.seek(0)
+            out.write(HEADER.pack(MAGIC, stats["isbns"]))
+        os.replace(tmp_output, output)
+    finally:
+        lookups.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return stats
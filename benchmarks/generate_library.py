@@ -0,0 +1,230 @@
+"""
+Genera una biblioteca sintetica e riproducibile per i benchmark.
+
+Crea un database SQLite aggiornato all'ultima migrazione con N utenti, M libri
+e K prestiti. A parità di parametri e di seed il contenuto è sempre lo stesso:
+
+- le copertine sono JPEG generati con Pillow e passati per la stessa
+  compressione dei provider, salvati nello store (con le varianti) e
+  condivisi tra più libri, come accade con le copertine reali;
+- libri e prestiti seguono una distribuzione di Zipf: pochi utenti possiedono
+  gran parte dei libri e pochi libri ricevono gran parte dei prestiti.
+  L'utente 0 (bench0@example.com) è il proprietario con più libri;
+- tutti gli utenti hanno la password BENCH_PASSWORD.
+
+Uso:
+    python -m benchmarks.generate_library --db /tmp/bench.db --users 50 --books 10000 --loans 20000
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+BENCH_PASSWORD = "benchmark"
+BENCH_EMAIL_DOMAIN = "example.com"
+# Righe inserite per statement
+INSERT_BATCH_SIZE = 1000
+# Esponente della distribuzione di Zipf per proprietari e prestiti
+ZIPF_EXPONENT = 1.1
+# Frazione dei libri con copertina
+COVER_RATIO = 0.8
+
+WORDS = (
+    "ombra vento mare notte giardino città fiume segreto viaggio memoria luce silenzio "
+    "inverno estate montagna isola casa porta lettera sogno tempo storia ritorno confine "
+    "guerra pace amore lupo stella cielo pietra fuoco specchio labirinto biblioteca "
+    "deserto nebbia castello ponte strada treno orologio carta inchiostro destino"
+).split()
+FIRST_NAMES = ("Anna", "Marco", "Giulia", "Luca", "Sara", "Paolo", "Elena", "Davide", "Chiara", "Matteo")
+LAST_NAMES = ("Rossi", "Bianchi", "Esposito", "Romano", "Colombo", "Ricci", "Marino", "Greco", "Bruno", "Gallo")
+PUBLISHERS = ("Einaudi", "Mondadori", "Feltrinelli", "Adelphi", "Bompiani", "Sellerio", "Laterza", "Garzanti")
+
+def bench_email(index):
+    return f"bench{index}@{BENCH_EMAIL_DOMAIN}"
+
+def isbn13(prefix: str, number: int) -> str:
+    """ISBN-13 valido con il prefisso indicato (978/979) e il numero dato."""
+    body = f"{prefix}{number:09d}"
+    total = sum(int(digit) * (1 if i % 2 == 0 else 3) for i, digit in enumerate(body))
+    return body + str((10 - total % 10) % 10)
+
+def zipf_choices(rng, n, k, exponent=ZIPF_EXPONENT, shuffle=True):
+    """
+    k indici in range(n) con distribuzione di Zipf. Con shuffle i ranghi sono
+    assegnati a una permutazione casuale degli indici, altrimenti l'indice 0
+    è il più frequente.
+    """
+    ranks = list(range(n))
+    if shuffle:
+        rng.shuffle(ranks)
+    cum_weights = []
+    total = 0.0
+    for rank in range(n):
+        total += 1.0 / (rank + 1) ** exponent
+        cum_weights.append(total)
+    return [ranks[i] for i in rng.choices(range(n), cum_weights=cum_weights, k=k)]
+
+def synthetic_cover(rng, width=300, height=450):
+    """Copertina JPEG con sfondo sfumato, blocchi di colore e rumore (dimensioni realistiche)."""
+    from PIL import Image, ImageDraw
+
+    base = tuple(rng.randrange(40, 216) for _ in range(3))
+    image = Image.new("RGB", (width, height), base)
+    draw = ImageDraw.Draw(image)
+    for y in range(0, height, 3):
+        shade = tuple(max(0, min(255, c + (y * 60) // height - 30)) for c in base)
+        draw.rectangle([0, y, width, y + 2], fill=shade)
+    for _ in range(rng.randrange(3, 8)):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1, y1 = x0 + rng.randrange(20, 160), y0 + rng.randrange(10, 120)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        if rng.random() < 0.5:
+            draw.rectangle([x0, y0, x1, y1], fill=color)
+        else:
+            draw.ellipse([x0, y0, x1, y1], fill=color)
+    for _ in range(width * height // 20):
+        x, y = rng.randrange(width), rng.randrange(height)
+        draw.point((x, y), fill=tuple(rng.randrange(256) for _ in range(3)))
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+def _sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+def generate(db_path, users=10, books=1000, loans=2000, covers=50, seed=42):
+    """
+    Crea il database in db_path (che non deve esistere) e lo popola.
+
+    Restituisce un dizionario con i conteggi e i tempi di generazione.
+    """
+    if os.path.exists(db_path):
+        raise SystemExit(f"{db_path} esiste già")
+    # Il database va configurato prima di importare il backend
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+
+    from sqlalchemy import insert
+    from init_db import upgrade_database
+    from backend.crud.cover import store_cover
+    from backend.database import SessionLocal
+    from backend.models import Book, Loan, User
+    from backend.security import get_password_hash
+    from backend.services.google_books import compress_image
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    started = time.perf_counter()
+    upgrade_database()
+
+    db = SessionLocal()
+    try:
+        # L'hash bcrypt è lento: viene calcolato una volta sola per tutti gli utenti
+        hashed_password = get_password_hash(BENCH_PASSWORD)
+        db.execute(insert(User), [
+            {
+                "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}",
+                "email": bench_email(i),
+                "hashed_password": hashed_password,
+                "role": "admin" if i == 0 else "user",
+                "is_active": True,
+                "created_at": now - timedelta(days=rng.randrange(1, 1000)),
+            }
+            for i in range(users)
+        ])
+        user_ids = [row[0] for row in db.query(User.id).order_by(User.id)]
+
+        cover_hashes = [
+            store_cover(db, compress_image(synthetic_cover(rng)))
+            for _ in range(covers)
+        ]
+
+        # I proprietari seguono Zipf, con l'utente 0 come proprietario principale
+        owners = zipf_choices(rng, users, books, shuffle=False)
+        authors = [f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}" for _ in range(max(1, books // 5))]
+        author_picks = zipf_choices(rng, len(authors), books)
+
+        rows = []
+        for i in range(books):
+            rows.append({
+                "title": " ".join(rng.choice(WORDS) for _ in range(rng.randrange(1, 5))).capitalize(),
+                "author": authors[author_picks[i]],
+                "description": " ".join(_sentence(rng, rng.randrange(6, 16)) for _ in range(rng.randrange(2, 6))),
+                "isbn": isbn13("978", i),
+                "publisher": rng.choice(PUBLISHERS),
+                "publish_year": rng.randrange(1950, now.year + 1),
+                "owner_id": user_ids[owners[i]],
+                "cover_hash": rng.choice(cover_hashes) if cover_hashes and rng.random() < COVER_RATIO else None,
+            })
+            if len(rows) == INSERT_BATCH_SIZE:
+                db.execute(insert(Book), rows)
+                rows = []
+        if rows:
+            db.execute(insert(Book), rows)
+        book_rows = db.query(Book.id, Book.owner_id).order_by(Book.id).all()
+
+        # Prestiti: pochi libri molto richiesti; al più un prestito in corso per libro
+        active_books = set()
+        rows = []
+        for index in zipf_choices(rng, len(book_rows), loans) if book_rows else []:
+            book_id, owner_id = book_rows[index]
+            borrower_id = rng.choice(user_ids)
+            if len(user_ids) > 1:
+                while borrower_id == owner_id:
+                    borrower_id = rng.choice(user_ids)
+            loan_date = now - timedelta(days=rng.randrange(1, 730), seconds=rng.randrange(86400))
+            outcome = rng.random()
+            if book_id in active_books or outcome < 0.7:
+                return_date = min(loan_date + timedelta(days=rng.randrange(1, 60)), now - timedelta(seconds=1))
+            else:
+                active_books.add(book_id)
+                if outcome < 0.9:
+                    loan_date = now - timedelta(days=rng.randrange(1, 30))
+                    return_date = loan_date + timedelta(days=30)
+                else:
+                    # In corso senza data di restituzione (spesso in ritardo)
+                    return_date = None
+            rows.append({"book_id": book_id, "user_id": borrower_id, "loan_date": loan_date, "return_date": return_date})
+            if len(rows) == INSERT_BATCH_SIZE:
+                db.execute(insert(Loan), rows)
+                rows = []
+        if rows:
+            db.execute(insert(Loan), rows)
+
+        db.commit()
+    finally:
+        db.close()
+
+    return {
+        "db": db_path,
+        "seed": seed,
+        "users": users,
+        "books": books,
+        "loans": loans,
+        "covers": covers,
+        "active_loans": len(active_books),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera una biblioteca sintetica per i benchmark")
+    parser.add_argument("--db", required=True, help="Percorso del database SQLite da creare")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--books", type=int, default=1000)
+    parser.add_argument("--loans", type=int, default=2000)
+    parser.add_argument("--covers", type=int, default=50, help="Copertine distinte condivise tra i libri")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    if args.users < 1:
+        parser.error("serve almeno un utente")
+    summary = generate(os.path.abspath(args.db), args.users, args.books, args.loans, args.covers, args.seed)
+    json.dump(summary, sys.stdout)
+    sys.stdout.write("\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+"""
+Benchmark di carico riproducibili del backend.
+
+Per ogni dimensione richiesta genera una biblioteca sintetica
+(benchmarks/generate_library.py) in una cartella temporanea, avvia i provider
+di metadati emulati (benchmarks/stub_providers.py) e il backend con uvicorn,
+poi misura latenza (p50/p95/p99) e throughput di:
+
+- GET  /books/                 prima pagina e pagine successive (after_id)
+- GET  /books/search/          ricerca testuale su parole dei titoli
+- GET  /books/{id}/cover       miniature di libri casuali
+- GET  /loans/ledger           registro prestiti (la vista Prestiti del frontend)
+- POST /books/                 libri nuovi, con metadati e copertina dai provider emulati
+- POST /loans/                 prestiti dei libri appena creati
+
+Le richieste sono generate con un seed fisso, quindi due esecuzioni con gli
+stessi parametri fanno le stesse richieste. Il risultato è un JSON con commit,
+parametri e metriche per (dimensione, scenario), confrontabile con quello di
+un altro commit tramite --compare.
+
+Uso:
+    python -m benchmarks.run_benchmarks --sizes small,medium --output bench.json
+    python -m benchmarks.run_benchmarks --sizes small --compare bench.json [--max-regression 20]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import httpx
+
+from benchmarks.generate_library import BENCH_PASSWORD, WORDS, bench_email, isbn13
+from benchmarks.stub_providers import start_stub_server
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Dimensioni dei dataset: utenti, libri, prestiti e copertine distinte
+SIZES = {
+    "small": {"users": 10, "books": 1_000, "loans": 2_000, "covers": 50},
+    "medium": {"users": 50, "books": 10_000, "loans": 20_000, "covers": 200},
+    "large": {"users": 200, "books": 100_000, "loans": 200_000, "covers": 500},
+}
+SERVER_START_TIMEOUT = 60
+REQUEST_TIMEOUT = 60
+
+def percentile(sorted_values, pct):
+    """Percentile nearest-rank di una lista già ordinata."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _git_info():
+    def git(*args):
+        try:
+            return subprocess.run(
+                ["git", *args], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+    }
+
+class BenchContext:
+    """Dati del dataset usati per costruire le richieste (ID, parole, token)."""
+
+    def __init__(self, db_path, headers, seed):
+        self.headers = headers
+        self.seed = seed
+        with sqlite3.connect(db_path) as conn:
+            self.owner_id = conn.execute(
+                "SELECT id FROM users WHERE email = ?", (bench_email(0),)
+            ).fetchone()[0]
+            self.user_ids = [row[0] for row in conn.execute("SELECT id FROM users ORDER BY id")]
+            self.owned_ids = [row[0] for row in conn.execute(
+                "SELECT id FROM books WHERE owner_id = ? ORDER BY id", (self.owner_id,)
+            )]
+            self.cover_book_ids = [row[0] for row in conn.execute(
+                "SELECT id FROM books WHERE cover_hash IS NOT NULL ORDER BY id"
+            )]
+        self.borrower_ids = [user_id for user_id in self.user_ids if user_id != self.owner_id] or self.user_ids
+        self.created_book_ids = []
+
+    def rng(self, scenario):
+        return random.Random(f"{self.seed}:{scenario}")
+
+def _books_page(client, ctx, rng, i):
+    # Metà delle richieste chiede la prima pagina, le altre una pagina successiva
+    params = {"limit": 100}
+    if ctx.owned_ids and rng.random() < 0.5:
+        params["after_id"] = rng.choice(ctx.owned_ids)
+    return client.get("/books/", params=params, headers=ctx.headers)
+
+def _books_search(client, ctx, rng, i):
+    return client.get("/books/search/", params={"query": rng.choice(WORDS)}, headers=ctx.headers)
+
+def _book_cover(client, ctx, rng, i):
+    return client.get(f"/books/{rng.choice(ctx.cover_book_ids)}/cover", params={"size": "thumb"})
+
+def _loans_ledger(client, ctx, rng, i):
+    return client.get("/loans/ledger", params={"limit": 50}, headers=ctx.headers)
+
+def _create_book(client, ctx, rng, i):
+    # Prefisso 979: non collide con gli ISBN 978 del dataset
+    response = client.post("/books/", json={"isbn": isbn13("979", ctx.seed * 1_000_000 + i)}, headers=ctx.headers)
+    if response.status_code == 200:
+        ctx.created_book_ids.append(response.json()["id"])
+    return response
+
+def _create_loan(client, ctx, rng, i):
+    return client.post("/loans/", json={
+        "book_id": ctx.created_book_ids[i],
+        "user_id": rng.choice(ctx.borrower_ids),
+    }, headers=ctx.headers)
+
+# (nome, funzione, richiesta idempotente: ammette il riscaldamento)
+SCENARIOS = [
+    ("GET /books/", _books_page, True),
+    ("GET /books/search/", _books_search, True),
+    ("GET /books/{id}/cover", _book_cover, True),
+    ("GET /loans/ledger", _loans_ledger, True),
+    ("POST /books/", _create_book, False),
+    ("POST /loans/", _create_loan, False),
+]
+
+def run_scenario(client, ctx, name, fn, requests, concurrency, warmup):
+    """Esegue requests richieste con concurrency thread e restituisce le metriche."""
+    if name == "GET /books/{id}/cover" and not ctx.cover_book_ids:
+        return None
+    if name == "POST /loans/":
+        # Un prestito per ogni libro creato nello scenario POST /books/
+        requests = min(requests, len(ctx.created_book_ids))
+        if not requests:
+            return None
+
+    warmup_rng = ctx.rng(f"{name}:warmup")
+    for i in range(warmup):
+        fn(client, ctx, warmup_rng, i)
+
+    # Le richieste vengono preparate con un generatore per scenario: l'ordine
+    # di esecuzione tra i thread non cambia quali richieste vengono fatte
+    base_rng = ctx.rng(name)
+    rngs = [random.Random(base_rng.random()) for _ in range(requests)]
+    latencies = []
+    errors = 0
+
+    def one(i):
+        start = time.perf_counter()
+        try:
+            response = fn(client, ctx, rngs[i], i)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for elapsed, ok in executor.map(one, range(requests)):
+            latencies.append(elapsed * 1000)
+            errors += not ok
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "scenario": name,
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "mean_ms": round(sum(latencies) / len(latencies), 3),
+        "max_ms": round(latencies[-1], 3),
+        "throughput_rps": round(requests / wall, 2) if wall else None,
+    }
+
+def _start_backend(db_path, stub_url, workdir, workers):
+    port = _free_port()
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{db_path}",
+        GOOGLE_BOOKS_API_URL=stub_url,
+        OPEN_LIBRARY_URL=stub_url,
+    )
+    log = open(os.path.join(workdir, "server.log"), "wb")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Il backend è terminato all'avvio, vedi {log.name}")
+        try:
+            if httpx.get(f"{base_url}/", timeout=1).status_code == 200:
+                return process, base_url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"Il backend non risponde dopo {SERVER_START_TIMEOUT} s, vedi {log.name}")
+
+def run_size(size, params, args, scenarios):
+    """Genera il dataset di una dimensione, avvia i servizi ed esegue gli scenari."""
+    workdir = tempfile.mkdtemp(prefix=f"bench-{size}-")
+    db_path = os.path.join(workdir, "bench.db")
+
+    print(f"[{size}] generazione del dataset {params}", file=sys.stderr)
+    generated = subprocess.run(
+        [sys.executable, "-m", "benchmarks.generate_library", "--db", db_path, "--seed", str(args.seed),
+         *[f"--{key}={value}" for key, value in params.items()]],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+    )
+    dataset = json.loads(generated.stdout.strip().splitlines()[-1])
+
+    stub, stub_url = start_stub_server(latency_ms=args.provider_latency_ms)
+    process = None
+    try:
+        process, base_url = _start_backend(db_path, stub_url, workdir, args.workers)
+        with httpx.Client(base_url=base_url, timeout=REQUEST_TIMEOUT,
+                          limits=httpx.Limits(max_connections=args.concurrency)) as client:
+            token = client.post("/auth/token", data={"username": bench_email(0), "password": BENCH_PASSWORD})
+            token.raise_for_status()
+            headers = {"Authorization": f"Bearer {token.json()['access_token']}"}
+            ctx = BenchContext(db_path, headers, args.seed)
+
+            results = []
+            for name, fn, idempotent in SCENARIOS:
+                if name not in scenarios:
+                    continue
+                result = run_scenario(
+                    client, ctx, name, fn, args.requests, args.concurrency, args.warmup if idempotent else 0
+                )
+                if result is None:
+                    print(f"[{size}] {name}: saltato (nessun dato)", file=sys.stderr)
+                    continue
+                print(f"[{size}] {name}: p50 {result['p50_ms']} ms, p95 {result['p95_ms']} ms, "
+                      f"p99 {result['p99_ms']} ms, {result['throughput_rps']} req/s, "
+                      f"{result['errors']} errori", file=sys.stderr)
+                results.append({"size": size, "dataset": dataset, **result})
+            return results
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+        stub.shutdown()
+        if args.keep:
+            print(f"[{size}] dataset e log in {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+def compare(baseline, current, max_regression=None):
+    """
+    Stampa (su stderr) le variazioni di p50/p95/p99 e throughput rispetto a baseline.
+
+    Restituisce gli scenari con p95 peggiorato oltre max_regression (percentuale).
+    """
+    def key(result):
+        return result["size"], result["scenario"]
+
+    old = {key(result): result for result in baseline["results"]}
+    regressions = []
+
+    def delta(before, after):
+        if not before:
+            return "    n/d"
+        return f"{(after - before) / before * 100:+6.1f}%"
+
+    out = sys.stderr
+    print(f"Confronto con {baseline['meta'].get('git', {}).get('commit') or 'baseline'}", file=out)
+    print(f"{'dimensione':<10} {'scenario':<24} {'p50 ms':>18} {'p95 ms':>18} {'p99 ms':>18} {'req/s':>18}", file=out)
+    for result in current["results"]:
+        before = old.get(key(result))
+        if before is None:
+            print(f"{result['size']:<10} {result['scenario']:<24} (nuovo)", file=out)
+            continue
+        cells = []
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps"):
+            cells.append(f"{result[metric]:>9} {delta(before[metric], result[metric])}")
+        print(f"{result['size']:<10} {result['scenario']:<24} " + " ".join(cells), file=out)
+        if max_regression is not None and before["p95_ms"]:
+            if (result["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100 > max_regression:
+                regressions.append(key(result))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark di carico del backend su dataset sintetici")
+    parser.add_argument("--sizes", default="small", help=f"Dimensioni separate da virgola: {', '.join(SIZES)}")
+    parser.add_argument("--scenarios", default="", help="Scenari da eseguire separati da virgola (default tutti)")
+    parser.add_argument("--requests", type=int, default=200, help="Richieste misurate per scenario")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=10, help="Richieste non misurate prima degli scenari di lettura")
+    parser.add_argument("--workers", type=int, default=1, help="Processi uvicorn")
+    parser.add_argument("--provider-latency-ms", type=float, default=50.0, help="Latenza dei provider emulati")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="Conserva database e log del backend")
+    parser.add_argument("--output", help="File JSON dei risultati (default stdout)")
+    parser.add_argument("--compare", help="JSON di un'esecuzione precedente da confrontare")
+    parser.add_argument("--max-regression", type=float, help="Esce con codice 1 se un p95 peggiora oltre questa percentuale")
+    args = parser.parse_args(argv)
+
+    sizes = [size.strip() for size in args.sizes.split(",") if size.strip()]
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        parser.error(f"dimensioni sconosciute: {', '.join(unknown)}")
+    names = [name for name, _, _ in SCENARIOS]
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()] or names
+    unknown = [name for name in scenarios if name not in names]
+    if unknown:
+        parser.error(f"scenari sconosciuti: {', '.join(unknown)} (disponibili: {', '.join(names)})")
+
+    report = {
+        "meta": {
+            "git": _git_info(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "params": {
+                "sizes": {size: SIZES[size] for size in sizes},
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+                "warmup": args.warmup,
+                "workers": args.workers,
+                "provider_latency_ms": args.provider_latency_ms,
+                "seed": args.seed,
+            },
+        },
+        "results": [],
+    }
+    for size in sizes:
+        report["results"].extend(run_size(size, SIZES[size], args, scenarios))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report, args.max_regression)
+        if regressions:
+            print(f"Regressioni oltre il {args.max_regression}% sul p95: {regressions}", file=sys.stderr)
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
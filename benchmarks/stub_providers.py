@@ -0,0 +1,156 @@
+"""
+Server HTTP locale che emula i provider di metadati usati da
+backend/services/google_books.py, per benchmark ripetibili e senza rete.
+
+Risponde agli stessi endpoint (e con la stessa forma delle risposte) di:
+- Google Books: /books/v1/volumes?q=isbn:<isbn>
+- Open Library: /api/books?bibkeys=ISBN:<isbn>&format=json&jscmd=data e /books/<id>.json
+- copertine:    /covers/<isbn>.jpg
+
+Le risposte dipendono solo dall'ISBN. Circa un ISBN su cinque non è presente
+su Google Books, così anche il percorso di Open Library viene esercitato.
+Una latenza fissa per risposta simula la rete.
+
+Per usarlo con il backend:
+    GOOGLE_BOOKS_API_URL=http://127.0.0.1:8900 OPEN_LIBRARY_URL=http://127.0.0.1:8900 uvicorn main:app
+
+Uso:
+    python -m benchmarks.stub_providers [--port 8900] [--latency-ms 50]
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.generate_library import FIRST_NAMES, LAST_NAMES, PUBLISHERS, WORDS, synthetic_cover
+
+def _digest(isbn):
+    return hashlib.sha256(isbn.encode()).digest()
+
+def _pick(values, isbn, offset):
+    return values[_digest(isbn)[offset] % len(values)]
+
+def _in_google_books(isbn):
+    return _digest(isbn)[0] % 5 != 0
+
+def _book(isbn):
+    """Metadati deterministici per l'ISBN."""
+    digest = _digest(isbn)
+    return {
+        "title": " ".join(_pick(WORDS, isbn, 1 + i) for i in range(1 + digest[5] % 4)).capitalize(),
+        "author": f"{_pick(FIRST_NAMES, isbn, 6)} {_pick(LAST_NAMES, isbn, 7)}",
+        "publisher": _pick(PUBLISHERS, isbn, 8),
+        "year": 1950 + (digest[9] * 256 + digest[10]) % 75,
+        "description": " ".join(_pick(WORDS, isbn, 11 + i % 20) for i in range(40)).capitalize() + ".",
+    }
+
+@lru_cache(maxsize=256)
+def _cover(isbn):
+    """Copertina JPEG (sempre la stessa per ISBN), della dimensione tipica di quelle dei provider."""
+    return synthetic_cover(random.Random(isbn), width=128, height=192)
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json"):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+        if self.latency:
+            time.sleep(self.latency)
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except ConnectionError:
+            # Il backend annulla la richiesta al provider più lento
+            pass
+
+    def _base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+
+        if url.path == "/books/v1/volumes":
+            isbn = query.get("q", [""])[0].removeprefix("isbn:")
+            if not isbn or not _in_google_books(isbn):
+                return self._send(200, {"kind": "books#volumes", "totalItems": 0})
+            book = _book(isbn)
+            return self._send(200, {"kind": "books#volumes", "totalItems": 1, "items": [{
+                "volumeInfo": {
+                    "title": book["title"],
+                    "authors": [book["author"]],
+                    "publisher": book["publisher"],
+                    "publishedDate": f"{book['year']}-01-01",
+                    "description": book["description"],
+                    "imageLinks": {"thumbnail": f"{self._base_url()}/covers/{isbn}.jpg"},
+                },
+            }]})
+
+        if url.path == "/api/books":
+            key = query.get("bibkeys", [""])[0]
+            isbn = key.removeprefix("ISBN:")
+            if not isbn:
+                return self._send(200, {})
+            book = _book(isbn)
+            return self._send(200, {key: {
+                "title": book["title"],
+                "authors": [{"name": book["author"]}],
+                "publishers": [{"name": book["publisher"]}],
+                "publish_date": str(book["year"]),
+                "cover": {"medium": f"{self._base_url()}/covers/{isbn}.jpg"},
+                "identifiers": {"openlibrary": [f"OL{isbn}M"]},
+            }})
+
+        match = re.fullmatch(r"/books/OL(\d+)M\.json", url.path)
+        if match:
+            return self._send(200, {"description": {"type": "/type/text", "value": _book(match.group(1))["description"]}})
+
+        match = re.fullmatch(r"/covers/(\d+)\.jpg", url.path)
+        if match:
+            return self._send(200, _cover(match.group(1)), "image/jpeg")
+
+        self._send(404, {"error": "not found"})
+
+def start_stub_server(host="127.0.0.1", port=0, latency_ms=0.0):
+    """
+    Avvia il server in un thread daemon.
+
+    Returns:
+        Tupla (server, base_url); server.shutdown() lo ferma
+    """
+    handler = type("StubHandler", (StubHandler,), {"latency": latency_ms / 1000})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Emula Google Books e Open Library in locale")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latenza aggiunta ad ogni risposta")
+    args = parser.parse_args(argv)
+
+    server, base_url = start_stub_server(args.host, args.port, args.latency_ms)
+    print(f"Provider emulati su {base_url}", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+Costruisce l'indice ISBN-13 locale dai dump di Open Library
+(https://openlibrary.org/developers/dumps), usato come primo provider di
+metadati quando OPEN_LIBRARY_DUMP_INDEX punta al file generato.
+
+Uso:
+    python build_openlibrary_index.py --editions ol_dump_editions.txt.gz \\
+        [--works ol_dump_works.txt.gz] [--authors ol_dump_authors.txt.gz] \\
+        --output openlibrary_isbn.idx
+
+Senza il dump degli autori il nome dell'autore viene preso dal campo
+by_statement delle edizioni, quando presente.
+"""
+import argparse
+import logging
+import time
+
+from backend.services.openlibrary_dump import OpenLibraryDumpIndex, build_index
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Costruisce l'indice ISBN dai dump di Open Library")
+    parser.add_argument("--editions", action="append", required=True, help="Dump delle edizioni (ripetibile)")
+    parser.add_argument("--works", action="append", default=[], help="Dump delle opere, per le descrizioni")
+    parser.add_argument("--authors", action="append", default=[], help="Dump degli autori, per i nomi")
+    parser.add_argument("--output", required=True, help="File dell'indice da creare")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    stats = build_index(args.editions, args.output, works=args.works, authors=args.authors)
+    index = OpenLibraryDumpIndex(args.output)
+    print(f"Indice {args.output}: {len(index)} ISBN da {stats['editions']} edizioni "
+          f"({stats['duplicates']} duplicati ignorati) in {time.perf_counter() - start:.1f} s")
+    index.close()
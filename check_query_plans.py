@@ -0,0 +1,207 @@
+"""
+Verifica che le query CRUD sui filtri più frequenti usino gli indici previsti.
+
+Crea un database SQLite temporaneo aggiornato all'ultima migrazione, esegue le
+funzioni CRUD registrando le query su books e loans e ne analizza
+EXPLAIN QUERY PLAN. Per ogni caso controlla che gli indici attesi compaiano nel
+piano e che nessuna query scandisca per intero books o loans.
+
+Esce con codice 1 se trova una regressione, così può essere usato in CI.
+
+Uso:
+    python check_query_plans.py [-v]
+"""
+import os
+import sys
+import tempfile
+
+# Il database temporaneo va configurato prima di importare il backend
+_tmpdir = tempfile.mkdtemp(prefix="query-plans-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'plans.db')}"
+
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from sqlalchemy import event
+
+from init_db import upgrade_database
+from backend import crud
+from backend.database import engine, SessionLocal
+from backend.models import Book, Loan, User
+from backend.schemas import BookCreate, LoanCreate
+
+# Tabelle che non devono mai essere scandite per intero
+HOT_TABLES = ("books", "loans")
+
+def seed(db):
+    """Due utenti, qualche libro e un prestito attivo."""
+    owner = User(name="Owner", email="owner@example.com", hashed_password="x", created_at=datetime.utcnow())
+    borrower = User(name="Borrower", email="borrower@example.com", hashed_password="x", created_at=datetime.utcnow())
+    db.add_all([owner, borrower])
+    db.flush()
+
+    books = [
+        Book(title=f"Libro {i}", author="Autore", isbn=f"97800000000{i:02d}", owner_id=owner.id)
+        for i in range(20)
+    ]
+    db.add_all(books)
+    db.flush()
+
+    db.add(Loan(book_id=books[0].id, user_id=borrower.id, loan_date=datetime.utcnow(), return_date=None))
+    db.add(Loan(book_id=books[1].id, user_id=borrower.id, loan_date=datetime.utcnow(),
+                return_date=datetime.utcnow() + timedelta(days=30)))
+    db.commit()
+    return owner.id, borrower.id, [book.id for book in books]
+
+def expect_http_error(fn):
+    """Esegue fn, che deve fallire con HTTPException (es. controllo duplicati)."""
+    def run():
+        try:
+            fn()
+        except HTTPException:
+            return
+        raise AssertionError("HTTPException attesa")
+    return run
+
+def check_users_summary(db, owner_id, borrower_id):
+    """get_users_summary, verificando i conteggi: il proprietario non ha prestiti."""
+    summaries = {summary["id"]: summary for summary in crud.user.get_users_summary(db)}
+    owner, borrower = summaries[owner_id], summaries[borrower_id]
+    counts = (owner["total_loans"], owner["active_loans"], owner["overdue_loans"], owner["active_loan_titles"])
+    assert counts == (0, 0, 0, []), f"utente senza prestiti con conteggi {counts}"
+    assert borrower["total_loans"] == 2 and borrower["active_loans"] == 2, \
+        f"conteggi del lettore errati: {borrower['total_loans']} totali, {borrower['active_loans']} attivi"
+
+def build_cases(db, owner_id, borrower_id, book_ids):
+    """Casi da verificare: (descrizione, funzione, indici attesi nel piano)."""
+    lent_book_id = book_ids[0]
+    return [
+        ("create_book: duplicato per ISBN",
+         expect_http_error(lambda: crud.book.create_book(
+             db, BookCreate(isbn="9780000000005", owner_id=owner_id))),
+         {"ix_books_owner_id_isbn"}),
+        ("create_book: duplicato per titolo",
+         expect_http_error(lambda: crud.book.create_book(
+             db, BookCreate(isbn="", title="Libro 5", owner_id=owner_id))),
+         {"ix_books_owner_id_title"}),
+        ("import_books: ISBN già presenti",
+         lambda: list(crud.book.import_books(db, owner_id, ["9780000000005"])),
+         {"ix_books_owner_id_isbn"}),
+        ("get_visible_books",
+         lambda: crud.book.get_visible_books(db, borrower_id),
+         {"ix_loans_user_id_return_date"}),
+        ("search_books: disponibili",
+         lambda: crud.book.search_books(db, owner_id, filter_by="available"),
+         {"ix_loans_book_id_return_date"}),
+        ("search_books: in prestito",
+         lambda: crud.book.search_books(db, owner_id, filter_by="loaned"),
+         {"ix_loans_book_id_return_date"}),
+        ("books_to_refresh_query",
+         lambda: crud.book.books_to_refresh_query(db, owner_id).all(),
+         {"ix_books_owner_id_title"}),
+        ("delete_book: prestiti attivi",
+         expect_http_error(lambda: crud.book.delete_book(db, lent_book_id)),
+         {"ix_loans_book_id_return_date"}),
+        ("bulk_delete_books: prestiti attivi",
+         lambda: crud.book.bulk_delete_books(db, [lent_book_id], owner_id),
+         {"ix_loans_book_id_return_date"}),
+        ("create_loan: libro già in prestito",
+         expect_http_error(lambda: crud.loan.create_loan(
+             db, LoanCreate(book_id=book_ids[1], user_id=borrower_id))),
+         {"ix_loans_book_id_return_date"}),
+        ("get_active_loans",
+         lambda: crud.loan.get_active_loans(db, book_ids),
+         {"ix_loans_book_id_return_date"}),
+        ("get_loan_ledger: tutti",
+         lambda: crud.loan.get_loan_ledger(db, owner_id),
+         {"ix_loans_book_id_return_date"}),
+        ("get_loan_ledger: prestati, in corso",
+         lambda: crud.loan.get_loan_ledger(db, owner_id, role="lender", status="active"),
+         {"ix_loans_book_id_return_date"}),
+        ("get_loan_ledger: presi in prestito",
+         lambda: crud.loan.get_loan_ledger(db, borrower_id, role="borrower"),
+         {"ix_loans_user_id_return_date"}),
+        ("get_users_summary",
+         lambda: check_users_summary(db, owner_id, borrower_id),
+         {"ix_loans_user_id_return_date"}),
+        ("delete_user: prestiti attivi",
+         expect_http_error(lambda: crud.user.delete_user(db, borrower_id)),
+         {"ix_loans_user_id_return_date"}),
+        # Ultimo caso: elimina davvero (con commit) alcuni libri senza prestiti
+        ("bulk_delete_books: eliminazione",
+         lambda: crud.book.bulk_delete_books(db, book_ids[10:15] + [10**6], owner_id),
+         {"ix_loans_book_id_return_date"}),
+    ]
+
+def capture_statements(fn):
+    """Esegue fn e restituisce le query (sql, parametri) che toccano books o loans."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        sql = statement.lstrip().upper()
+        if executemany or not sql.startswith(("SELECT", "UPDATE", "DELETE", "WITH")):
+            return
+        if any(table in statement for table in HOT_TABLES):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return statements
+
+def explain(statement, parameters):
+    """Righe di EXPLAIN QUERY PLAN della query."""
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    return [row[-1] for row in rows]
+
+def full_scans(plan):
+    """Scansioni complete (senza indice) delle tabelle da proteggere."""
+    return [
+        line for line in plan
+        if line.startswith("SCAN ") and "USING" not in line
+        and line.split()[1] in HOT_TABLES
+    ]
+
+def main(verbose=False):
+    upgrade_database()
+    db = SessionLocal()
+    failures = []
+    try:
+        owner_id, borrower_id, book_ids = seed(db)
+
+        for description, fn, expected in build_cases(db, owner_id, borrower_id, book_ids):
+            try:
+                statements = capture_statements(fn)
+                errors = []
+            except AssertionError as e:
+                statements, errors = [], [f"risultato errato: {e}"]
+            db.rollback()
+
+            plans = [explain(statement, parameters) for statement, parameters in statements]
+            plan_text = "\n".join(line for plan in plans for line in plan)
+
+            problems = errors + [f"indice {index} non usato" for index in sorted(expected) if index not in plan_text]
+            problems += [f"scansione completa: {line}" for plan in plans for line in full_scans(plan)]
+
+            print(f"{'OK  ' if not problems else 'FAIL'} {description}")
+            if problems or verbose:
+                for (statement, _), plan in zip(statements, plans):
+                    print(f"    {' '.join(statement.split())[:120]}")
+                    for line in plan:
+                        print(f"        {line}")
+            for problem in problems:
+                print(f"    -> {problem}")
+                failures.append((description, problem))
+    finally:
+        db.close()
+
+    if failures:
+        print(f"\n{len(failures)} problemi nei piani di esecuzione")
+        return 1
+    print("\nTutte le query usano gli indici previsti")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(verbose="-v" in sys.argv))
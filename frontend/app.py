@@ -8,7 +8,7 @@ st.set_page_config(
 
 # Ora importa tutto il resto
 from utils.state import initialize_state
-from utils.api import invalidate_caches, check_auth_status, is_admin, load_auth_from_cookie
+from utils.api import invalidate, get_current_user_id, check_auth_status, is_admin, load_auth_from_cookie
 from utils.export import export_all_data
 from views.book_grid import show_book_grid
 from views.book_detail import show_book_detail
@@ -46,12 +46,10 @@ with st.sidebar:
         st.subheader("Libri")
         if st.sidebar.button("📚 I miei Libri", use_container_width=True):
             st.session_state.view = 'grid'
-            invalidate_caches()
             st.rerun()
         
         if st.sidebar.button("📋 Prestiti", use_container_width=True):
             st.session_state.view = 'loans'
-            invalidate_caches()
             st.rerun()
         
         if st.sidebar.button("➕ Aggiungi Libro", use_container_width=True):
@@ -60,27 +58,42 @@ with st.sidebar:
         
         # Bottone per aggiornamento metadati libri
         if st.sidebar.button("🔄 Aggiorna Metadati Libri", use_container_width=True):
-            from utils.api import refresh_missing_metadata
+            import time
+            from utils.api import refresh_missing_metadata, fetch_job
             
             # Usa un placeholder nella sidebar invece dello spinner
             status_placeholder = st.sidebar.empty()
             status_placeholder.info("Aggiornamento in corso...")
             
-            # Esegui l'operazione - passando False per aggiornare TUTTI i libri dell'utente
+            # Avvia il job - passando False per aggiornare TUTTI i libri dell'utente
             result = refresh_missing_metadata(only_missing=False)
             
+            if result["success"]:
+                # Il job gira in background: mostra il progresso interrogando il backend
+                data = result["data"]
+                progress_bar = st.sidebar.progress(0.0)
+                while data["status"] in ("queued", "running"):
+                    time.sleep(1)
+                    data = fetch_job(data["id"]) or data
+                    if data["total"]:
+                        progress_bar.progress(data["processed"] / data["total"])
+                        status_placeholder.info(f"Aggiornamento in corso... {data['processed']}/{data['total']}")
+                progress_bar.empty()
+            
             # Sostituisci il messaggio con il risultato
             status_placeholder.empty()
             
-            if result["success"]:
-                data = result["data"]
+            if result["success"] and data["status"] == "failed":
+                st.sidebar.error(data.get("message") or "Errore durante l'aggiornamento")
+            elif result["success"]:
+                # I metadati aggiornati riguardano i libri dell'utente
+                invalidate("books", user_ids=[get_current_user_id()])
                 st.sidebar.success(f"Aggiornamento completato: {data['updated']} libri aggiornati, {data['failed']} non aggiornati")
                 
                 # Aggiungi pulsante per visualizzare dettagli
                 if st.sidebar.button("Vedi dettagli", key="show_metadata_details"):
                     st.session_state.metadata_update_result = data
                     st.session_state.view = 'grid'  # Resta nella vista grid ma mostrerà i dettagli
-                    invalidate_caches()
                     st.rerun()
             else:
                 st.sidebar.error(f"Errore: {result['error']}")
@@ -124,7 +137,6 @@ with st.sidebar:
             delete_auth_cookie()
             # Imposta la vista su login e ricarica la pagina
             st.session_state.view = 'login'
-            invalidate_caches()
             st.rerun()
     else:
         # Utente non autenticato
@@ -7,7 +7,7 @@ def render_book_card(book, show_button=True, additional_info=None):
     with st.container():
         # Mostra la copertina se disponibile
         if book.get('has_cover', False):
-            st.image(get_book_cover_url(book['id']), width=150)
+            st.image(get_book_cover_url(book['id'], size="thumb", version=book.get('cover_hash')), width=150)
         else:
             # Copertina placeholder
             st.markdown(
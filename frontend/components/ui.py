@@ -4,7 +4,9 @@ from utils.api import get_book_cover_url
 def render_book_cover(book, width=150):
     """Renderizza la copertina di un libro"""
     if book.get('has_cover', False):
-        st.image(get_book_cover_url(book['id']), width=width)
+        # La miniatura basta fino alla larghezza della griglia
+        size = "thumb" if width <= 160 else "detail"
+        st.image(get_book_cover_url(book['id'], size=size, version=book.get('cover_hash')), width=width)
     else:
         # Copertina placeholder
         st.markdown(
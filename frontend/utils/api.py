@@ -1,11 +1,12 @@
 import os
 import streamlit as st
 import requests
-import base64
 import datetime
 import json
 import extra_streamlit_components as stx
 from streamlit_cookies_manager import EncryptedCookieManager
+from utils.cover_cache import fetch_cover, invalidate_book_covers, prefetch_covers
+from utils.data_cache import book_tag, bump, cache_key
 
 # Determina API_URL dinamicamente in base all'ambiente
 def get_api_url():
@@ -109,14 +110,25 @@ def get_auth_header():
         return {"Authorization": f"Bearer {st.session_state.auth_token}"}
     return {}
 
-# Modifica la decorazione della funzione per controllare problemi di cache
-@st.cache_data(ttl=60)  # Ridotta a 1 minuto per debug
-def fetch_books(limit=10000):  # Imposta un limite molto alto
-    """Ottiene la lista dei libri con cache TTL di 1 minuto"""
-    headers = get_auth_header()
+# Le funzioni in cache ricevono la chiave (utente, versioni dei tag) da
+# utils/data_cache.py: ogni utente ha le proprie voci e una modifica invalida
+# solo i tag interessati (vedi invalidate). L'header di autenticazione ha il
+# prefisso _ per restare fuori dalla chiave di cache.
+CACHE_MAX_ENTRIES = int(os.environ.get("FRONTEND_CACHE_MAX_ENTRIES", "1000"))
+
+# Risorse che l'API restituisce per intero a chiunque (GET /loans/, GET /users/),
+# amministratori compresi: una modifica va invalidata per tutti gli utenti,
+# non solo per quelli coinvolti
+SHARED_RESOURCES = {"loans", "users"}
+
+def _cache_key(*tags):
+    return cache_key(get_current_user_id(), *tags)
+
+@st.cache_data(ttl=60, max_entries=CACHE_MAX_ENTRIES)
+def _fetch_books(key, limit, _headers):
     try:
         # Passa il parametro limit nella query string
-        response = requests.get(f"{API_URL}/books/", headers=headers, params={"limit": limit})
+        response = requests.get(f"{API_URL}/books/", headers=_headers, params={"limit": limit})
         if response.status_code == 200:
             data = response.json()
             # Aggiungi debug info
@@ -129,46 +141,117 @@ def fetch_books(limit=10000):  # Imposta un limite molto alto
         print(f"Error connecting to API: {str(e)}")
         return []
 
-@st.cache_data(ttl=300)
+def fetch_books(limit=10000):  # Imposta un limite molto alto
+    """Ottiene la lista dei libri dell'utente con cache TTL di 1 minuto"""
+    return _fetch_books(_cache_key("books"), limit, get_auth_header())
+
+@st.cache_data(ttl=300, max_entries=CACHE_MAX_ENTRIES)
+def _fetch_book(key, book_id, _headers):
+    response = requests.get(f"{API_URL}/books/{book_id}", headers=_headers)
+    return response.json() if response.status_code == 200 else None
+
 def fetch_book(book_id):
     """Ottiene un singolo libro con cache TTL di 5 minuti"""
-    headers = get_auth_header()
-    response = requests.get(f"{API_URL}/books/{book_id}", headers=headers)
-    return response.json() if response.status_code == 200 else None
+    return _fetch_book(_cache_key("books", book_tag(book_id)), book_id, get_auth_header())
+
+@st.cache_data(ttl=300, max_entries=CACHE_MAX_ENTRIES)
+def _fetch_users(key, _headers):
+    response = requests.get(f"{API_URL}/users/", headers=_headers)
+    return response.json() if response.status_code == 200 else []
 
-@st.cache_data(ttl=300)
 def fetch_users():
     """Ottiene la lista degli utenti con cache TTL di 5 minuti"""
-    headers = get_auth_header()
-    response = requests.get(f"{API_URL}/users/", headers=headers)
+    return _fetch_users(_cache_key("users"), get_auth_header())
+
+@st.cache_data(ttl=60, max_entries=CACHE_MAX_ENTRIES)
+def _fetch_loans(key, _headers):
+    response = requests.get(f"{API_URL}/loans/", headers=_headers)
     return response.json() if response.status_code == 200 else []
 
-@st.cache_data(ttl=60)
 def fetch_loans():
     """Ottiene la lista dei prestiti con cache TTL di 1 minuto"""
-    headers = get_auth_header()
-    response = requests.get(f"{API_URL}/loans/", headers=headers)
-    return response.json() if response.status_code == 200 else []
+    return _fetch_loans(_cache_key("loans"), get_auth_header())
+
+def fetch_users_summary(after_id=None, limit=50):
+    """
+    Ottiene una pagina di utenti con il riepilogo dei prestiti (GET /users/summary).
 
-# Cache per le immagini delle copertine
-@st.cache_data(ttl=300)
-def get_book_cover(book_id):
-    """Carica e memorizza nella cache l'immagine della copertina"""
+    Returns:
+        Tupla (utenti della pagina, after_id per la pagina successiva o None)
+    """
+    params = {"limit": limit}
+    if after_id is not None:
+        params["after_id"] = after_id
     try:
-        response = requests.get(f"{API_URL}/books/{book_id}/cover")
+        response = requests.get(f"{API_URL}/users/summary", headers=get_auth_header(), params=params)
         if response.status_code == 200:
-            img_data = base64.b64encode(response.content).decode('utf-8')
-            return f"data:image/jpeg;base64,{img_data}"
-        return None
-    except Exception:
-        return None
+            next_after_id = response.headers.get("X-Next-After-Id")
+            return response.json(), int(next_after_id) if next_after_id else None
+        print(f"Error fetching users summary: {response.status_code}")
+    except Exception as e:
+        print(f"Error connecting to API: {str(e)}")
+    return [], None
+
+def fetch_loan_ledger(role="all", status="all", date_from=None, date_to=None, before_id=None, limit=50):
+    """
+    Ottiene una pagina del registro prestiti dell'utente corrente (GET /loans/ledger).
+
+    Returns:
+        Tupla (prestiti della pagina, before_id per la pagina successiva o None)
+    """
+    params = {"role": role, "status": status, "limit": limit}
+    if date_from:
+        params["date_from"] = date_from.isoformat()
+    if date_to:
+        params["date_to"] = date_to.isoformat()
+    if before_id is not None:
+        params["before_id"] = before_id
+    try:
+        response = requests.get(f"{API_URL}/loans/ledger", headers=get_auth_header(), params=params)
+        if response.status_code == 200:
+            next_before_id = response.headers.get("X-Next-Before-Id")
+            return response.json(), int(next_before_id) if next_before_id else None
+        print(f"Error fetching loan ledger: {response.status_code}")
+    except Exception as e:
+        print(f"Error connecting to API: {str(e)}")
+    return [], None
+
+# URL del backend raggiungibile dal browser (es. dietro un reverse proxy).
+# Se impostato, le copertine vengono caricate direttamente dal browser, che le
+# mette in cache grazie a ETag e Cache-Control; altrimenti passano dal server
+# Streamlit con una cache di byte limitata (utils/cover_cache.py).
+PUBLIC_API_URL = os.environ.get("PUBLIC_API_URL", "").rstrip("/")
+
+def get_book_cover(book_id, size="detail", version=None):
+    """
+    Restituisce i byte della copertina (o None), usando la cache delle copertine.
+    
+    version è il cover_hash del libro: una copertina nuova ha una chiave
+    di cache diversa e viene scaricata subito.
+    """
+    return fetch_cover(API_URL, book_id, size, version)
 
-def get_book_cover_url(book_id):
-    """Restituisce l'URL della copertina o l'immagine cached"""
-    cover = get_book_cover(book_id)
+def prefetch_book_covers(books, size="thumb"):
+    """
+    Scarica con una sola richiesta (per blocchi di 200) le copertine dei
+    libri da mostrare. Non serve se le copertine sono caricate dal browser.
+    """
+    if PUBLIC_API_URL:
+        return 0
+    return prefetch_covers(API_URL, books, size, headers=get_auth_header())
+
+def get_book_cover_url(book_id, size="detail", version=None):
+    """
+    Restituisce la sorgente dell'immagine della copertina per st.image:
+    l'URL pubblico se disponibile, altrimenti i byte dalla cache.
+    """
+    params = f"size={size}" + (f"&v={version}" if version else "")
+    if PUBLIC_API_URL:
+        return f"{PUBLIC_API_URL}/books/{book_id}/cover?{params}"
+    cover = get_book_cover(book_id, size, version)
     if cover:
         return cover
-    return f"{API_URL}/books/{book_id}/cover"
+    return f"{API_URL}/books/{book_id}/cover?{params}"
 
 def get_user_name(user_id):
     """Recupera il nome dell'utente dato l'ID"""
@@ -180,62 +263,50 @@ def get_user_name(user_id):
             return user.get('name', 'Sconosciuto')
     return f"Utente ID: {user_id}"
 
-def get_active_loans_for_book(book_id):
-    """Recupera i prestiti attivi per un libro specifico"""
-    # Forza refresh dei prestiti
-    fetch_loans.clear()
-    loans = fetch_loans()
-    
-    # Converti book_id in stringa per confronto sicuro
-    book_id_str = str(book_id)
-    
-    # Trova il prestito più recente per questo libro
-    latest_loan = None
-    for loan in loans:
-        if str(loan.get('book_id')) == book_id_str:
-            if latest_loan is None or loan.get('id', 0) > latest_loan.get('id', 0):
-                latest_loan = loan
-    
-    # Se non c'è nessun prestito, il libro è disponibile
-    if latest_loan is None:
-        return []
-    
-    # Un libro è in prestito attivo SE:
-    # 1. Non ha data di restituzione
-    # 2. La data di restituzione è nel futuro
-    
-    # Caso 1: Nessuna data di restituzione
-    if latest_loan.get('return_date') is None:
-        return [latest_loan]
-    
-    # Caso 2: La data di restituzione è nel futuro
-    now = datetime.datetime.now(datetime.timezone.utc)
-    
-    # Converti la data di stringa a datetime
+def get_book_loan_status(book_id):
+    """
+    Recupera il prestito in corso di un libro (GET /books/{id}/loan-status).
+
+    Non usa cache: serve proprio per avere lo stato aggiornato.
+
+    Returns:
+        Il prestito in corso (id, user_id, borrower_name, loan_date,
+        return_date) o None se il libro è disponibile
+    """
     try:
-        return_date_str = latest_loan.get('return_date')
-        
-        # Normalizza formato data
-        if return_date_str.endswith('Z'):
-            return_date_str = return_date_str.replace('Z', '+00:00')
-        elif '+' not in return_date_str and 'T' in return_date_str:
-            return_date_str = f"{return_date_str}+00:00"
-            
-        return_date = datetime.datetime.fromisoformat(return_date_str)
-        
-        if return_date > now:
-            return [latest_loan]
-        else:
-            # Data nel passato, libro disponibile
-            return []
+        response = requests.get(f"{API_URL}/books/{book_id}/loan-status", headers=get_auth_header())
+        if response.status_code == 200:
+            return response.json().get("active_loan")
+        print(f"Error fetching loan status: {response.status_code}")
     except Exception as e:
-        # In caso di errore nella conversione, mostriamo il libro disponibile
-        print(f"Errore nel parsing della data di restituzione: {e}")
-        return []
+        print(f"Error connecting to API: {str(e)}")
+    return None
+
+def invalidate(*resources, user_ids=None, book_ids=()):
+    """
+    Invalida i dati in cache dopo una modifica.
+
+    Args:
+        resources: Risorse modificate ("books", "users", "loans")
+        user_ids: Utenti che vedono la modifica (es. proprietario e chi ha il
+                  libro in prestito); None per tutti gli utenti. Ignorato per
+                  le SHARED_RESOURCES, sempre invalidate per tutti
+        book_ids: Libri modificati, di cui invalidare anche il dettaglio
+    """
+    for resource in resources:
+        bump(resource, None if resource in SHARED_RESOURCES else user_ids)
+    for book_id in book_ids:
+        bump(book_tag(book_id))
 
-def invalidate_caches():
-    """Pulisce tutte le cache"""
-    st.cache_data.clear()
+def book_user_ids(book):
+    """Utenti che vedono un libro: il proprietario e chi lo ha in prestito."""
+    active_loan = book.get("active_loan") or {}
+    return [book.get("owner_id"), active_loan.get("user_id")]
+
+def refresh_caches():
+    """Riscarica tutti i dati dell'utente corrente, senza toccare le altre sessioni."""
+    for resource in ("books", "users", "loans"):
+        bump(resource, [get_current_user_id()])
 
 # Aggiungi funzioni di autenticazione
 def check_auth_status():
@@ -256,11 +327,14 @@ def is_admin():
 
 def refresh_missing_metadata(only_missing=False):
     """
-    Richiede l'aggiornamento dei metadati per libri.
+    Avvia in background l'aggiornamento dei metadati per libri.
     
     Args:
         only_missing: Se True, aggiorna solo libri con informazioni mancanti
                      Se False, aggiorna tutti i libri di proprietà dell'utente
+    
+    Returns:
+        dict: Con success=True, data contiene il job creato (vedi fetch_job)
     """
     headers = get_auth_header()
     try:
@@ -271,7 +345,7 @@ def refresh_missing_metadata(only_missing=False):
             params=params
         )
         
-        if response.status_code == 200:
+        if response.status_code in (200, 202):
             return {"success": True, "data": response.json()}
         else:
             error_detail = response.json().get("detail", "Errore sconosciuto")
@@ -279,6 +353,16 @@ def refresh_missing_metadata(only_missing=False):
     except Exception as e:
         return {"success": False, "error": str(e)}
 
+def fetch_job(job_id):
+    """Ottiene stato, progresso ed esiti di un job in background"""
+    headers = get_auth_header()
+    try:
+        response = requests.get(f"{API_URL}/jobs/{job_id}", headers=headers)
+        return response.json() if response.status_code == 200 else None
+    except Exception as e:
+        print(f"Error connecting to API: {str(e)}")
+        return None
+
 def search_books(query="", filter_by="all", filter_author="", filter_publisher="", filter_year=""):
     """
     Cerca libri nel database in base a filtri e una query testuale.
@@ -342,8 +426,8 @@ def upload_book_cover(book_id, image_data):
         )
         
         if response.status_code == 200:
-            # Pulisci la cache delle copertine
-            get_book_cover.clear()
+            # Pulisci la cache delle copertine del libro
+            invalidate_book_covers(book_id)
             return {"success": True}
         else:
             error_detail = response.json().get("detail", "Errore sconosciuto")
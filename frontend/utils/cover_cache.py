@@ -0,0 +1,188 @@
+import json
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+# Budget in byte della cache delle copertine (condivisa da tutte le sessioni del processo)
+COVER_CACHE_MAX_BYTES = int(os.environ.get("COVER_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Le copertine senza versione (cover_hash) vengono rivalidate dopo questo intervallo
+COVER_REVALIDATE_SECONDS = float(os.environ.get("COVER_REVALIDATE_SECONDS", "300"))
+# Copertine richieste al massimo per ogni POST /books/covers:batch
+COVER_BATCH_SIZE = 200
+
+class CoverCache:
+    """
+    Cache LRU delle copertine con un budget massimo in byte.
+
+    Conserva i byte dell'immagine così come arrivano dal backend, insieme a
+    media type ed ETag. Le voci con una versione (cover_hash) non scadono mai:
+    il contenuto di un URL versionato non cambia. Le altre vengono rivalidate
+    con If-None-Match, che costa una risposta 304 senza corpo.
+    """
+
+    def __init__(self, max_bytes=COVER_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, data, media_type, etag=None):
+        entry = {"data": data, "media_type": media_type, "etag": etag, "checked_at": time.monotonic()}
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= len(old["data"])
+            # Un'immagine più grande dell'intero budget non viene salvata
+            if len(data) > self.max_bytes:
+                return entry
+            self._entries[key] = entry
+            self.current_bytes += len(data)
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= len(evicted["data"])
+                self.evictions += 1
+        return entry
+
+    def touch(self, key):
+        """Segna una voce come appena rivalidata."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry["checked_at"] = time.monotonic()
+
+    def invalidate(self, predicate):
+        """Elimina le voci la cui chiave soddisfa predicate."""
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                self.current_bytes -= len(self._entries.pop(key)["data"])
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+_cache = CoverCache()
+_session = requests.Session()
+
+def _cache_key(book_id, size, version):
+    # Le copertine versionate sono indicizzate per hash: libri con la stessa
+    # copertina condividono la stessa voce
+    if version:
+        return ("hash", version, size)
+    return ("book", book_id, size)
+
+def fetch_cover(api_url, book_id, size="detail", version=None):
+    """
+    Restituisce i byte della copertina passando dalla cache, o None se il
+    libro non ha copertina.
+    """
+    key = _cache_key(book_id, size, version)
+    entry = _cache.get(key)
+    if entry is not None:
+        fresh = version is not None or time.monotonic() - entry["checked_at"] < COVER_REVALIDATE_SECONDS
+        if fresh:
+            return entry["data"]
+
+    params = {"size": size}
+    if version:
+        params["v"] = version
+    headers = {"If-None-Match": entry["etag"]} if entry and entry["etag"] else {}
+
+    try:
+        response = _session.get(f"{api_url}/books/{book_id}/cover", params=params, headers=headers, timeout=10)
+    except requests.RequestException:
+        # Backend non raggiungibile: meglio una copertina vecchia che nessuna
+        return entry["data"] if entry else None
+
+    if response.status_code == 304 and entry is not None:
+        _cache.touch(key)
+        return entry["data"]
+    if response.status_code != 200:
+        return None
+
+    media_type = response.headers.get("content-type", "image/jpeg")
+    _cache.put(key, response.content, media_type, response.headers.get("etag"))
+    return response.content
+
+def decode_cover_bundle(content):
+    """
+    Decodifica la risposta di POST /books/covers:batch (mode=bundle).
+
+    Returns:
+        Tupla (indice, immagini) dove immagini è una memoryview da cui
+        estrarre ogni copertina con offset e length dell'indice
+    """
+    (index_length,) = struct.unpack(">I", content[:4])
+    index = json.loads(content[4:4 + index_length])
+    return index, memoryview(content)[4 + index_length:]
+
+def prefetch_covers(api_url, books, size="thumb", headers=None):
+    """
+    Carica in cache con richieste batch le copertine versionate non ancora
+    presenti, così che il rendering della griglia non richieda una chiamata
+    al backend per libro.
+
+    Returns:
+        Numero di copertine scaricate
+    """
+    wanted = {}
+    for book in books:
+        version = book.get('cover_hash')
+        if book.get('has_cover') and version and _cache_key(book['id'], size, version) not in _cache:
+            wanted.setdefault(version, book['id'])
+
+    book_ids = list(wanted.values())
+    loaded = 0
+    for start in range(0, len(book_ids), COVER_BATCH_SIZE):
+        try:
+            response = _session.post(
+                f"{api_url}/books/covers:batch",
+                json={"ids": book_ids[start:start + COVER_BATCH_SIZE], "size": size},
+                headers=headers,
+                timeout=30,
+            )
+        except requests.RequestException:
+            return loaded
+        if response.status_code != 200:
+            return loaded
+
+        index, blobs = decode_cover_bundle(response.content)
+        for entry in index["covers"]:
+            data = bytes(blobs[entry["offset"]:entry["offset"] + entry["length"]])
+            _cache.put(_cache_key(entry["book_id"], size, entry["cover_hash"]), data, entry["media_type"], entry["etag"])
+            loaded += 1
+    return loaded
+
+def invalidate_book_covers(book_id):
+    """Elimina dalla cache le copertine non versionate di un libro."""
+    _cache.invalidate(lambda key: key[0] == "book" and key[1] == book_id)
+
+def get_cover_cache_stats():
+    return _cache.stats()
@@ -0,0 +1,47 @@
+import threading
+from collections import defaultdict
+
+class VersionTags:
+    """
+    Versioni delle risorse in cache, condivise da tutte le sessioni del processo.
+
+    Ogni tag (es. "books", "users", "book:42") ha una versione globale e una
+    per utente. Le funzioni in cache usano le versioni come parte della
+    chiave: dopo una modifica basta incrementare i tag interessati e solo le
+    voci che dipendono da quei tag vengono riscaricate, senza svuotare
+    st.cache_data per tutte le sessioni.
+    """
+
+    def __init__(self):
+        self._global = defaultdict(int)
+        self._per_user = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def versions(self, user_id, *tags):
+        """Versioni (globale, dell'utente) dei tag, da usare nella chiave di cache."""
+        with self._lock:
+            return tuple((self._global[tag], self._per_user[(tag, user_id)]) for tag in tags)
+
+    def bump(self, tag, user_ids=None):
+        """
+        Invalida un tag per gli utenti indicati, o per tutti se user_ids è None.
+        """
+        with self._lock:
+            if user_ids is None:
+                self._global[tag] += 1
+            else:
+                for user_id in set(user_ids):
+                    if user_id is not None:
+                        self._per_user[(tag, user_id)] += 1
+
+_tags = VersionTags()
+
+def cache_key(user_id, *tags):
+    """Chiave di cache per i dati dell'utente che dipendono dai tag indicati."""
+    return (user_id, _tags.versions(user_id, *tags))
+
+def bump(tag, user_ids=None):
+    _tags.bump(tag, user_ids)
+
+def book_tag(book_id):
+    return f"book:{book_id}"
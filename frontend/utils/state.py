@@ -29,14 +29,9 @@ def set_state(view_name, **kwargs):
         st.session_state[key] = value
 
 def go_to_home():
-    """Funzione callback per tornare alla home e pulire la cache"""
-    from utils.api import invalidate_caches
-    
+    """Funzione callback per tornare alla home"""
     st.session_state.view = 'grid'
     st.session_state.selected_book = None
     st.session_state.selected_book_for_loan = None
     if 'loan_completed' in st.session_state:
-        del st.session_state.loan_completed
-        
-    # Pulisci le cache
-    invalidate_caches()
\ No newline at end of file
+        del st.session_state.loan_completed
\ No newline at end of file
@@ -1,7 +1,7 @@
 import streamlit as st
 import requests
-import time
-from utils.api import get_book_cover_url, invalidate_caches
+import json
+from utils.api import get_book_cover_url, invalidate
 from utils.state import set_state
 from utils.api import get_auth_header, get_user_name, get_current_user_id
 
@@ -60,9 +60,6 @@ def show_add_book_page():
             else:
                 with st.spinner("Recupero informazioni dal database Google Books..."):
                     try:
-                        # Pulizia cache prima della richiesta
-                        invalidate_caches()
-                        
                         # MODIFICA: Ottieni gli headers di autenticazione
                         headers = get_auth_header()
                         
@@ -75,13 +72,14 @@ def show_add_book_page():
                         
                         if response.status_code == 200:
                             book = response.json()
+                            invalidate("books", user_ids=[book.get("owner_id")])
                             
                             # Mostra dettagli del libro aggiunto
                             col1, col2 = st.columns([1, 2])
                             
                             with col1:
                                 if book.get('has_cover', False):
-                                    st.image(get_book_cover_url(book['id']), width=150)
+                                    st.image(get_book_cover_url(book['id'], size="thumb", version=book.get('cover_hash')), width=150)
                                 else:
                                     st.markdown(
                                         """
@@ -168,61 +166,64 @@ def show_add_book_page():
                 # Ottieni gli headers di autenticazione
                 headers = get_auth_header()
                 
-                # Importa ciascun ISBN
-                for i, isbn in enumerate(isbn_items):
-                    # Aggiorna la progress bar
-                    progress_percent = (i + 1) / total_books
-                    progress_bar.progress(progress_percent, text=f"{progress_text} {i+1}/{total_books}")
-                    
-                    # Mostra quale ISBN stiamo elaborando
-                    if show_details:
-                        with details_container:
-                            st.write(f"Elaborazione ISBN: {isbn}")
-                    
-                    try:
-                        # Richiesta al backend
-                        response = requests.post(
-                            f"{API_URL}/books/", 
-                            json={"isbn": isbn},
-                            headers=headers
-                        )
+                # Un'unica richiesta al backend: i risultati arrivano in streaming
+                # (NDJSON, una riga per ISBN) e aggiornano la progress bar man mano
+                processed = 0
+                try:
+                    with requests.post(
+                        f"{API_URL}/books/import",
+                        json={"isbns": isbn_items},
+                        headers=headers,
+                        stream=True
+                    ) as response:
+                        if response.status_code != 200:
+                            st.error(f"Errore: {response.json().get('detail', 'Errore sconosciuto')}")
+                            return
                         
-                        if response.status_code == 200:
-                            book = response.json()
-                            successful_imports += 1
-                            imported_books.append({
-                                "id": book.get('id'),
-                                "title": book.get('title', 'N/A'),
-                                "author": book.get('author', 'N/A')
-                            })
+                        for line in response.iter_lines():
+                            if not line:
+                                continue
+                            result = json.loads(line)
+                            if result.get('type') != 'result':
+                                continue
                             
-                            if show_details:
-                                with details_container:
-                                    st.success(f"✓ Aggiunto: {book.get('title', 'N/A')} di {book.get('author', 'N/A')}")
-                        elif response.status_code == 400 and "già un libro con lo stesso ISBN" in response.json().get('detail', ''):
-                            skipped_imports += 1
-                            if show_details:
-                                with details_container:
-                                    st.warning(f"⚠️ Saltato: ISBN {isbn} già presente nella tua libreria")
-                        else:
-                            failed_imports += 1
-                            failed_isbns.append(isbn)
-                            if show_details:
-                                with details_container:
-                                    st.error(f"❌ Fallito: ISBN {isbn} - {response.json().get('detail', 'Errore sconosciuto')}")
-                        
-                        # Breve pausa per evitare troppe richieste al backend
-                        time.sleep(0.5)
-                        
-                    except Exception as e:
-                        failed_imports += 1
-                        failed_isbns.append(isbn)
-                        if show_details:
-                            with details_container:
-                                st.error(f"❌ Errore: ISBN {isbn} - {str(e)}")
+                            processed += 1
+                            progress_bar.progress(
+                                min(processed / total_books, 1.0),
+                                text=f"{progress_text} {processed}/{total_books}"
+                            )
+                            
+                            isbn = result.get('isbn')
+                            if result['status'] == 'created':
+                                successful_imports += 1
+                                imported_books.append({
+                                    "id": result.get('book_id'),
+                                    "title": result.get('title', 'N/A'),
+                                    "author": result.get('author', 'N/A')
+                                })
+                                if show_details:
+                                    with details_container:
+                                        st.success(f"✓ Aggiunto: {result.get('title', 'N/A')} di {result.get('author', 'N/A')}")
+                            elif result['status'] == 'duplicate':
+                                skipped_imports += 1
+                                if show_details:
+                                    with details_container:
+                                        st.warning(f"⚠️ Saltato: ISBN {isbn} già presente nella tua libreria")
+                            else:
+                                failed_imports += 1
+                                failed_isbns.append(isbn)
+                                if show_details:
+                                    with details_container:
+                                        st.error(f"❌ Fallito: ISBN {isbn} - {result.get('detail', 'Errore sconosciuto')}")
+                except Exception as e:
+                    st.error(f"Errore di connessione: {str(e)}")
+                    # Gli ISBN senza risposta sono considerati falliti
+                    failed_imports += total_books - processed
                 
                 # Completa la progress bar
                 progress_bar.progress(1.0, text="Importazione completata!")
+                if successful_imports:
+                    invalidate("books", user_ids=[get_current_user_id()])
                 
                 # Mostra il riepilogo dell'importazione
                 st.markdown("### Riepilogo importazione")
@@ -247,15 +248,11 @@ def show_add_book_page():
                 col1, col2 = st.columns(2)
                 with col1:
                     if st.button("Torna alla libreria"):
-                        # Invalida le cache e torna alla griglia
-                        invalidate_caches()
                         set_state('grid')
                         st.rerun()
                 
                 with col2:
                     if st.button("Importa altri libri"):
-                        # Aggiorna solo la cache
-                        invalidate_caches()
                         st.rerun()
     
     # Pulisci l'ISBN scansionato dopo averlo usato
@@ -1,7 +1,7 @@
 import streamlit as st
 import datetime
 import requests
-from utils.api import fetch_book, get_book_cover_url, get_user_name, get_active_loans_for_book, invalidate_caches, get_current_user_id
+from utils.api import fetch_book, get_book_cover_url, get_user_name, get_book_loan_status, invalidate, book_user_ids, get_current_user_id
 from utils.state import set_state
 from components.ui import render_book_cover
 
@@ -50,8 +50,8 @@ def show_book_detail():
                         
                         if response.status_code == 200:
                             st.success("Libro eliminato con successo!")
-                            # Pulisci la cache e torna alla griglia
-                            invalidate_caches()
+                            # Il libro e i suoi prestiti spariscono per proprietario e lettore
+                            invalidate("books", "loans", user_ids=book_user_ids(book), book_ids=[book_id])
                             # Usa session_state per evitare problemi di render
                             st.session_state.book_deleted = True
                             set_state('grid')
@@ -72,8 +72,7 @@ def show_book_detail():
                 # Prima fase: mostra il bottone elimina
                 if st.button("🗑️ Elimina libro"):
                     # Verifica se ci sono prestiti attivi
-                    active_loans = get_active_loans_for_book(book_id)
-                    if active_loans:
+                    if get_book_loan_status(book_id):
                         st.error("Non è possibile eliminare un libro attualmente in prestito.")
                     else:
                         # Mostra la conferma
@@ -129,7 +128,9 @@ def show_book_detail():
             st.markdown(f"👤 **Proprietario:** {owner_name}")
 
         # Verifica se il libro è preso in prestito dall'utente corrente
-        active_loans = get_active_loans_for_book(book_id)
+        # (stato aggiornato: il libro stesso può venire dalla cache)
+        active_loan = get_book_loan_status(book_id)
+        active_loans = [active_loan] if active_loan else []
         is_borrower = any(loan.get('user_id') == current_user_id for loan in active_loans)
 
         # Mostra lo stato dei prestiti in modo più evidente
@@ -137,7 +138,7 @@ def show_book_detail():
             if is_owner:
                 # Il proprietario vede a chi ha prestato il libro
                 for loan in active_loans:
-                    borrower_name = get_user_name(loan.get('user_id'))
+                    borrower_name = loan.get('borrower_name') or get_user_name(loan.get('user_id'))
                     loan_date = loan.get('loan_date', '').split('T')[0]
                     return_date = loan.get('return_date', '').split('T')[0] if loan.get('return_date') else 'Non specificata'
                     
@@ -166,7 +167,7 @@ def show_book_detail():
                                 
                                 if response.status_code == 200:
                                     st.success("Restituzione registrata con successo!")
-                                    invalidate_caches()
+                                    invalidate("books", "loans", user_ids=[book.get('owner_id'), loan.get('user_id')], book_ids=[book_id])
                                     st.rerun()
                                 else:
                                     error_detail = response.json().get("detail", "Errore sconosciuto")
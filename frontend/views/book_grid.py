@@ -1,6 +1,6 @@
 import streamlit as st
 import math
-from utils.api import fetch_books, get_book_cover_url, get_user_name, get_current_user_id, search_books
+from utils.api import fetch_books, get_book_cover_url, get_user_name, get_current_user_id, search_books, prefetch_book_covers
 from utils.state import set_state
 from components.book_card import render_book_card
 
@@ -42,16 +42,18 @@ def show_book_grid():
             st.markdown(f"- **Libri aggiornati:** {result['updated']}")
             st.markdown(f"- **Libri non aggiornati:** {result['failed']}")
             
+            items = result.get('items', [])
+            
             if result['updated'] > 0:
                 st.markdown("#### Libri aggiornati")
-                for book in result['updated_books']:
-                    st.markdown(f"- **{book['title']}** (ID: {book['id']}, ISBN: {book['isbn']})")
-                    st.markdown(f"  - Campi aggiornati: {', '.join(book['updated_fields'])}")
+                for book in [item for item in items if item['status'] == 'updated']:
+                    st.markdown(f"- **{book['title']}** (ID: {book['book_id']}, ISBN: {book['isbn']})")
+                    st.markdown(f"  - Campi aggiornati: {', '.join(book['updated_fields'] or [])}")
             
             if result['failed'] > 0:
                 st.markdown("#### Libri non aggiornati")
-                for book in result['failed_books']:
-                    st.markdown(f"- **{book['title']}** (ID: {book['id']}, ISBN: {book['isbn']})")
+                for book in [item for item in items if item['status'] == 'failed']:
+                    st.markdown(f"- **{book['title']}** (ID: {book['book_id']}, ISBN: {book['isbn']})")
                     st.markdown(f"  - Motivo: {book['reason']}")
             
             if st.button("Chiudi", key="close_metadata_details"):
@@ -170,8 +172,8 @@ def show_book_grid():
             st.info("Non hai ancora libri nella tua libreria. Aggiungi un nuovo libro usando il pulsante 'Aggiungi Libro'.")
             
             # Debug aggiuntivo
-            from utils.api import invalidate_caches
-            st.button("🔄 Ricarica dati", on_click=invalidate_caches)
+            from utils.api import refresh_caches
+            st.button("🔄 Ricarica dati", on_click=refresh_caches)
         return
     
     # Resto del codice esistente per mostrare i libri...
@@ -181,6 +183,9 @@ def show_book_grid():
     owned_books = [book for book in books if book.get('owner_id') == current_user_id]
     borrowed_books = [book for book in books if book.get('owner_id') != current_user_id]
     
+    # Scarica in un'unica richiesta le miniature mancanti, prima di disegnare le card
+    prefetch_book_covers(books, size="thumb")
+    
     # Mostra i conteggi dei risultati
     st.markdown(f"**{len(books)} libri trovati** ({len(owned_books)} di tua proprietà, {len(borrowed_books)} presi in prestito)")
     
@@ -1,9 +1,55 @@
 import streamlit as st
-from utils.api import fetch_books, invalidate_caches, API_URL, get_auth_header
+from utils.api import fetch_books, invalidate, book_user_ids, API_URL, get_auth_header
 from utils.state import set_state
 import requests
 import pandas as pd
 
+# Colonne della tabella modificabili direttamente e relativi campi del libro
+EDITABLE_COLUMNS = {
+    "Titolo": "title",
+    "Autore": "author",
+    "Editore": "publisher",
+    "Anno": "publish_year",
+}
+
+def _cell_value(value, field):
+    """Normalizza il valore di una cella (NaN -> None, anno -> int)."""
+    if value is None or pd.isna(value) or value == "":
+        return None
+    if field == "publish_year":
+        return int(value)
+    return value
+
+def compute_table_changes(original, edited):
+    """
+    Confronta la tabella modificata con l'originale.
+
+    Returns:
+        Dizionario {book_id: {campo: nuovo valore}} con solo le celle cambiate
+    """
+    original_rows = original.set_index("id")
+    changes = {}
+    for row in edited.itertuples(index=False):
+        row = row._asdict()
+        before = original_rows.loc[row["id"]]
+        diff = {}
+        for column, field in EDITABLE_COLUMNS.items():
+            new_value = _cell_value(row[column], field)
+            if new_value != _cell_value(before[column], field):
+                diff[field] = new_value
+        if diff:
+            changes[str(row["id"])] = diff
+    return changes
+
+def invalidate_books(books, book_ids, *resources):
+    """Invalida in cache i libri modificati per chi li vede (proprietario e lettori)."""
+    book_ids = {int(book_id) for book_id in book_ids}
+    user_ids = [
+        user_id for book in books if book["id"] in book_ids
+        for user_id in book_user_ids(book)
+    ]
+    invalidate("books", *resources, user_ids=user_ids, book_ids=book_ids)
+
 def show_bulk_edit_page():
     """Pagina per la modifica in batch dei metadati dei libri"""
     st.title("Modifica in batch dei libri")
@@ -28,22 +74,54 @@ def show_bulk_edit_page():
         } for book in books
     ])
     
-    # Aggiungi una colonna di checkbox per la selezione
+    # Aggiungi una colonna di checkbox per la selezione; titolo, autore,
+    # editore e anno si possono modificare direttamente nella tabella
+    original_df = df
     df = st.data_editor(
         df,
         column_config={
             "id": st.column_config.Column("ID", disabled=True, width="small"),
             "Selezionato": st.column_config.CheckboxColumn("Seleziona", width="small"),
-            "Titolo": st.column_config.TextColumn("Titolo", disabled=True),
-            "Autore": st.column_config.TextColumn("Autore", disabled=True),
+            "Titolo": st.column_config.TextColumn("Titolo"),
+            "Autore": st.column_config.TextColumn("Autore"),
             "ISBN": st.column_config.TextColumn("ISBN", disabled=True),
-            "Editore": st.column_config.TextColumn("Editore", disabled=True),
-            "Anno": st.column_config.NumberColumn("Anno", disabled=True),
+            "Editore": st.column_config.TextColumn("Editore"),
+            "Anno": st.column_config.NumberColumn("Anno", min_value=0, max_value=2100, step=1),
         },
         hide_index=True,
         key="book_table",
     )
     
+    # Salvataggio delle celle modificate: si inviano solo le differenze
+    table_changes = compute_table_changes(original_df, df)
+    if table_changes:
+        st.info(f"{len(table_changes)} libri modificati nella tabella.")
+        if st.button("💾 Salva modifiche della tabella", key="save_table_changes"):
+            try:
+                with st.spinner("Salvataggio in corso..."):
+                    response = requests.patch(
+                        f"{API_URL}/books/bulk",
+                        json={"changes": table_changes},
+                        headers=get_auth_header()
+                    )
+                if response.status_code == 200:
+                    result = response.json()
+                    if result["status"] == "success":
+                        st.success(result["message"])
+                        rejected = [r for r in result["results"] if r["status"] in ("not_found", "not_owned")]
+                        if rejected:
+                            st.warning(f"⚠️ {len(rejected)} libri non aggiornati perché non trovati o non di tua proprietà")
+                        invalidate_books(books, table_changes)
+                        # La tabella va ricostruita dai dati aggiornati
+                        del st.session_state["book_table"]
+                        st.rerun()
+                    else:
+                        st.error(result["message"])
+                else:
+                    st.error(f"Errore durante il salvataggio: {response.json().get('detail', 'Errore sconosciuto')}")
+            except Exception as e:
+                st.error(f"Errore di connessione: {str(e)}")
+    
     # Filtra i libri selezionati
     selected_books = df[df["Selezionato"] == True]
     selected_count = len(selected_books)
@@ -128,8 +206,7 @@ def show_bulk_edit_page():
                                     result = response.json()
                                     st.success(f"Aggiornamento completato: {result['updated']} libri aggiornati")
                                     
-                                    # Pulisci le cache
-                                    invalidate_caches()
+                                    invalidate_books(books, book_ids)
                                     
                                     # Torna alla griglia dopo qualche secondo
                                     import time
@@ -192,8 +269,8 @@ def show_bulk_edit_page():
                                     # Aggiungi un flag per indicare che l'operazione è completata
                                     st.session_state.bulk_delete_completed = True
                                     
-                                    # Pulisci le cache
-                                    invalidate_caches()
+                                    # Con i libri vengono eliminati anche i loro prestiti conclusi
+                                    invalidate_books(books, book_ids, "loans")
                                     
                                     # Rerun per uscire dal form e mostrare il risultato
                                     st.rerun()
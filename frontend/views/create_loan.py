@@ -1,6 +1,6 @@
 import streamlit as st
 import requests
-from utils.api import fetch_book, get_book_cover_url, fetch_users, invalidate_caches
+from utils.api import fetch_book, get_book_cover_url, fetch_users, invalidate
 from utils.state import set_state
 from components.ui import render_book_cover, show_message_box
 
@@ -78,15 +78,12 @@ def show_create_loan_page():
                             # Le date verranno gestite dal backend con valori predefiniti
                         }
                         
-                        # Pulisci cache prima della richiesta
-                        invalidate_caches()
-                        
                         # Invia richiesta al backend
                         response = requests.post(f"{API_URL}/loans/", json=loan_data, timeout=30)
                         
                         if response.status_code == 200:
-                            # Pulisci di nuovo la cache
-                            invalidate_caches()
+                            # Il libro compare ora anche tra quelli del lettore
+                            invalidate("books", "loans", user_ids=[book.get('owner_id'), selected_user_id], book_ids=[book_id])
                             
                             st.success(f"Libro prestato con successo a {selected_user_display.split('(')[0].strip()}")
                             
@@ -1,6 +1,6 @@
 import streamlit as st
 import requests
-from utils.api import fetch_book, get_book_cover_url, fetch_users, invalidate_caches, get_user_name, upload_book_cover
+from utils.api import fetch_book, get_book_cover_url, fetch_users, invalidate, book_user_ids, get_user_name, upload_book_cover
 from utils.state import set_state
 from components.ui import render_book_cover
 
@@ -43,8 +43,8 @@ def show_edit_book_page():
                     
                     if result["success"]:
                         st.success("Copertina caricata con successo!")
-                        # Forza l'aggiornamento della cache e ricarica la pagina
-                        invalidate_caches()
+                        # La copertina nuova ha un altro cover_hash: aggiorna il libro in cache
+                        invalidate("books", user_ids=book_user_ids(book), book_ids=[book_id])
                         st.rerun()
                     else:
                         st.error(f"Errore nel caricamento: {result.get('error', 'Errore sconosciuto')}")
@@ -110,16 +110,13 @@ def show_edit_book_page():
                     
                     try:
                         with st.spinner("Aggiornamento in corso..."):
-                            # Pulisci la cache prima dell'aggiornamento
-                            invalidate_caches()
-                            
                             response = requests.put(f"{API_URL}/books/{book_id}", json=update_data)
                             
                             if response.status_code == 200:
                                 st.success("Libro aggiornato con successo!")
                                 
-                                # Aggiorna la cache di nuovo
-                                invalidate_caches()
+                                # Aggiorna il libro in cache per chi lo vede
+                                invalidate("books", user_ids=book_user_ids(book), book_ids=[book_id])
                                 
                                 # Ritorna alla pagina di dettaglio
                                 set_state('detail')
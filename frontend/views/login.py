@@ -2,7 +2,7 @@ import streamlit as st
 import requests
 import json
 from utils.state import set_state
-from utils.api import invalidate_caches, API_URL, save_auth_to_cookie, delete_auth_cookie
+from utils.api import API_URL, save_auth_to_cookie, delete_auth_cookie
 
 def show_login_page():
     """Mostra la pagina di login"""
@@ -23,7 +23,6 @@ def show_login_page():
                 st.session_state.pop('auth_token', None)
                 st.session_state.pop('user_info', None)
                 st.session_state.pop('auth_expiry', None)
-                invalidate_caches()
                 # Cancella anche il cookie di autenticazione
                 delete_auth_cookie()
                 st.rerun()
@@ -67,9 +66,6 @@ def show_login_page():
                         if remember_me:
                             save_auth_to_cookie(auth_data["access_token"], auth_data["user"])
                         
-                        # Pulisci cache API
-                        invalidate_caches()
-                        
                         # Messaggio di successo
                         st.success(f"Benvenuto, {auth_data['user']['name']}!")
                         
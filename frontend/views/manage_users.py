@@ -1,68 +1,14 @@
 import streamlit as st
 import requests
-from utils.api import fetch_users, fetch_loans, invalidate_caches
+from utils.api import fetch_users_summary, invalidate, refresh_caches
 from utils.state import set_state
 from components.ui import show_message_box
 
 # Configurazione
 API_URL = "http://localhost:8000"
 
-def get_active_loans_for_user(user_id):
-    """Recupera i prestiti attivi per un utente specifico"""
-    # Forza aggiornamento dei prestiti ogni volta per evitare cache stale
-    fetch_loans.clear()
-    loans = fetch_loans()
-    active_loans = []
-    
-    # Debug
-    print(f"Cercando prestiti per utente ID: {user_id}")
-    print(f"Totale prestiti trovati: {len(loans)}")
-    
-    # Converti user_id in stringa per confronto sicuro
-    user_id_str = str(user_id)
-    
-    for loan in loans:
-        loan_user_id = str(loan.get('user_id'))
-        
-        # Debug
-        print(f"Confronto: {loan_user_id} == {user_id_str} -> {loan_user_id == user_id_str}")
-        
-        if loan_user_id == user_id_str:
-            print(f"Trovato prestito per utente {user_id}: {loan}")
-            
-            # Caso 1: Se non c'è data di restituzione, il prestito è attivo
-            if loan.get('return_date') is None:
-                print("Prestito attivo (nessuna data di restituzione)")
-                active_loans.append(loan)
-                continue
-                
-            # Caso 2: Verifica se la data di restituzione è nel futuro
-            try:
-                return_date_str = loan.get('return_date')
-                
-                # Normalizza formato data
-                if return_date_str.endswith('Z'):
-                    return_date_str = return_date_str.replace('Z', '+00:00')
-                elif '+' not in return_date_str and 'T' in return_date_str:
-                    return_date_str = f"{return_date_str}+00:00"
-                
-                # Converti le stringhe in datetime
-                import datetime
-                return_date = datetime.datetime.fromisoformat(return_date_str)
-                now = datetime.datetime.now(datetime.timezone.utc)
-                
-                print(f"Data restituzione: {return_date}, Ora attuale: {now}")
-                print(f"È nel futuro? {return_date > now}")
-                
-                if return_date > now:
-                    active_loans.append(loan)
-                    print("Prestito attivo (data restituzione nel futuro)")
-            except Exception as e:
-                print(f"Errore parsing data: {e}")
-                # In caso di problemi nel parsing della data, non includiamo il prestito
-    
-    print(f"Totale prestiti attivi trovati: {len(active_loans)}")
-    return active_loans
+# Utenti mostrati per pagina
+USERS_PER_PAGE = 50
 
 def show_manage_users_page():
     """Pagina per la gestione degli utenti"""
@@ -81,18 +27,23 @@ def show_manage_users_page():
     with tab1:
         # Pulsante per aggiornare la lista
         if st.button("🔄 Aggiorna lista"):
-            invalidate_caches()
+            refresh_caches()
             # Resetta anche lo stato di eliminazione
             st.session_state.user_to_delete = None
             st.session_state.show_confirm_delete = False
             st.rerun()
-            
-        users = fetch_users()
+        
+        # Stack dell'after_id di ogni pagina visitata (None per la prima)
+        if 'users_cursors' not in st.session_state:
+            st.session_state.users_cursors = [None]
+        cursors = st.session_state.users_cursors
+        
+        users, next_after_id = fetch_users_summary(after_id=cursors[-1], limit=USERS_PER_PAGE)
         if not users:
             st.info("Nessun utente registrato nel sistema.")
         else:
-            # Mostra il numero totale di utenti
-            st.write(f"Trovati {len(users)} utenti registrati:")
+            first = (len(cursors) - 1) * USERS_PER_PAGE + 1
+            st.write(f"Utenti {first}-{first + len(users) - 1}:")
             
             # Visualizza ogni utente in una card
             for user in users:
@@ -105,29 +56,17 @@ def show_manage_users_page():
                         st.write(f"📧 {user['email']}")
                     
                     with col2:
-                        # Ottieni prestiti attivi
-                        active_loans = get_active_loans_for_user(user_id)
-                        
-                        if active_loans:
-                            num_loans = len(active_loans)
+                        num_loans = user['active_loans']
+                        if num_loans:
                             st.markdown(f"📚 **{num_loans} {('prestito attivo' if num_loans == 1 else 'prestiti attivi')}**")
-                            
-                            # Mostra dettagli del primo prestito attivo
-                            if len(active_loans) > 0:
-                                first_loan = active_loans[0]
-                                from utils.api import fetch_book
-                                book = fetch_book(first_loan.get('book_id'))
-                                if book:
-                                    with st.expander("Dettagli prestiti"):
-                                        for loan in active_loans:
-                                            book = fetch_book(loan.get('book_id'))
-                                            if book:
-                                                st.write(f"- **{book.get('title')}** di {book.get('author')}")
-                                                loan_date = loan.get('loan_date', '').split('T')[0]
-                                                return_date = loan.get('return_date', '').split('T')[0] if loan.get('return_date') else 'Non specificata'
-                                                st.write(f"  Prestato il: {loan_date}, Restituzione: {return_date}")
+                            if user['overdue_loans']:
+                                st.markdown(f"⚠️ {user['overdue_loans']} in ritardo")
+                            with st.expander("Dettagli prestiti"):
+                                for title in user['active_loan_titles']:
+                                    st.write(f"- **{title}**")
                         else:
                             st.write("📚 Nessun prestito attivo")
+                        st.caption(f"Prestiti totali: {user['total_loans']}")
                     
                     with col3:
                         # Se è in modalità conferma per questo utente, mostra i bottoni di conferma
@@ -146,7 +85,8 @@ def show_manage_users_page():
                                         # Resetta lo stato e aggiorna la cache
                                         st.session_state.user_to_delete = None
                                         st.session_state.show_confirm_delete = False
-                                        invalidate_caches()
+                                        # I libri e i prestiti dell'utente riguardano anche gli altri utenti
+                                        invalidate("users", "books", "loans")
                                         st.rerun()
                                     else:
                                         # Gestisci errori
@@ -168,8 +108,7 @@ def show_manage_users_page():
                             # Mostra il bottone "Elimina" normalmente
                             if st.button("🗑️ Elimina", key=f"delete_{user_id}"):
                                 # Verifica se l'utente ha prestiti attivi
-                                active_loans = get_active_loans_for_user(user_id)
-                                if active_loans:
+                                if user['active_loans']:
                                     show_message_box(
                                         f"Impossibile eliminare {user['name']} perché ha dei prestiti attivi.",
                                         "error"
@@ -181,6 +120,17 @@ def show_manage_users_page():
                                     st.rerun()
                     
                     st.markdown("---")
+            
+            # Navigazione tra le pagine
+            col_prev, _, col_next = st.columns([1, 2, 1])
+            with col_prev:
+                if len(cursors) > 1 and st.button("← Precedenti", key="users_prev"):
+                    cursors.pop()
+                    st.rerun()
+            with col_next:
+                if next_after_id is not None and st.button("Successivi →", key="users_next"):
+                    cursors.append(next_after_id)
+                    st.rerun()
     
     # Tab 2: Aggiungi nuovo utente
     with tab2:
@@ -216,7 +166,7 @@ def show_manage_users_page():
                                     user_created = response.json()
                                     
                                     # Pulisci la cache degli utenti
-                                    invalidate_caches()
+                                    invalidate("users")
                                     
                                     # Mostra messaggio di successo
                                     st.success(f"Utente {name} aggiunto con successo!")
@@ -228,7 +178,7 @@ def show_manage_users_page():
                                 except ValueError:
                                     # Se la risposta non è JSON valido
                                     st.warning("Utente creato ma i dettagli non sono disponibili. Prova a ricaricare la pagina.")
-                                    invalidate_caches()
+                                    invalidate("users")
                             else:
                                 # Gestisci gli errori comuni
                                 try:
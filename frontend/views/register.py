@@ -2,7 +2,7 @@ import streamlit as st
 import requests
 import re
 from utils.state import set_state
-from utils.api import invalidate_caches, API_URL
+from utils.api import invalidate, API_URL
 
 def validate_email(email):
     """Validazione semplice dell'email"""
@@ -67,8 +67,8 @@ def show_register_page():
                     if response.status_code == 200:
                         st.success(f"Registrazione completata con successo! Benvenuto {name}.")
                         
-                        # Pulisci le cache
-                        invalidate_caches()
+                        # Il nuovo utente compare nell'elenco utenti di tutti
+                        invalidate("users")
                         
                         # Opzioni dopo la registrazione
                         col1, col2 = st.columns(2)
@@ -1,10 +1,23 @@
-from backend.database import Base, engine
-from backend.models import Book, User, Loan
+import os
+from alembic import command
+from alembic.config import Config
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def get_alembic_config():
+    """Configurazione Alembic indipendente dalla directory di lavoro corrente."""
+    config = Config(os.path.join(BASE_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BASE_DIR, "migrations"))
+    return config
+
+def upgrade_database():
+    """Applica le migrazioni mancanti (idempotente, sicuro ad ogni avvio)."""
+    command.upgrade(get_alembic_config(), "head")
 
 def init_database():
     print("Creazione delle tabelle nel database...")
-    Base.metadata.create_all(bind=engine)
+    upgrade_database()
     print("Database inizializzato con successo!")
 
 if __name__ == "__main__":
-    init_database()
\ No newline at end of file
+    init_database()
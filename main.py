@@ -1,24 +1,47 @@
-import os
 from fastapi import FastAPI
-from backend.routers import books_router, loans_router, users_router, auth_router
-from init_db import init_database  # Modifica qui: init_db -> init_database
+from fastapi.responses import PlainTextResponse
+from backend.routers import books_router, loans_router, users_router, auth_router, jobs_router, export_router
+from backend.services.jobs import resume_jobs
+from backend.database import engine
+from backend.metrics import MetricsMiddleware, instrument_engine, register_cache_stats, render_metrics
+from backend.crud.user import get_principal_cache_stats
+from backend import query_budget
+from init_db import upgrade_database
 
-# Check if the database exists
-if not os.path.exists("books.db"):
-    print("Database not found. Initializing database...")
-    init_database()  # Modifica qui: init_db -> init_database
+# Crea il database se non esiste e applica le migrazioni mancanti
+upgrade_database()
+
+# Riprendi i job in background interrotti dall'ultimo arresto
+resume_jobs()
 
 app = FastAPI()
 
+# Metriche per route, database, provider e immagini, esposte su /metrics
+instrument_engine(engine)
+register_cache_stats("principal", get_principal_cache_stats)
+app.add_middleware(MetricsMiddleware)
+
+# Debug/test: segnala le query ripetute (N+1) e applica QUERY_BUDGET per richiesta
+if query_budget.QUERY_DEBUG:
+    query_budget.instrument_engine(engine)
+    app.add_middleware(query_budget.QueryBudgetMiddleware)
+
 app.include_router(books_router, prefix="/books", tags=["books"])
 app.include_router(loans_router, prefix="/loans", tags=["loans"])
 app.include_router(users_router, prefix="/users", tags=["users"])
 app.include_router(auth_router, prefix="/auth", tags=["authentication"])
+app.include_router(jobs_router, prefix="/jobs", tags=["jobs"])
+app.include_router(export_router, prefix="/export", tags=["export"])
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the Library Management API"}
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def read_metrics():
+    """Metriche in formato testo Prometheus."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
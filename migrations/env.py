@@ -0,0 +1,35 @@
+from alembic import context
+
+from backend.database import Base, engine
+import backend.models  # noqa: F401 - registra tutti i modelli sui metadati
+
+config = context.config
+target_metadata = Base.metadata
+
+def run_migrations_offline():
+    """Genera lo SQL delle migrazioni senza connettersi al database."""
+    context.configure(
+        url=str(engine.url),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        render_as_batch=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+def run_migrations_online():
+    """Applica le migrazioni usando l'engine dell'applicazione."""
+    with engine.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            # SQLite non supporta la maggior parte degli ALTER TABLE
+            render_as_batch=True,
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,70 @@
+"""Schema iniziale (users, books, loans)
+
+Revision ID: 0001_initial_schema
+Revises:
+Create Date: 2025-03-16
+
+I database creati prima dell'introduzione di Alembic hanno già queste tabelle
+(create da Base.metadata.create_all): in quel caso la migrazione non fa nulla.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001_initial_schema"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table("users"):
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String()),
+            sa.Column("email", sa.String()),
+            sa.Column("hashed_password", sa.String(), nullable=True),
+            sa.Column("role", sa.String()),
+            sa.Column("last_login", sa.DateTime(), nullable=True),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("is_active", sa.Boolean()),
+        )
+        op.create_index("ix_users_id", "users", ["id"])
+        op.create_index("ix_users_name", "users", ["name"])
+        op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    if not inspector.has_table("books"):
+        op.create_table(
+            "books",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("title", sa.String()),
+            sa.Column("author", sa.String()),
+            sa.Column("description", sa.String()),
+            sa.Column("isbn", sa.String(), nullable=True),
+            sa.Column("publisher", sa.String(), nullable=True),
+            sa.Column("publish_year", sa.Integer(), nullable=True),
+            sa.Column("owner_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=True),
+            sa.Column("cover_image", sa.LargeBinary(), nullable=True),
+        )
+        op.create_index("ix_books_id", "books", ["id"])
+        op.create_index("ix_books_title", "books", ["title"])
+        op.create_index("ix_books_author", "books", ["author"])
+        op.create_index("ix_books_description", "books", ["description"])
+        op.create_index("ix_books_isbn", "books", ["isbn"])
+
+    if not inspector.has_table("loans"):
+        op.create_table(
+            "loans",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("book_id", sa.Integer(), sa.ForeignKey("books.id"), nullable=False),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("loan_date", sa.DateTime(), nullable=False),
+            sa.Column("return_date", sa.DateTime(), nullable=True),
+        )
+        op.create_index("ix_loans_id", "loans", ["id"])
+
+def downgrade():
+    op.drop_table("loans")
+    op.drop_table("books")
+    op.drop_table("users")
@@ -0,0 +1,83 @@
+"""Store delle copertine indirizzato per contenuto
+
+Revision ID: 0002_cover_store
+Revises: 0001_initial_schema
+Create Date: 2025-03-20
+
+Sposta le immagini da books.cover_image alla tabella covers, indicizzata per
+SHA-256: ogni libro conserva solo cover_hash e copertine identiche sono
+memorizzate una sola volta.
+"""
+import hashlib
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002_cover_store"
+down_revision = "0001_initial_schema"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 200
+
+def upgrade():
+    op.create_table(
+        "covers",
+        sa.Column("hash", sa.String(64), primary_key=True),
+        sa.Column("data", sa.LargeBinary(), nullable=False),
+        sa.Column("size", sa.Integer(), nullable=False),
+        sa.Column("media_type", sa.String(), nullable=False, server_default="image/jpeg"),
+    )
+
+    with op.batch_alter_table("books") as batch_op:
+        batch_op.add_column(sa.Column("cover_hash", sa.String(64), nullable=True))
+        batch_op.create_foreign_key("fk_books_cover_hash_covers", "covers", ["cover_hash"], ["hash"])
+        batch_op.create_index("ix_books_cover_hash", ["cover_hash"])
+
+    # Copia le immagini esistenti a blocchi, per non caricarle tutte in memoria
+    conn = op.get_bind()
+    book_ids = [row.id for row in conn.execute(
+        sa.text("SELECT id FROM books WHERE cover_image IS NOT NULL ORDER BY id")
+    )]
+    known_hashes = set()
+    for start in range(0, len(book_ids), BATCH_SIZE):
+        chunk = book_ids[start:start + BATCH_SIZE]
+        rows = conn.execute(
+            sa.text("SELECT id, cover_image FROM books WHERE id IN :ids").bindparams(
+                sa.bindparam("ids", expanding=True)
+            ),
+            {"ids": chunk},
+        ).fetchall()
+        for row in rows:
+            data = bytes(row.cover_image)
+            cover_hash = hashlib.sha256(data).hexdigest()
+            if cover_hash not in known_hashes:
+                conn.execute(
+                    sa.text("INSERT INTO covers (hash, data, size, media_type) VALUES (:hash, :data, :size, 'image/jpeg')"),
+                    {"hash": cover_hash, "data": data, "size": len(data)},
+                )
+                known_hashes.add(cover_hash)
+            conn.execute(
+                sa.text("UPDATE books SET cover_hash = :hash WHERE id = :id"),
+                {"hash": cover_hash, "id": row.id},
+            )
+
+    with op.batch_alter_table("books") as batch_op:
+        batch_op.drop_column("cover_image")
+
+def downgrade():
+    with op.batch_alter_table("books") as batch_op:
+        batch_op.add_column(sa.Column("cover_image", sa.LargeBinary(), nullable=True))
+
+    op.execute(
+        "UPDATE books SET cover_image = "
+        "(SELECT data FROM covers WHERE covers.hash = books.cover_hash) "
+        "WHERE cover_hash IS NOT NULL"
+    )
+
+    with op.batch_alter_table("books") as batch_op:
+        batch_op.drop_index("ix_books_cover_hash")
+        batch_op.drop_constraint("fk_books_cover_hash_covers", type_="foreignkey")
+        batch_op.drop_column("cover_hash")
+
+    op.drop_table("covers")
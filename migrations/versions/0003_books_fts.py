@@ -0,0 +1,58 @@
+"""Indice full-text FTS5 sui libri
+
+Revision ID: 0003_books_fts
+Revises: 0002_cover_store
+Create Date: 2025-03-22
+
+Crea la tabella virtuale books_fts (external content su books) e i trigger che
+la mantengono sincronizzata. Rimuove l'indice B-tree su description, che non
+può servire le ricerche per sottostringa.
+
+Nota: se una migrazione futura ricrea la tabella books (batch_alter_table su
+SQLite), i trigger vengono eliminati insieme alla tabella e vanno ricreati.
+"""
+from alembic import op
+
+revision = "0003_books_fts"
+down_revision = "0002_cover_store"
+branch_labels = None
+depends_on = None
+
+FTS_COLUMNS = "title, author, isbn, publisher, description"
+NEW_VALUES = "new.id, new.title, new.author, new.isbn, new.publisher, new.description"
+OLD_VALUES = "old.id, old.title, old.author, old.isbn, old.publisher, old.description"
+
+def upgrade():
+    if op.get_bind().dialect.name != "sqlite":
+        return
+
+    op.execute(
+        f"CREATE VIRTUAL TABLE books_fts USING fts5({FTS_COLUMNS}, "
+        "content='books', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+    )
+    op.execute(
+        "CREATE TRIGGER books_fts_ai AFTER INSERT ON books BEGIN "
+        f"INSERT INTO books_fts(rowid, {FTS_COLUMNS}) VALUES ({NEW_VALUES}); END"
+    )
+    op.execute(
+        "CREATE TRIGGER books_fts_ad AFTER DELETE ON books BEGIN "
+        f"INSERT INTO books_fts(books_fts, rowid, {FTS_COLUMNS}) VALUES ('delete', {OLD_VALUES}); END"
+    )
+    op.execute(
+        f"CREATE TRIGGER books_fts_au AFTER UPDATE OF {FTS_COLUMNS} ON books BEGIN "
+        f"INSERT INTO books_fts(books_fts, rowid, {FTS_COLUMNS}) VALUES ('delete', {OLD_VALUES}); "
+        f"INSERT INTO books_fts(rowid, {FTS_COLUMNS}) VALUES ({NEW_VALUES}); END"
+    )
+    op.execute("INSERT INTO books_fts(books_fts) VALUES ('rebuild')")
+
+    op.drop_index("ix_books_description", table_name="books")
+
+def downgrade():
+    if op.get_bind().dialect.name != "sqlite":
+        return
+
+    op.create_index("ix_books_description", "books", ["description"])
+    op.execute("DROP TRIGGER IF EXISTS books_fts_au")
+    op.execute("DROP TRIGGER IF EXISTS books_fts_ad")
+    op.execute("DROP TRIGGER IF EXISTS books_fts_ai")
+    op.execute("DROP TABLE IF EXISTS books_fts")
@@ -0,0 +1,34 @@
+"""Cache persistente dei metadati per ISBN
+
+Revision ID: 0004_metadata_cache
+Revises: 0003_books_fts
+Create Date: 2025-03-24
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004_metadata_cache"
+down_revision = "0003_books_fts"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "metadata_cache",
+        sa.Column("isbn", sa.String(), primary_key=True),
+        sa.Column("found", sa.Boolean(), nullable=False),
+        sa.Column("title", sa.String(), nullable=True),
+        sa.Column("author", sa.String(), nullable=True),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.Column("publisher", sa.String(), nullable=True),
+        sa.Column("publish_year", sa.Integer(), nullable=True),
+        sa.Column("cover_hash", sa.String(64), sa.ForeignKey("covers.hash"), nullable=True),
+        sa.Column("provider", sa.String(), nullable=True),
+        sa.Column("fetched_at", sa.DateTime(), nullable=False),
+        sa.Column("last_accessed", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_metadata_cache_last_accessed", "metadata_cache", ["last_accessed"])
+
+def downgrade():
+    op.drop_index("ix_metadata_cache_last_accessed", table_name="metadata_cache")
+    op.drop_table("metadata_cache")
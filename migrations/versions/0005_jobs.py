@@ -0,0 +1,51 @@
+"""Job in background con esiti per libro
+
+Revision ID: 0005_jobs
+Revises: 0004_metadata_cache
+Create Date: 2025-03-26
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005_jobs"
+down_revision = "0004_metadata_cache"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "jobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("type", sa.String(), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("owner_id", sa.Integer(), nullable=True),
+        sa.Column("total", sa.Integer(), nullable=False),
+        sa.Column("processed", sa.Integer(), nullable=False),
+        sa.Column("updated", sa.Integer(), nullable=False),
+        sa.Column("failed", sa.Integer(), nullable=False),
+        sa.Column("message", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_jobs_id", "jobs", ["id"])
+    op.create_index("ix_jobs_status", "jobs", ["status"])
+
+    op.create_table(
+        "job_items",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("job_id", sa.Integer(), sa.ForeignKey("jobs.id"), nullable=False),
+        sa.Column("book_id", sa.Integer(), nullable=False),
+        sa.Column("isbn", sa.String(), nullable=True),
+        sa.Column("title", sa.String(), nullable=True),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("updated_fields", sa.JSON(), nullable=True),
+        sa.Column("reason", sa.String(), nullable=True),
+    )
+    op.create_index("ix_job_items_id", "job_items", ["id"])
+    op.create_index("ix_job_items_job_id", "job_items", ["job_id"])
+
+def downgrade():
+    op.drop_table("job_items")
+    op.drop_table("jobs")
@@ -0,0 +1,38 @@
+"""Indici composti per i filtri più frequenti su prestiti e libri
+
+Revision ID: 0006_query_indexes
+Revises: 0005_jobs
+Create Date: 2025-03-27
+
+I prestiti attivi si filtrano con (return_date IS NULL OR return_date > now):
+un indice parziale con "now" nella condizione non è possibile (SQLite non
+ammette funzioni non deterministiche negli indici parziali), quindi gli indici
+(book_id, return_date) e (user_id, return_date) servono entrambi i rami
+dell'OR con una ricerca per uguaglianza seguita da un range.
+
+L'indice (owner_id, isbn) è parziale su isbn IS NOT NULL: il controllo dei
+duplicati e l'importazione multipla cercano sempre ISBN valorizzati.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006_query_indexes"
+down_revision = "0005_jobs"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_index("ix_loans_book_id_return_date", "loans", ["book_id", "return_date"])
+    op.create_index("ix_loans_user_id_return_date", "loans", ["user_id", "return_date"])
+    op.create_index(
+        "ix_books_owner_id_isbn", "books", ["owner_id", "isbn"],
+        sqlite_where=sa.text("isbn IS NOT NULL"),
+        postgresql_where=sa.text("isbn IS NOT NULL"),
+    )
+    op.create_index("ix_books_owner_id_title", "books", ["owner_id", "title"])
+
+def downgrade():
+    op.drop_index("ix_books_owner_id_title", table_name="books")
+    op.drop_index("ix_books_owner_id_isbn", table_name="books")
+    op.drop_index("ix_loans_user_id_return_date", table_name="loans")
+    op.drop_index("ix_loans_book_id_return_date", table_name="loans")
@@ -0,0 +1,59 @@
+"""Varianti delle copertine (thumb, detail) in JPEG e WebP
+
+Revision ID: 0007_cover_variants
+Revises: 0006_query_indexes
+Create Date: 2025-03-28
+
+Genera le varianti per le copertine già presenti, a blocchi per non caricare
+tutte le immagini in memoria. Le varianti che non è possibile generare qui
+vengono create al primo accesso da crud.cover.get_cover_variant.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from backend.services.images import COVER_FORMATS, available_cover_variants, render_cover_variant
+
+revision = "0007_cover_variants"
+down_revision = "0006_query_indexes"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 100
+
+def upgrade():
+    op.create_table(
+        "cover_variants",
+        sa.Column("cover_hash", sa.String(64), sa.ForeignKey("covers.hash"), primary_key=True),
+        sa.Column("size", sa.String(), primary_key=True),
+        sa.Column("format", sa.String(), primary_key=True),
+        sa.Column("data", sa.LargeBinary(), nullable=False),
+        sa.Column("length", sa.Integer(), nullable=False),
+        sa.Column("media_type", sa.String(), nullable=False),
+    )
+
+    conn = op.get_bind()
+    hashes = [row.hash for row in conn.execute(sa.text("SELECT hash FROM covers ORDER BY hash"))]
+    variants = available_cover_variants()
+    for start in range(0, len(hashes), BATCH_SIZE):
+        rows = conn.execute(
+            sa.text("SELECT hash, data FROM covers WHERE hash IN :hashes").bindparams(
+                sa.bindparam("hashes", expanding=True)
+            ),
+            {"hashes": hashes[start:start + BATCH_SIZE]},
+        ).fetchall()
+        for row in rows:
+            for size, image_format in variants:
+                rendered = render_cover_variant(bytes(row.data), size, image_format)
+                if rendered is None:
+                    continue
+                conn.execute(
+                    sa.text(
+                        "INSERT INTO cover_variants (cover_hash, size, format, data, length, media_type) "
+                        "VALUES (:hash, :size, :format, :data, :length, :media_type)"
+                    ),
+                    {"hash": row.hash, "size": size, "format": image_format, "data": rendered,
+                     "length": len(rendered), "media_type": COVER_FORMATS[image_format]},
+                )
+
+def downgrade():
+    op.drop_table("cover_variants")